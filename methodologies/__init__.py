@@ -0,0 +1,54 @@
+"""
+methodologies/
+
+Headless methodology engines (no Streamlit here): VM0038 (EV charging), AM0124 (hydrogen via
+electrolysis) and VMR0007 (waste recovery). Pages are thin widgets over these modules.
+
+Key guarantees:
+- Each module exposes NAME, frozen Inputs / Result dataclasses, a vectorized compute(arrays),
+  evaluate(Inputs) -> Result and evaluate_batch(DataFrame) -> (results, errors).
+- from_saved(inputs_json) rebuilds Inputs from a ledger entry (the page also stores the record
+  itself under "engine"); saved_outputs() gives the outputs_json layout, so saved entries can be
+  recomputed (utils/recompute.py).
+- compute() is also the Monte Carlo / scenario-sweep model registered under NAME in
+  utils.uncertainty, so single runs, portfolios, simulations and sweeps share one formula.
+- Portfolios recompute from a file outside the UI:
+      python -m methodologies VM0038 portfolio.csv --out results.csv
+"""
+
+from __future__ import annotations
+
+from types import ModuleType
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from methodologies import am0124, vm0038, vmr0007
+from utils.uncertainty import register_model
+
+
+METHODOLOGIES: Dict[str, ModuleType] = {m.NAME: m for m in (vm0038, am0124, vmr0007)}
+
+
+def get(name: str) -> ModuleType:
+    if name not in METHODOLOGIES:
+        raise KeyError(f"Unknown methodology: {name!r} (expected one of {', '.join(METHODOLOGIES)})")
+    return METHODOLOGIES[name]
+
+
+def evaluate_batch(
+    methodology: str, df: pd.DataFrame, defaults: Optional[Dict[str, Any]] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Evaluate every row of `df` (Inputs columns, other columns passed through) in one call."""
+    return get(methodology).evaluate_batch(df, defaults)
+
+
+def _register(module: ModuleType) -> None:
+    @register_model(module.NAME)
+    def model(s):
+        out = module.compute(s)
+        return {k: out[k] for k in module.OUTPUTS}
+
+
+for _module in METHODOLOGIES.values():
+    _register(_module)
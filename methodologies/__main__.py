@@ -0,0 +1,59 @@
+"""
+python -m methodologies <VM0038|AM0124|VMR0007> portfolio.csv [--out results.csv]
+
+Recomputes a portfolio file (one row per project / site, Inputs columns) in chunks, outside the UI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from methodologies import METHODOLOGIES, evaluate_batch
+from utils.db import CHUNK_ROWS
+from utils.ingest import MAX_REPORTED_ERRORS, iter_chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate a methodology over a portfolio file.")
+    parser.add_argument("methodology", choices=list(METHODOLOGIES))
+    parser.add_argument("path", help="CSV, gzip'd CSV or Parquet")
+    parser.add_argument("--out", default=None, help="results CSV (default: stdout)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    totals = {"rows": 0, "evaluated": 0, "rejected": 0}
+    sums: dict = {}
+    errors = []
+    first_row = 0
+    outputs = METHODOLOGIES[args.methodology].OUTPUTS
+    with open(args.path, "rb") as fh:
+        for i, chunk in enumerate(iter_chunks(fh, args.path, args.chunk_rows)):
+            chunk.index = range(first_row, first_row + len(chunk))
+            first_row += len(chunk)
+            results, errs = evaluate_batch(args.methodology, chunk)
+            if not errs.empty:
+                errs = errs.assign(row=errs["row"] + chunk.index[0])  # chunk-relative -> file rows
+                errors.append(errs)
+            if i == 0:  # fixed header: an all-invalid first chunk has no output columns
+                columns = list(results.columns) + [k for k in outputs if k not in results]
+            results.reindex(columns=columns).to_csv(out, index=False, header=(i == 0))
+            totals["rows"] += len(chunk)
+            totals["evaluated"] += len(results)
+            totals["rejected"] += int(errs["row"].nunique()) if not errs.empty else 0
+            for k in outputs:
+                if k in results:
+                    sums[k] = sums.get(k, 0.0) + float(results[k].sum())
+    if args.out:
+        out.close()
+    print(json.dumps({**totals, **sums}, indent=2), file=sys.stderr)
+    if errors:
+        print(pd.concat(errors, ignore_index=True).head(MAX_REPORTED_ERRORS).to_string(index=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+methodologies/am0124.py
+
+AM0124-style hydrogen via electrolysis (demo): grid-powered electrolysis vs a grid-electricity
+or grey (SMR) hydrogen baseline.
+
+Key guarantees:
+- compute() takes one array per Inputs field; every step is elementwise, so one call covers a
+  single project, a portfolio file or 10^6 Monte Carlo / sweep points.
+- ER per year keeps the max(baseline - project - leakage penalty, 0) clamp.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from methodologies.base import Arrays, as_arrays, first, point_records, run_batch, spec
+
+
+NAME = "AM0124"
+OUTPUTS = ("baseline_tco2e", "project_tco2e", "er_tco2e")
+# outputs_json key (as saved by the Methodologies page) -> compute() output
+SAVED_OUTPUTS = {
+    "baseline_tco2e_total": "baseline_tco2e",
+    "project_tco2e_total": "project_tco2e",
+    "penalty_tco2e_total": "penalty_tco2e",
+    "er_tco2e_total": "er_tco2e",
+    "er_tco2e_per_year": "er_tco2e_per_year",
+}
+GREY_BASELINE = "Grey H2 (SMR) equivalent"
+
+
+@dataclass(frozen=True)
+class Inputs:
+    h2_kg: float = field(metadata=spec("Hydrogen produced", "kg/yr"))
+    kwh_per_kg: float = field(metadata=spec("Electrolyser energy intensity", "kWh/kg H2"))
+    grid_ef: float = field(metadata=spec("Grid EF", "kg CO2e/kWh"))
+    ren_frac: float = field(default=0.0, metadata=spec("Renewable fraction", "0–1", max=1.0))
+    grey_baseline: bool = field(default=False, metadata=spec("Grey H2 (SMR) baseline"))
+    smr_kg_per_kg: float = field(default=0.0, metadata=spec("SMR EF", "kg CO2e/kg H2"))
+    leakage_frac: float = field(default=0.0, metadata=spec("H2 leakage", "0–1", max=1.0))
+    years: int = field(default=7, metadata=spec("Crediting period", "years", min=1))
+
+
+@dataclass(frozen=True)
+class Result:
+    elec_kwh_year: float
+    leakage_penalty_tco2e_year: float
+    er_tco2e_per_year: float
+    baseline_tco2e: float
+    project_tco2e: float
+    penalty_tco2e: float
+    er_tco2e: float
+
+
+def compute(s: Arrays) -> Arrays:
+    elec_kwh = s["h2_kg"] * s["kwh_per_kg"]
+    proj_kg = elec_kwh * s["grid_ef"] * (1.0 - s["ren_frac"])
+    base_kg = np.where(s["grey_baseline"] > 0, s["h2_kg"] * s["smr_kg_per_kg"], elec_kwh * s["grid_ef"])
+    penalty_kg = base_kg * s["leakage_frac"]
+    er_kg_y = np.maximum(base_kg - proj_kg - penalty_kg, 0.0)
+    return {
+        "elec_kwh_year": elec_kwh,
+        "leakage_penalty_tco2e_year": penalty_kg / 1000.0,
+        "er_tco2e_per_year": er_kg_y / 1000.0,
+        "baseline_tco2e": base_kg * s["years"] / 1000.0,
+        "project_tco2e": proj_kg * s["years"] / 1000.0,
+        "penalty_tco2e": penalty_kg * s["years"] / 1000.0,
+        "er_tco2e": er_kg_y * s["years"] / 1000.0,
+    }
+
+
+def evaluate(inputs: Inputs) -> Result:
+    return Result(**first(compute(as_arrays(inputs))))
+
+
+def evaluate_batch(df: pd.DataFrame, defaults: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """One row per project with Inputs columns -> (inputs + results, errors)."""
+    return run_batch(df, Inputs, compute, defaults=defaults)
+
+
+def from_saved(saved: Dict[str, Any]) -> Inputs:
+    """Inputs behind a saved ledger entry (emissions.inputs_json from the Methodologies page)."""
+    if "engine" in saved:
+        return Inputs(**saved["engine"])
+    return Inputs(
+        h2_kg=float(saved["h2_tons_year"]) * 1000.0,
+        kwh_per_kg=float(saved["kwh_per_kg"]),
+        grid_ef=float(saved["grid_ef_kg_per_kwh"]),
+        ren_frac=float(saved.get("renewable_fraction_pct", 0.0)) / 100.0,
+        grey_baseline=saved.get("baseline_mode") == GREY_BASELINE,
+        smr_kg_per_kg=float(saved.get("smr_ef_kg_per_kg", 0.0)),
+        leakage_frac=float(saved.get("leakage_pct", 0.0)) / 100.0,
+        years=int(saved.get("years", 7)),
+    )
+
+
+def saved_outputs(s: Arrays, out: Arrays) -> List[Dict[str, Any]]:
+    """Per point, the outputs_json layout the page saves."""
+    return point_records(out, SAVED_OUTPUTS)
@@ -0,0 +1,147 @@
+"""
+methodologies/base.py
+
+Shared plumbing for the headless methodology engines (no Streamlit here).
+
+Key guarantees:
+- Each methodology declares a frozen Inputs dataclass (field metadata: label, unit, min, max)
+  and a vectorized compute(arrays) -> arrays; single evaluations and batches run the same code.
+  Optional[...] fields may stay blank (NaN); other fields without a default are required.
+- batch_arrays() coerces a whole table in one pass per column: numbers (thousands separators
+  allowed), booleans (true/false/1/0/yes/no), bounds, and defaults for blank cells. Bad rows are
+  reported in the importers' (row, column, value, error) layout, never silently dropped.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import typing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.importers import ERROR_COLUMNS, normalise_header
+
+
+Arrays = Dict[str, np.ndarray]
+Compute = Callable[[Arrays], Arrays]
+
+_TRUE = {"true", "1", "yes", "y"}
+_FALSE = {"false", "0", "no", "n"}
+
+
+def spec(label: str, unit: str = "", *, min: Optional[float] = 0.0, max: Optional[float] = None) -> Dict[str, Any]:
+    """Field metadata for an Inputs dataclass."""
+    return {"label": label, "unit": unit, "min": min, "max": max}
+
+
+def input_fields(inputs_cls: type) -> List[Tuple[str, type, Any, Dict[str, Any]]]:
+    """(name, type, default or MISSING, metadata) per Inputs field."""
+    hints = typing.get_type_hints(inputs_cls)
+    return [(f.name, hints[f.name], f.default, dict(f.metadata)) for f in dataclasses.fields(inputs_cls)]
+
+
+def numeric_fields(inputs_cls: type) -> List[str]:
+    return [name for name, kind, _d, _m in input_fields(inputs_cls) if kind is not str]
+
+
+def as_values(inputs: Any) -> Dict[str, float]:
+    """One Inputs record -> {numeric field: float} (Monte Carlo / sweep base values)."""
+    return {name: float(getattr(inputs, name)) for name in numeric_fields(type(inputs))}
+
+
+def as_arrays(inputs: Any) -> Arrays:
+    """One Inputs record -> length-1 arrays for compute()."""
+    return {name: np.array([v]) for name, v in as_values(inputs).items()}
+
+
+def first(outputs: Arrays) -> Dict[str, float]:
+    return {k: float(np.asarray(v).ravel()[0]) for k, v in outputs.items()}
+
+
+def point_records(outputs: Arrays, keys: Dict[str, str]) -> List[Dict[str, float]]:
+    """Per point {saved key: float(outputs[engine key])}."""
+    cols = {saved: np.atleast_1d(outputs[key]) for saved, key in keys.items()}
+    n = max((len(v) for v in cols.values()), default=0)
+    return [{saved: float(v[i] if len(v) > 1 else v[0]) for saved, v in cols.items()} for i in range(n)]
+
+
+def batch_arrays(
+    df: pd.DataFrame, inputs_cls: type, defaults: Optional[Dict[str, Any]] = None
+) -> Tuple[pd.DataFrame, Arrays, pd.DataFrame]:
+    """Table (one row per evaluation) -> (valid rows' text fields, numeric arrays, errors).
+
+    Headers are normalised; blank cells take `defaults`, then the dataclass defaults. File row
+    numbers in errors assume a header row (first data row = 2).
+    """
+    defaults = defaults or {}
+    data = df.copy()
+    data.columns = [normalise_header(c) for c in data.columns]
+    rows = pd.Series(np.arange(2, len(data) + 2), index=data.index)
+    problems: List[pd.DataFrame] = []
+
+    def flag(mask: pd.Series, column: str, raw: pd.Series, error: str) -> None:
+        if mask.any():
+            problems.append(pd.DataFrame({"row": rows[mask], "column": column, "value": raw[mask], "error": error}))
+
+    text: Dict[str, pd.Series] = {}
+    values: Dict[str, pd.Series] = {}
+    for name, kind, default, meta in input_fields(inputs_cls):
+        optional = type(None) in typing.get_args(kind)
+        if optional:
+            kind = next(a for a in typing.get_args(kind) if a is not type(None))
+        raw = data[name].fillna("").astype(str).str.strip() if name in data.columns else pd.Series("", index=data.index)
+        fallback = defaults.get(name, None if default is dataclasses.MISSING else default)
+        if kind is str:
+            text[name] = raw.where(raw != "", "" if fallback is None else str(fallback))
+            continue
+        if kind is bool:
+            low = raw.str.lower()
+            flag(~low.isin(_TRUE | _FALSE | {""}), name, raw, "must be true/false")
+            num = low.map(lambda v: 1.0 if v in _TRUE else 0.0 if v in _FALSE else np.nan)
+        else:
+            num = pd.to_numeric(raw.str.replace(",", "", regex=False).where(raw != ""), errors="coerce")
+            flag((raw != "") & num.isna(), name, raw, "not a number")
+        if fallback is not None:
+            num = num.fillna(float(fallback))
+        if not optional:
+            flag((raw == "") & num.isna(), name, raw, "required")
+        if meta.get("min") is not None:
+            flag(num < meta["min"], name, raw, f"must be ≥ {meta['min']:g}")
+        if meta.get("max") is not None:
+            flag(num > meta["max"], name, raw, f"must be ≤ {meta['max']:g}")
+        if kind is int:
+            flag(num.notna() & (num % 1 != 0), name, raw, "must be a whole number")
+        values[name] = num
+
+    errors = (
+        pd.concat(problems, ignore_index=True).sort_values(["row", "column"], kind="stable").reset_index(drop=True)
+        if problems
+        else pd.DataFrame(columns=ERROR_COLUMNS)
+    )
+    ok = ~rows.isin(errors["row"])
+    text_frame = pd.DataFrame({k: v[ok] for k, v in text.items()}, index=data.index[ok])
+    return text_frame, {k: v[ok].to_numpy(dtype=np.float64) for k, v in values.items()}, errors
+
+
+def run_batch(
+    df: pd.DataFrame, inputs_cls: type, compute: Compute, *, defaults: Optional[Dict[str, Any]] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Evaluate every valid row in one vectorized compute() call.
+
+    Returns (results, errors): results carry the table's other columns (ids, labels) unchanged,
+    the inputs actually used, and every compute() output as a column.
+    """
+    text, arrays, errors = batch_arrays(df, inputs_cls, defaults)
+    fields = {name for name, *_rest in input_fields(inputs_cls)}
+    passthrough = df.set_axis([normalise_header(c) for c in df.columns], axis=1)
+    out = passthrough.loc[text.index, [c for c in passthrough.columns if c not in fields]].copy()
+    for k, v in text.items():
+        out[k] = v.to_numpy()
+    for k, v in arrays.items():
+        out[k] = v
+    if len(out):
+        for k, v in compute(arrays).items():
+            out[k] = np.broadcast_to(v, (len(out),))
+    return out.reset_index(drop=True), errors
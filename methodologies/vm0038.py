@@ -0,0 +1,271 @@
+"""
+methodologies/vm0038.py
+
+VM0038-style EV charging (demo): avoided ICE fuel vs grid electricity for charging.
+
+Key guarantees:
+- compute() takes one array per Inputs field and returns per-point period totals in closed form:
+  project = P0 · (1 - g^Y) / (1 - g) with g = 1 - decarbonisation, and the clamped ER sum
+  Σ max(B - P0 g^t, 0) starts at the first year the project falls below the baseline. No year
+  axis is built, so Monte Carlo draws and sweeps stay one pass.
+- crediting_matrices() gives the (site × year) series for any number of sites; years beyond a
+  site's own crediting period are 0.
+- site_batch() accepts sites described by fuel avoided or by their charger fleet; blank cells
+  fall back to the calculator's current values.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from methodologies.base import Arrays, as_arrays, batch_arrays, first, point_records, run_batch, spec
+from utils.importers import ERROR_COLUMNS
+from utils.units import convert
+
+
+NAME = "VM0038"
+RENEWABLE_EF = 0.0  # kg CO2e/kWh (assumed)
+KWH_PER_LITRE_AVOIDED = 2.5  # charger-fleet mode: kWh that replace one litre of fuel (placeholder)
+MAX_YEARS = 100
+OUTPUTS = ("baseline_tco2e", "project_tco2e", "er_tco2e")
+# outputs_json key (as saved by the Methodologies page) -> compute() output
+YEAR_COLUMNS = ("Year", "Baseline (tCO2e)", "Project (tCO2e)", "ER (tCO2e)")
+SAVED_OUTPUTS = {"total_baseline_tco2e": "baseline_tco2e", "total_project_tco2e": "project_tco2e", "total_er_tco2e": "er_tco2e"}
+
+
+@dataclass(frozen=True)
+class Inputs:
+    litres_year: float = field(metadata=spec("Fuel avoided", "L/yr"))
+    ef_tail: float = field(metadata=spec("Tailpipe EF", "kg CO2e/L"))
+    kwh_delivered: float = field(metadata=spec("Electricity delivered", "kWh/yr"))
+    grid_ef: float = field(metadata=spec("Grid EF", "kg CO2e/kWh"))
+    ef_wtt: float = field(default=0.0, metadata=spec("Well-to-tank EF", "kg CO2e/L"))
+    include_wtt: bool = field(default=True, metadata=spec("Include WTT"))
+    ren_frac: float = field(default=0.0, metadata=spec("Renewable fraction", "0–1", max=1.0))
+    annual_decarb: float = field(default=0.0, metadata=spec("Annual grid decarbonisation", "0–1", max=1.0))
+    years: int = field(default=7, metadata=spec("Crediting period", "years", min=1, max=MAX_YEARS))
+
+
+@dataclass(frozen=True)
+class Result:
+    baseline_tco2e: float
+    project_tco2e: float
+    er_tco2e: float
+    yearly: List[Dict[str, float]] = field(default_factory=list, compare=False)
+
+
+# ------------------------------------------------------------
+# Engine
+# ------------------------------------------------------------
+def geometric_total(g: Any, start: Any, stop: Any) -> np.ndarray:
+    """Σ g^t for t in [start, stop), elementwise (g = 1 handled exactly)."""
+    g, start, stop = np.broadcast_arrays(np.asarray(g, float), np.asarray(start, float), np.asarray(stop, float))
+    span = np.maximum(stop - start, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = (g**start - g**np.maximum(stop, start)) / (1.0 - g)
+    return np.where(g == 1.0, span, ratio)
+
+
+def _annual(s: Arrays) -> Tuple[np.ndarray, np.ndarray]:
+    """(baseline kg/yr, project kg in year 1) per point."""
+    baseline = s["litres_year"] * (s["ef_tail"] + s["ef_wtt"] * s["include_wtt"])
+    project0 = s["kwh_delivered"] * (s["grid_ef"] * (1.0 - s["ren_frac"]) + RENEWABLE_EF * s["ren_frac"])
+    return baseline, project0
+
+
+def compute(s: Arrays) -> Arrays:
+    """Closed-form period totals (tCO2e) per point."""
+    b, p0 = _annual(s)
+    b, p0, d, y = np.broadcast_arrays(b, p0, np.asarray(s["annual_decarb"], float), np.rint(s["years"]))
+    if ((d < 0) | (d > 1)).any():
+        raise ValueError("Annual decarbonisation must be between 0 and 1.")
+    g = 1.0 - d
+    # First year in which the project is below the baseline (ER > 0 from then on).
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing = np.floor(np.log(b / p0) / np.log(g)) + 1.0
+    start = np.where(p0 <= b, 0.0, np.where(g == 1.0, y, np.where(g == 0.0, 1.0, np.where(b <= 0, y, crossing))))
+    start = np.clip(np.nan_to_num(start, nan=y, posinf=y), 0.0, y)
+    er = np.maximum((y - start) * b - p0 * geometric_total(g, start, y), 0.0)
+    return {
+        "baseline_tco2e": b * y / 1000.0,
+        "project_tco2e": p0 * geometric_total(g, 0.0, y) / 1000.0,
+        "er_tco2e": er / 1000.0,
+    }
+
+
+def crediting_matrices(s: Arrays) -> Dict[str, np.ndarray]:
+    """(site × year) baseline / project / ER in tCO2e, plus "years" (1..H) and "site_years"."""
+    b, p0 = _annual(s)
+    b, p0, d, y = np.broadcast_arrays(b, p0, np.asarray(s["annual_decarb"], float), np.rint(s["years"]))
+    if ((y < 1) | (y > MAX_YEARS)).any():
+        raise ValueError(f"Crediting period must be 1–{MAX_YEARS} years.")
+    horizon = int(y.max()) if y.size else 0
+    t = np.arange(horizon, dtype=np.float64)
+    active = t[None, :] < y[:, None]
+    base = np.where(active, b[:, None], 0.0)
+    proj = np.where(active, p0[:, None] * (1.0 - d)[:, None] ** t[None, :], 0.0)
+    return {
+        "years": np.arange(1, horizon + 1),
+        "site_years": y.astype(int),
+        "baseline": base / 1000.0,
+        "project": proj / 1000.0,
+        "er": np.where(active, np.maximum(base - proj, 0.0), 0.0) / 1000.0,
+    }
+
+
+def year_table(matrices: Dict[str, np.ndarray], site: int = 0) -> pd.DataFrame:
+    """One site's year series in the page's table layout."""
+    n = int(matrices["site_years"][site])
+    return pd.DataFrame(
+        {
+            col: values
+            for col, values in zip(
+                YEAR_COLUMNS,
+                (matrices["years"][:n], matrices["baseline"][site, :n], matrices["project"][site, :n], matrices["er"][site, :n]),
+            )
+        }
+    )
+
+
+def evaluate(inputs: Inputs) -> Result:
+    arrays = as_arrays(inputs)
+    totals = first(compute(arrays))
+    return Result(**totals, yearly=year_table(crediting_matrices(arrays)).to_dict("records"))
+
+
+def evaluate_batch(df: pd.DataFrame, defaults: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """One row per project / site with Inputs columns -> (inputs + totals, errors)."""
+    return run_batch(df, Inputs, compute, defaults=defaults)
+
+
+def from_saved(saved: Dict[str, Any]) -> Inputs:
+    """Inputs behind a saved ledger entry (emissions.inputs_json from the Methodologies page)."""
+    if "engine" in saved:
+        return Inputs(**saved["engine"])
+    # Older entries kept tailpipe + WTT only as baseline_kg (kg CO2e/yr), so it becomes ef_tail.
+    litres = float(saved["fuel_avoided_litres_year"])
+    return Inputs(
+        litres_year=litres,
+        ef_tail=float(saved["baseline_kg"]) / litres if litres else 0.0,
+        kwh_delivered=float(saved["kwh_delivered"]),
+        grid_ef=float(saved["grid_ef_kg_per_kwh"]),
+        include_wtt=False,
+        ren_frac=float(saved.get("renewable_fraction_pct", 0.0)) / 100.0,
+        annual_decarb=float(saved.get("annual_grid_decarbonisation_pct", 0.0)) / 100.0,
+        years=int(saved.get("years", 7)),
+    )
+
+
+def saved_outputs(s: Arrays, out: Arrays) -> List[Dict[str, Any]]:
+    """Per point, the outputs_json layout the page saves (totals + yearly table)."""
+    m = crediting_matrices(s)
+    years, base, proj, er = m["years"].tolist(), m["baseline"].tolist(), m["project"].tolist(), m["er"].tolist()
+    out_rows = []
+    for i, rec in enumerate(point_records(out, SAVED_OUTPUTS)):
+        n = int(m["site_years"][i])
+        # same records as year_table(m, i).to_dict("records"), without a DataFrame per point
+        rec["yearly_table"] = [dict(zip(YEAR_COLUMNS, v)) for v in zip(years[:n], base[i][:n], proj[i][:n], er[i][:n])]
+        out_rows.append(rec)
+    return out_rows
+
+
+# ------------------------------------------------------------
+# Site batches (fuel avoided or charger fleet per row)
+# ------------------------------------------------------------
+FLEET_COLUMNS = ("n_chargers", "sessions_per_day", "kwh_per_session", "operating_days")
+
+
+@dataclass(frozen=True)
+class Site:
+    site_id: str = ""
+    fuel_type: str = ""
+    litres_year: Optional[float] = field(default=None, metadata=spec("Fuel avoided", "L/yr"))
+    n_chargers: Optional[float] = field(default=None, metadata=spec("Chargers"))
+    sessions_per_day: Optional[float] = field(default=None, metadata=spec("Sessions per charger per day"))
+    kwh_per_session: Optional[float] = field(default=None, metadata=spec("Energy per session", "kWh"))
+    operating_days: Optional[float] = field(default=None, metadata=spec("Operating days", "days/yr", max=366))
+    charge_eff_pct: float = field(default=90.0, metadata=spec("Charging efficiency", "%", min=1.0, max=100.0))
+    ef_tail: Optional[float] = field(default=None, metadata=spec("Tailpipe EF", "kg CO2e/L"))
+    ef_wtt: Optional[float] = field(default=None, metadata=spec("Well-to-tank EF", "kg CO2e/L"))
+    grid_ef: float = field(default=0.95, metadata=spec("Grid EF", "kg CO2e/kWh"))
+    renewable_frac_pct: float = field(default=0.0, metadata=spec("Renewable fraction", "%", max=100.0))
+    annual_decarb_pct: float = field(default=0.0, metadata=spec("Annual grid decarbonisation", "%", max=100.0))
+    years: int = field(default=7, metadata=spec("Crediting period", "years", min=1, max=MAX_YEARS))
+    include_wtt: bool = field(default=True, metadata=spec("Include WTT"))
+
+
+SITE_COLUMNS = [f for f in Site.__dataclass_fields__]
+
+
+def fleet_kwh(n_chargers: Any, sessions_per_day: Any, kwh_per_session: Any, operating_days: Any) -> np.ndarray:
+    return np.asarray(n_chargers, float) * np.asarray(sessions_per_day, float) * np.asarray(kwh_per_session, float) * np.asarray(operating_days, float)
+
+
+def fuel_kwh(litres_year: Any, mj_per_litre: Any) -> np.ndarray:
+    return np.asarray(litres_year, float) * np.asarray(mj_per_litre, float) * convert(1.0, "MJ", "kWh")
+
+
+def site_batch(
+    sites: pd.DataFrame,
+    defaults: Dict[str, Any],
+    fuel_ef: Dict[str, Any],
+    wtt_ef: Dict[str, float],
+    fuel_energy_mj: Dict[str, float],
+) -> Tuple[pd.DataFrame, Dict[str, np.ndarray], pd.DataFrame]:
+    """Site table -> (per-site inputs + totals, crediting_matrices, errors).
+
+    A row with all FLEET_COLUMNS is a charger fleet (fuel avoided = kWh / KWH_PER_LITRE_AVOIDED);
+    otherwise it needs litres_year. Blank cells take `defaults` (keyed like Site fields).
+    """
+    text, a, errors = batch_arrays(sites, Site, defaults)
+    rows = pd.Series(np.arange(2, len(sites) + 2), index=sites.index).loc[text.index]
+    fleet = np.all([~np.isnan(a[c]) for c in FLEET_COLUMNS], axis=0)
+    fuel = text["fuel_type"]
+    known = fuel.isin([f for f, v in fuel_ef.items() if v is not None]).to_numpy()
+    extra = [
+        pd.DataFrame({"row": rows[m], "column": col, "value": "", "error": msg})
+        for m, col, msg in (
+            (~fleet & np.isnan(a["litres_year"]), "litres_year", "required (or all charger-fleet columns)"),
+            (~known & np.isnan(a["ef_tail"]), "fuel_type", "unknown fuel (give ef_tail / ef_wtt)"),
+        )
+        if m.any()
+    ]
+    if extra:
+        errors = pd.concat([errors, *extra], ignore_index=True).sort_values(["row", "column"], kind="stable").reset_index(drop=True)
+    ok = ~rows.isin(errors["row"]).to_numpy()
+    text, a, fleet, fuel = text[ok], {k: v[ok] for k, v in a.items()}, fleet[ok], fuel[ok]
+
+    kwh_fleet = fleet_kwh(*(np.nan_to_num(a[c]) for c in FLEET_COLUMNS))
+    mj = fuel.map(fuel_energy_mj).astype(float).fillna(0.0).to_numpy()
+    litres = np.where(fleet, kwh_fleet / KWH_PER_LITRE_AVOIDED, np.nan_to_num(a["litres_year"]))
+    kwh_year = np.where(fleet, kwh_fleet, fuel_kwh(litres, mj))
+    inputs = {
+        "litres_year": litres,
+        "ef_tail": np.where(np.isnan(a["ef_tail"]), fuel.map(lambda f: fuel_ef.get(f)).astype(float).to_numpy(), a["ef_tail"]),
+        "ef_wtt": np.nan_to_num(np.where(np.isnan(a["ef_wtt"]), fuel.map(wtt_ef).astype(float).to_numpy(), a["ef_wtt"])),
+        "include_wtt": a["include_wtt"],
+        "kwh_delivered": kwh_year / (a["charge_eff_pct"] / 100.0),
+        "grid_ef": a["grid_ef"],
+        "ren_frac": a["renewable_frac_pct"] / 100.0,
+        "annual_decarb": a["annual_decarb_pct"] / 100.0,
+        "years": a["years"],
+    }
+    site_ids = text["site_id"].where(text["site_id"] != "", "site-" + rows[ok].astype(str))
+    table = pd.DataFrame(
+        {
+            "site_id": site_ids.to_numpy(),
+            "mode": np.where(fleet, "charger fleet", "fuel avoided"),
+            "fuel_type": fuel.to_numpy(),
+            "litres_year": litres,
+            "kwh_delivered": inputs["kwh_delivered"],
+            "grid_ef": inputs["grid_ef"],
+            "years": inputs["years"].astype(int),
+            **(compute(inputs) if len(litres) else {k: np.zeros(0) for k in OUTPUTS}),
+        }
+    )
+    matrices = crediting_matrices(inputs) if len(litres) else {}
+    return table, matrices, errors if not errors.empty else pd.DataFrame(columns=ERROR_COLUMNS)
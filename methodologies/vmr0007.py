@@ -0,0 +1,106 @@
+"""
+methodologies/vmr0007.py
+
+VMR0007-style waste recovery and recycling (demo): landfill baseline vs recycling, residue
+landfill, transport and energy.
+
+Key guarantees:
+- compute() takes one array per Inputs field; every step is elementwise, so one call covers a
+  single facility, a portfolio file or 10^6 Monte Carlo / sweep points.
+- Factors are tCO2e per tonne (per tonne-km for transport); ER keeps the max(…, 0) clamp.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from methodologies.base import Arrays, as_arrays, first, point_records, run_batch, spec
+
+
+NAME = "VMR0007"
+OUTPUTS = ("baseline_tco2e", "project_tco2e", "er_tco2e")
+MATERIALS = ("Plastic", "Paper", "Glass", "Metal")
+# outputs_json key (as saved by the Methodologies page) -> compute() output
+SAVED_OUTPUTS = {k: k for k in ("clean_tons", "residue_tons", "baseline_tco2e", "project_tco2e", "er_tco2e")}
+BREAKDOWN = {"recycling": "recycling_tco2e", "residue_landfill": "residue_landfill_tco2e", "transport": "transport_tco2e"}
+
+
+@dataclass(frozen=True)
+class Inputs:
+    tons: float = field(metadata=spec("Waste processed", "t/yr"))
+    landfill_ef: float = field(metadata=spec("Landfill EF", "tCO2e/t"))
+    recycle_ef: float = field(metadata=spec("Recycling process emissions", "tCO2e/t"))
+    contamination_frac: float = field(default=0.0, metadata=spec("Contamination", "0–1", max=1.0))
+    transport_km: float = field(default=0.0, metadata=spec("Transport distance", "km"))
+    transport_ef: float = field(default=0.0, metadata=spec("Transport EF", "tCO2e/t·km"))
+    energy_tco2e: float = field(default=0.0, metadata=spec("Other energy emissions", "tCO2e/yr"))
+    material: str = ""
+
+
+@dataclass(frozen=True)
+class Result:
+    clean_tons: float
+    residue_tons: float
+    recycling_tco2e: float
+    residue_landfill_tco2e: float
+    transport_tco2e: float
+    baseline_tco2e: float
+    project_tco2e: float
+    er_tco2e: float
+
+
+def compute(s: Arrays) -> Arrays:
+    clean = s["tons"] * (1.0 - s["contamination_frac"])
+    residue = s["tons"] - clean
+    recycling = clean * s["recycle_ef"]
+    residue_landfill = residue * s["landfill_ef"]  # residue still landfilled (demo)
+    transport = s["tons"] * s["transport_km"] * s["transport_ef"]
+    energy = np.broadcast_to(s["energy_tco2e"], np.shape(clean))
+    baseline = s["tons"] * s["landfill_ef"]
+    project = recycling + residue_landfill + transport + energy
+    return {
+        "clean_tons": clean,
+        "residue_tons": residue,
+        "recycling_tco2e": recycling,
+        "residue_landfill_tco2e": residue_landfill,
+        "transport_tco2e": transport,
+        "baseline_tco2e": baseline,
+        "project_tco2e": project,
+        "er_tco2e": np.maximum(baseline - project, 0.0),
+    }
+
+
+def evaluate(inputs: Inputs) -> Result:
+    return Result(**first(compute(as_arrays(inputs))))
+
+
+def evaluate_batch(df: pd.DataFrame, defaults: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """One row per facility with Inputs columns -> (inputs + results, errors)."""
+    return run_batch(df, Inputs, compute, defaults=defaults)
+
+
+def from_saved(saved: Dict[str, Any]) -> Inputs:
+    """Inputs behind a saved ledger entry (emissions.inputs_json from the Methodologies page)."""
+    if "engine" in saved:
+        return Inputs(**saved["engine"])
+    return Inputs(
+        tons=float(saved["tons"]),
+        landfill_ef=float(saved["landfill_ef_tco2e_per_ton"]),
+        recycle_ef=float(saved["recycle_ef_tco2e_per_ton"]),
+        contamination_frac=float(saved.get("contamination_pct", 0.0)) / 100.0,
+        transport_km=float(saved.get("transport_km", 0.0)),
+        transport_ef=float(saved.get("transport_ef_tco2e_per_ton_km", 0.0)),
+        energy_tco2e=float(saved.get("energy_tco2e_year", 0.0)),
+        material=str(saved.get("material") or ""),
+    )
+
+
+def saved_outputs(s: Arrays, out: Arrays) -> List[Dict[str, Any]]:
+    """Per point, the outputs_json layout the page saves."""
+    energy = np.broadcast_to(s["energy_tco2e"], np.shape(out["er_tco2e"]))
+    breakdown = point_records({**out, "energy": energy}, {**BREAKDOWN, "energy": "energy"})
+    return [{**rec, "breakdown": b} for rec, b in zip(point_records(out, SAVED_OUTPUTS), breakdown)]
@@ -1,18 +1,24 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-import json
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any
 
 from utils.load_css import load_css
+from utils.audit import audit_page, get_entry as get_audit_entry, page_keys, search_audit
+from utils.db import DB_PATH, db_query
+from utils.export import EXPORT_TABLES, build_export_zip, columnar_available, discard_export, export_file_name
+from utils.importers import import_projects, project_template_csv, read_table, validate_projects
+from utils.ingest import DAYFIRST_DEFAULT, ingest_file
+from utils.rollups import project_rollups, project_totals
+from utils.schema import ensure_schema, schema_version
+from utils.uow import unit_of_work
 
 # ------------------------------------------------------------
 # PAGE CONFIG
 # ------------------------------------------------------------
-from utils.ui import setup_page, render_hero
+from utils.ui import clear_project_cache, project_picker, render_hero, setup_page
 
 setup_page(
     page_title="Carbon Registry • Registry",
@@ -29,122 +35,14 @@ render_hero(
 # ------------------------------------------------------------
 # SETTINGS
 # ------------------------------------------------------------
-DB_PATH = Path("data/carbon_registry.db")
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-
 TAB_KEYS = ["projects", "credits", "audit", "export"]
 TAB_LABELS = ["📂 Projects & Foundations", "💳 Credits & Sales (optional)", "📝 Audit Trail", "⬇️ Export"]
 
 DEBUG = bool(st.secrets.get("DEBUG", False)) if hasattr(st, "secrets") else False
 
 # ------------------------------------------------------------
-# DB LAYER
+# SCHEMA (migrations run once per process)
 # ------------------------------------------------------------
-@st.cache_resource
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def db_exec(query: str, params: Tuple = ()) -> None:
-    conn = get_conn()
-    conn.execute(query, params)
-    conn.commit()
-
-def db_query(query: str, params: Tuple = ()) -> pd.DataFrame:
-    conn = get_conn()
-    cur = conn.execute(query, params)
-    rows = cur.fetchall()
-    return pd.DataFrame([dict(r) for r in rows])
-
-def ensure_schema() -> None:
-    db_exec("""
-    CREATE TABLE IF NOT EXISTS projects (
-        project_id TEXT PRIMARY KEY,
-        project_code TEXT UNIQUE,
-        project_name TEXT NOT NULL,
-        owner_org TEXT,
-        country TEXT,
-        region TEXT,
-        sector TEXT,
-        methodology TEXT,
-        standard TEXT,
-        baseline_year INTEGER,
-        start_date TEXT,
-        end_date TEXT,
-        status TEXT DEFAULT 'Active',
-        description TEXT,
-        created_at TEXT NOT NULL,
-        updated_at TEXT NOT NULL
-    );
-    """)
-
-    # NEW: foundational layer (minimal but powerful)
-    db_exec("""
-    CREATE TABLE IF NOT EXISTS project_foundations (
-        project_id TEXT PRIMARY KEY,
-        boundary_summary TEXT,
-        baseline_summary TEXT,
-        intervention_summary TEXT,
-        key_assumptions TEXT,
-        data_sources TEXT,
-        uncertainty_notes TEXT,
-        evidence_checklist TEXT,
-        updated_at TEXT NOT NULL,
-        FOREIGN KEY(project_id) REFERENCES projects(project_id)
-    );
-    """)
-
-    db_exec("""
-    CREATE TABLE IF NOT EXISTS credits (
-        credit_id TEXT PRIMARY KEY,
-        project_id TEXT NOT NULL,
-        vintage_year INTEGER NOT NULL,
-        credits_issued REAL DEFAULT 0,
-        issuance_date TEXT,
-        registry_program TEXT,
-        serial_range TEXT,
-        notes TEXT,
-        created_at TEXT NOT NULL,
-        updated_at TEXT NOT NULL,
-        FOREIGN KEY(project_id) REFERENCES projects(project_id)
-    );
-    """)
-
-    db_exec("""
-    CREATE TABLE IF NOT EXISTS sales (
-        sale_id TEXT PRIMARY KEY,
-        project_id TEXT NOT NULL,
-        credit_id TEXT,
-        sale_date TEXT NOT NULL,
-        buyer TEXT,
-        credits_sold REAL NOT NULL,
-        price_per_credit REAL,
-        currency TEXT DEFAULT 'USD',
-        contract_ref TEXT,
-        notes TEXT,
-        created_at TEXT NOT NULL,
-        updated_at TEXT NOT NULL,
-        FOREIGN KEY(project_id) REFERENCES projects(project_id),
-        FOREIGN KEY(credit_id) REFERENCES credits(credit_id)
-    );
-    """)
-
-    db_exec("""
-    CREATE TABLE IF NOT EXISTS audit_logs (
-        audit_id TEXT PRIMARY KEY,
-        timestamp TEXT NOT NULL,
-        actor TEXT,
-        action TEXT NOT NULL,
-        entity_type TEXT NOT NULL,
-        entity_id TEXT,
-        project_id TEXT,
-        before_json TEXT,
-        after_json TEXT,
-        meta_json TEXT
-    );
-    """)
-
 ensure_schema()
 
 # ------------------------------------------------------------
@@ -153,34 +51,8 @@ ensure_schema()
 def now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
-def audit_log(
-    action: str,
-    entity_type: str,
-    entity_id: Optional[str] = None,
-    project_id: Optional[str] = None,
-    before: Optional[Dict[str, Any]] = None,
-    after: Optional[Dict[str, Any]] = None,
-    meta: Optional[Dict[str, Any]] = None
-) -> None:
-    actor = st.session_state.get("actor_name", "unknown")
-    db_exec(
-        """
-        INSERT INTO audit_logs (audit_id, timestamp, actor, action, entity_type, entity_id, project_id, before_json, after_json, meta_json)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            str(uuid.uuid4()),
-            now_iso(),
-            actor,
-            action,
-            entity_type,
-            entity_id,
-            project_id,
-            json.dumps(before) if before else None,
-            json.dumps(after) if after else None,
-            json.dumps(meta) if meta else None,
-        ),
-    )
+def current_actor() -> str:
+    return st.session_state.get("actor_name", "unknown")
 
 # ------------------------------------------------------------
 # QUERY PARAMS (deep-link tabs)
@@ -252,15 +124,25 @@ def get_foundation(project_id: str) -> Dict[str, Any]:
     return df.iloc[0].to_dict()
 
 def upsert_foundation(project_id: str, payload: Dict[str, Any]) -> None:
-    ts = now_iso()
-    existing = db_query("SELECT * FROM project_foundations WHERE project_id=?", (project_id,))
-    if existing.empty:
-        db_exec(
+    # One transaction: before-image, upsert (RETURNING the after-image) and audit row.
+    with unit_of_work(actor=current_actor()) as uow:
+        before = uow.fetch_one("SELECT * FROM project_foundations WHERE project_id=?", (project_id,))
+        after = uow.fetch_one(
             """
             INSERT INTO project_foundations (
                 project_id, boundary_summary, baseline_summary, intervention_summary,
                 key_assumptions, data_sources, uncertainty_notes, evidence_checklist, updated_at
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(project_id) DO UPDATE SET
+                boundary_summary=excluded.boundary_summary,
+                baseline_summary=excluded.baseline_summary,
+                intervention_summary=excluded.intervention_summary,
+                key_assumptions=excluded.key_assumptions,
+                data_sources=excluded.data_sources,
+                uncertainty_notes=excluded.uncertainty_notes,
+                evidence_checklist=excluded.evidence_checklist,
+                updated_at=excluded.updated_at
+            RETURNING *
             """,
             (
                 project_id,
@@ -271,53 +153,17 @@ def upsert_foundation(project_id: str, payload: Dict[str, Any]) -> None:
                 payload.get("data_sources"),
                 payload.get("uncertainty_notes"),
                 payload.get("evidence_checklist"),
-                ts,
-            ),
-        )
-        audit_log(
-            action="UPSERT",
-            entity_type="project_foundations",
-            entity_id=project_id,
-            project_id=project_id,
-            after=payload,
-            meta={"mode": "insert"},
-        )
-    else:
-        before = existing.iloc[0].to_dict()
-        db_exec(
-            """
-            UPDATE project_foundations SET
-                boundary_summary=?,
-                baseline_summary=?,
-                intervention_summary=?,
-                key_assumptions=?,
-                data_sources=?,
-                uncertainty_notes=?,
-                evidence_checklist=?,
-                updated_at=?
-            WHERE project_id=?
-            """,
-            (
-                payload.get("boundary_summary"),
-                payload.get("baseline_summary"),
-                payload.get("intervention_summary"),
-                payload.get("key_assumptions"),
-                payload.get("data_sources"),
-                payload.get("uncertainty_notes"),
-                payload.get("evidence_checklist"),
-                ts,
-                project_id,
+                now_iso(),
             ),
         )
-        after = get_foundation(project_id)
-        audit_log(
+        uow.audit(
             action="UPSERT",
             entity_type="project_foundations",
             entity_id=project_id,
             project_id=project_id,
             before=before,
             after=after,
-            meta={"mode": "update"},
+            meta={"mode": "update" if before else "insert"},
         )
 
 # ------------------------------------------------------------
@@ -343,7 +189,7 @@ with st.sidebar:
 
     st.markdown("### ✅ Registry Health")
     st.write(f"DB: `{DB_PATH.as_posix()}`")
-    st.write("Schema: OK")
+    st.write(f"Schema: v{schema_version()}")
     if DEBUG:
         st.caption("DEBUG mode enabled.")
 
@@ -372,28 +218,22 @@ with tabs[0]:
     with cols[1]:
         if st.button("↻ Refresh list"):
             list_projects.clear()
+            clear_project_cache()
             st.rerun()
     with cols[2]:
         if st.button("Go to Credits & Sales ➜"):
             goto_tab("credits")
             st.rerun()
 
-    dfp = list_projects(active_only=show_active_only)
-
-    if dfp.empty:
+    selected_project_id = project_picker(
+        "Select a project (sets Active Project context)",
+        key="registry_project_pick",
+        scope="active" if show_active_only else "all",
+        default_id=st.session_state.get("active_project_id"),
+    )
+    if selected_project_id is None:
         st.info("No projects yet. Create your first project below.")
-        selected_project_id = None
     else:
-        current = st.session_state.get("active_project_id")
-        options = dfp["project_id"].tolist()
-        default_idx = options.index(current) if current in options else 0
-
-        selected_project_id = st.selectbox(
-            "Select a project (sets Active Project context)",
-            options=options,
-            index=default_idx,
-            format_func=lambda pid: f"{dfp.loc[dfp.project_id==pid, 'project_code'].values[0]} — {dfp.loc[dfp.project_id==pid, 'project_name'].values[0]}",
-        )
         set_active_project(selected_project_id)
 
     st.divider()
@@ -432,46 +272,89 @@ with tabs[0]:
             else:
                 pid = str(uuid.uuid4())
                 ts = now_iso()
-                db_exec(
-                    """
-                    INSERT INTO projects (
-                        project_id, project_code, project_name, owner_org, country, region, sector,
-                        methodology, standard, baseline_year, start_date, end_date, status, description,
-                        created_at, updated_at
+                with unit_of_work(actor=current_actor()) as uow:
+                    uow.execute(
+                        """
+                        INSERT INTO projects (
+                            project_id, project_code, project_name, owner_org, country, region, sector,
+                            methodology, standard, baseline_year, start_date, end_date, status, description,
+                            created_at, updated_at
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            pid,
+                            project_code.strip(),
+                            project_name.strip(),
+                            owner_org.strip() or None,
+                            country.strip() or None,
+                            region.strip() or None,
+                            sector,
+                            methodology.strip() or None,
+                            standard,
+                            int(baseline_year),
+                            start_date.isoformat() if start_date else None,
+                            end_date.isoformat() if end_date else None,
+                            "Active",
+                            description.strip() or None,
+                            ts,
+                            ts,
+                        ),
+                    )
+                    uow.audit(
+                        action="CREATE",
+                        entity_type="project",
+                        entity_id=pid,
+                        project_id=pid,
+                        after={"project_code": project_code, "project_name": project_name},
                     )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        pid,
-                        project_code.strip(),
-                        project_name.strip(),
-                        owner_org.strip() or None,
-                        country.strip() or None,
-                        region.strip() or None,
-                        sector,
-                        methodology.strip() or None,
-                        standard,
-                        int(baseline_year),
-                        start_date.isoformat() if start_date else None,
-                        end_date.isoformat() if end_date else None,
-                        "Active",
-                        description.strip() or None,
-                        ts,
-                        ts,
-                    ),
-                )
-                audit_log(
-                    action="CREATE",
-                    entity_type="project",
-                    entity_id=pid,
-                    project_id=pid,
-                    after={"project_code": project_code, "project_name": project_name},
-                )
                 list_projects.clear()
+                clear_project_cache()
                 set_active_project(pid)
                 st.success("Project created.")
                 st.rerun()
 
+    # BULK IMPORT
+    with st.expander("📥 Bulk import projects (CSV / XLSX)", expanded=False):
+        st.caption(
+            "One row per project; headers match the projects table (project_code and project_name required). "
+            "Nothing is written until the whole file validates, then everything is inserted in one transaction."
+        )
+        st.download_button(
+            "Download CSV template",
+            data=project_template_csv(),
+            file_name="projects_import_template.csv",
+            mime="text/csv",
+        )
+        upload = st.file_uploader("Projects file", type=["csv", "xlsx"], key="project_import_file")
+        if upload is not None:
+            try:
+                raw_df = read_table(upload, upload.name)
+            except Exception as e:
+                st.error(f"Could not read file: {e}")
+                raw_df = None
+
+            if raw_df is not None:
+                clean_df, import_errors, import_warnings = validate_projects(raw_df)
+                for w in import_warnings:
+                    st.warning(w)
+                st.write(f"**{len(raw_df)}** rows read · **{len(clean_df)}** valid · **{import_errors['row'].nunique()}** with errors")
+                if not import_errors.empty:
+                    st.dataframe(import_errors, use_container_width=True, hide_index=True)
+                skip_invalid = st.checkbox("Import the valid rows and skip rows with errors", value=False, key="project_import_skip")
+                st.dataframe(clean_df.head(50), use_container_width=True, hide_index=True)
+
+                can_import = not clean_df.empty and (import_errors.empty or skip_invalid)
+                if st.button(f"Import {len(clean_df)} project(s)", disabled=not can_import, type="primary", key="project_import_go"):
+                    try:
+                        result = import_projects(clean_df, actor=current_actor(), source=upload.name)
+                    except Exception as e:
+                        st.error(f"Import failed, nothing was written: {e}")
+                    else:
+                        list_projects.clear()
+                        clear_project_cache()
+                        st.success(f"Imported {result['rows']} projects (import {result['import_id']}).")
+
     # EDIT PROJECT + FOUNDATIONS
     proj = active_project()
     if proj:
@@ -546,49 +429,51 @@ with tabs[0]:
             save = st.form_submit_button("Save changes", use_container_width=True)
 
             if save:
-                before = proj.copy()
                 ts = now_iso()
-                db_exec(
-                    """
-                    UPDATE projects SET
-                        project_code=?, project_name=?, owner_org=?, country=?, region=?, sector=?,
-                        methodology=?, standard=?, baseline_year=?, start_date=?, end_date=?, status=?,
-                        description=?, updated_at=?
-                    WHERE project_id=?
-                    """,
-                    (
-                        e_project_code.strip(),
-                        e_project_name.strip(),
-                        e_owner_org.strip() or None,
-                        e_country.strip() or None,
-                        e_region.strip() or None,
-                        e_sector,
-                        e_methodology.strip() or None,
-                        e_standard,
-                        int(e_baseline_year),
-                        e_start_date.strip() or None,
-                        e_end_date.strip() or None,
-                        e_status,
-                        e_description.strip() or None,
-                        ts,
-                        proj["project_id"],
-                    ),
-                )
-                after = get_project(proj["project_id"]) or {}
-                audit_log(
-                    action="UPDATE",
-                    entity_type="project",
-                    entity_id=proj["project_id"],
-                    project_id=proj["project_id"],
-                    before=before,
-                    after=after,
-                )
+                with unit_of_work(actor=current_actor()) as uow:
+                    before = uow.fetch_one("SELECT * FROM projects WHERE project_id=?", (proj["project_id"],)) or proj.copy()
+                    after = uow.fetch_one(
+                        """
+                        UPDATE projects SET
+                            project_code=?, project_name=?, owner_org=?, country=?, region=?, sector=?,
+                            methodology=?, standard=?, baseline_year=?, start_date=?, end_date=?, status=?,
+                            description=?, updated_at=?
+                        WHERE project_id=?
+                        RETURNING *
+                        """,
+                        (
+                            e_project_code.strip(),
+                            e_project_name.strip(),
+                            e_owner_org.strip() or None,
+                            e_country.strip() or None,
+                            e_region.strip() or None,
+                            e_sector,
+                            e_methodology.strip() or None,
+                            e_standard,
+                            int(e_baseline_year),
+                            e_start_date.strip() or None,
+                            e_end_date.strip() or None,
+                            e_status,
+                            e_description.strip() or None,
+                            ts,
+                            proj["project_id"],
+                        ),
+                    )
+                    uow.audit(
+                        action="UPDATE",
+                        entity_type="project",
+                        entity_id=proj["project_id"],
+                        project_id=proj["project_id"],
+                        before=before,
+                        after=after or {},
+                    )
                 list_projects.clear()
+                clear_project_cache()
                 st.success("Saved.")
                 st.rerun()
 
         st.markdown("### 📄 Current projects table")
-        st.dataframe(dfp, use_container_width=True, hide_index=True)
+        st.dataframe(list_projects(active_only=show_active_only), use_container_width=True, hide_index=True)
 
 # ------------------------------------------------------------
 # TAB 2: CREDITS & SALES (optional tracking)
@@ -597,6 +482,48 @@ with tabs[1]:
     st.subheader("💳 Credits & Sales (optional)")
     st.caption("Optional tracking layer. Not a registry-of-record. Use for internal analysis only.")
 
+    with st.expander("📥 Bulk ingest issuance / retirement exports (CSV / Parquet)", expanded=False):
+        st.caption(
+            "Registry exports (Verra / Gold Standard style) are streamed in chunks and upserted on a natural key "
+            "(an issuance/retirement id column, else the serial range), so re-importing the same file is safe. "
+            "For very large files use `python -m utils.ingest credits|sales <file>`."
+        )
+        ingest_target = st.radio("Load into", ["credits", "sales"], horizontal=True, key="ingest_target",
+                                 format_func=lambda t: "Issuances → credits" if t == "credits" else "Retirements / sales → sales")
+        ingest_file_up = st.file_uploader("Export file", type=["csv", "gz", "parquet"], key="ingest_file")
+        ic1, ic2 = st.columns(2)
+        with ic1:
+            ingest_dayfirst = st.checkbox("Dates are DD/MM/YYYY", value=DAYFIRST_DEFAULT, key="ingest_dayfirst")
+        with ic2:
+            ingest_default = st.checkbox(
+                "Rows without a project column belong to the active project",
+                value=bool(st.session_state.get("active_project_id")),
+                key="ingest_default_project",
+            )
+        if ingest_file_up is not None and st.button("Ingest file", type="primary", key="ingest_go"):
+            status = st.empty()
+            try:
+                result = ingest_file(
+                    ingest_file_up,
+                    ingest_file_up.name,
+                    ingest_target,
+                    actor=current_actor(),
+                    default_project_id=st.session_state.get("active_project_id") if ingest_default else None,
+                    dayfirst=ingest_dayfirst,
+                    progress=lambda s: status.info(f"Chunk {s['chunks']}: {s['rows']:,} rows read…"),
+                )
+            except Exception as e:
+                st.error(f"Ingest stopped: {e}. Chunks already committed stay committed; re-running is safe.")
+            else:
+                ingest_errors = result.pop("errors")
+                status.success(
+                    f"{result['rows']:,} rows · {result['inserted']:,} inserted · {result['updated']:,} updated · "
+                    f"{result['unchanged']:,} unchanged · {result['rejected']:,} rejected"
+                )
+                st.caption(f"Column mapping: {result.get('mapping', {})}")
+                if not ingest_errors.empty:
+                    st.dataframe(ingest_errors, use_container_width=True, hide_index=True)
+
     proj = active_project()
     if not proj:
         st.warning("Select an active project in the Projects tab first.")
@@ -620,30 +547,31 @@ with tabs[1]:
             if submit_credit:
                 cid = str(uuid.uuid4())
                 ts = now_iso()
-                db_exec(
-                    """
-                    INSERT INTO credits (
-                        credit_id, project_id, vintage_year, credits_issued, issuance_date,
-                        registry_program, serial_range, notes, created_at, updated_at
+                with unit_of_work(actor=current_actor()) as uow:
+                    uow.execute(
+                        """
+                        INSERT INTO credits (
+                            credit_id, project_id, vintage_year, credits_issued, issuance_date,
+                            registry_program, serial_range, notes, created_at, updated_at
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            cid, proj["project_id"], int(vintage_year), float(credits_issued),
+                            issuance_date.isoformat() if issuance_date else None,
+                            registry_program.strip() or None,
+                            serial_range.strip() or None,
+                            notes.strip() or None,
+                            ts, ts
+                        )
                     )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        cid, proj["project_id"], int(vintage_year), float(credits_issued),
-                        issuance_date.isoformat() if issuance_date else None,
-                        registry_program.strip() or None,
-                        serial_range.strip() or None,
-                        notes.strip() or None,
-                        ts, ts
+                    uow.audit(
+                        action="CREATE",
+                        entity_type="credit_issuance",
+                        entity_id=cid,
+                        project_id=proj["project_id"],
+                        after={"vintage_year": vintage_year, "credits_issued": credits_issued},
                     )
-                )
-                audit_log(
-                    action="CREATE",
-                    entity_type="credit_issuance",
-                    entity_id=cid,
-                    project_id=proj["project_id"],
-                    after={"vintage_year": vintage_year, "credits_issued": credits_issued},
-                )
                 st.success("Issuance recorded.")
                 st.rerun()
 
@@ -653,6 +581,10 @@ with tabs[1]:
             (proj["project_id"],)
         )
         credit_options = ["(no link)"] + (credits_df["credit_id"].tolist() if not credits_df.empty else [])
+        credit_labels = {
+            cid: f"{cid} (vintage {int(v)})" if pd.notna(v) else str(cid)
+            for cid, v in zip(credits_df["credit_id"], credits_df["vintage_year"])
+        } if not credits_df.empty else {}
 
         with st.form("create_sale_form", clear_on_submit=True):
             s1, s2, s3 = st.columns(3)
@@ -669,8 +601,7 @@ with tabs[1]:
             link_credit = st.selectbox(
                 "Link to issuance (optional)",
                 options=credit_options,
-                format_func=lambda x: "(no link)" if x == "(no link)" else f"{x} (vintage {int(credits_df.loc[credits_df.credit_id==x, 'vintage_year'].values[0])})"
-                if (x != "(no link)" and not credits_df.empty and (credits_df.credit_id == x).any()) else str(x)
+                format_func=lambda x: credit_labels.get(x, str(x)),
             )
             notes = st.text_area("Notes", height=70)
 
@@ -678,50 +609,51 @@ with tabs[1]:
             if submit_sale:
                 sid = str(uuid.uuid4())
                 ts = now_iso()
-                db_exec(
-                    """
-                    INSERT INTO sales (
-                        sale_id, project_id, credit_id, sale_date, buyer, credits_sold,
-                        price_per_credit, currency, contract_ref, notes, created_at, updated_at
+                with unit_of_work(actor=current_actor()) as uow:
+                    uow.execute(
+                        """
+                        INSERT INTO sales (
+                            sale_id, project_id, credit_id, sale_date, buyer, credits_sold,
+                            price_per_credit, currency, contract_ref, notes, created_at, updated_at
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            sid,
+                            proj["project_id"],
+                            None if link_credit == "(no link)" else link_credit,
+                            sale_date.isoformat(),
+                            buyer.strip() or None,
+                            float(credits_sold),
+                            float(price_per_credit) if price_per_credit else None,
+                            currency,
+                            contract_ref.strip() or None,
+                            notes.strip() or None,
+                            ts, ts
+                        )
                     )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        sid,
-                        proj["project_id"],
-                        None if link_credit == "(no link)" else link_credit,
-                        sale_date.isoformat(),
-                        buyer.strip() or None,
-                        float(credits_sold),
-                        float(price_per_credit) if price_per_credit else None,
-                        currency,
-                        contract_ref.strip() or None,
-                        notes.strip() or None,
-                        ts, ts
+                    uow.audit(
+                        action="CREATE",
+                        entity_type="sale",
+                        entity_id=sid,
+                        project_id=proj["project_id"],
+                        after={"credits_sold": credits_sold, "price_per_credit": price_per_credit, "currency": currency},
                     )
-                )
-                audit_log(
-                    action="CREATE",
-                    entity_type="sale",
-                    entity_id=sid,
-                    project_id=proj["project_id"],
-                    after={"credits_sold": credits_sold, "price_per_credit": price_per_credit, "currency": currency},
-                )
                 st.success("Sale recorded.")
                 st.rerun()
 
         st.markdown("### 📈 Summary")
-        issued = db_query("SELECT COALESCE(SUM(credits_issued),0) as total_issued FROM credits WHERE project_id=?", (proj["project_id"],)).iloc[0]["total_issued"]
-        sold = db_query("SELECT COALESCE(SUM(credits_sold),0) as total_sold FROM sales WHERE project_id=?", (proj["project_id"],)).iloc[0]["total_sold"]
-        revenue = db_query(
-            "SELECT COALESCE(SUM(credits_sold * COALESCE(price_per_credit,0)),0) as revenue FROM sales WHERE project_id=?",
-            (proj["project_id"],)
-        ).iloc[0]["revenue"]
+        totals = project_totals(proj["project_id"])
 
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Credits issued", f"{issued:,.2f}")
-        c2.metric("Credits sold", f"{sold:,.2f}")
-        c3.metric("Revenue (nominal)", f"{revenue:,.2f}")
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Credits issued", f"{totals['credits_issued']:,.2f}")
+        c2.metric("Credits sold", f"{totals['credits_sold']:,.2f}")
+        c3.metric("Remaining", f"{totals['remaining']:,.2f}")
+        c4.metric("Revenue (nominal)", f"{totals['revenue']:,.2f}")
+
+        with st.expander("By vintage / currency"):
+            st.caption("Vintage 0 = sales not linked to an issuance. Issuances have no currency.")
+            st.dataframe(project_rollups(proj["project_id"]), use_container_width=True, hide_index=True)
 
         st.markdown("### 🧾 Issuances")
         st.dataframe(credits_df, use_container_width=True, hide_index=True)
@@ -744,26 +676,99 @@ with tabs[2]:
 
     proj = active_project()
     scope = st.radio("Scope", ["All", "Active project only"], horizontal=True, index=1 if proj else 0)
-    if scope == "Active project only" and proj:
-        df = db_query(
-            "SELECT timestamp, actor, action, entity_type, entity_id, project_id FROM audit_logs WHERE project_id=? ORDER BY timestamp DESC LIMIT 500",
-            (proj["project_id"],)
-        )
+
+    with st.expander("🔎 Filters", expanded=False):
+        f1, f2, f3 = st.columns(3)
+        with f1:
+            f_actor = st.text_input("Actor", key="audit_f_actor")
+            f_action = st.text_input("Action (e.g. CREATE, UPDATE, UPSERT)", key="audit_f_action")
+        with f2:
+            f_entity_type = st.text_input("Entity type (e.g. project, sale)", key="audit_f_entity_type")
+            f_entity_id = st.text_input("Entity ID", key="audit_f_entity_id")
+        with f3:
+            f_use_range = st.checkbox("Limit time range", value=False, key="audit_f_use_range")
+            f_range = st.date_input(
+                "From / to (UTC)",
+                value=(date.today() - timedelta(days=30), date.today()),
+                key="audit_f_range",
+                disabled=not f_use_range,
+            )
+
+    page_size = st.selectbox("Rows per page", [50, 100, 250, 500], index=1, key="audit_page_size")
+
+    audit_filters = {
+        "project_id": proj["project_id"] if (scope == "Active project only" and proj) else None,
+        "actor": f_actor.strip() or None,
+        "action": f_action.strip().upper() or None,
+        "entity_type": f_entity_type.strip() or None,
+        "entity_id": f_entity_id.strip() or None,
+    }
+    if f_use_range and isinstance(f_range, (list, tuple)) and len(f_range) == 2:
+        audit_filters["since"] = f"{f_range[0].isoformat()}T00:00:00Z"
+        audit_filters["until"] = f"{f_range[1].isoformat()}T23:59:59Z"
+
+    search_text = st.text_input(
+        "Search payloads",
+        key="audit_search",
+        placeholder="serial range, buyer, any value in before/after/meta — e.g. VCS-1234-0001 or acme*",
+    )
+
+    if search_text.strip():
+        # Ranked full-text hits (FTS5); scope and filters above still apply.
+        df = search_audit(search_text, audit_filters, limit=page_size)
+        st.caption(f"{len(df)} best-ranked match(es) (top {page_size}).")
+        st.dataframe(df, use_container_width=True, hide_index=True)
     else:
-        df = db_query(
-            "SELECT timestamp, actor, action, entity_type, entity_id, project_id FROM audit_logs ORDER BY timestamp DESC LIMIT 500"
+        # Any filter change restarts from the newest page.
+        filter_sig = (tuple(sorted(audit_filters.items())), page_size)
+        if st.session_state.get("audit_filter_sig") != filter_sig:
+            st.session_state.audit_filter_sig = filter_sig
+            st.session_state.audit_cursor = None
+
+        # Cursor: None (newest page) or ("older" | "newer", (timestamp, audit_id)).
+        cursor = st.session_state.get("audit_cursor")
+        direction = cursor[0] if cursor else None
+        df, more = audit_page(
+            audit_filters,
+            older_than=cursor[1] if direction == "older" else None,
+            newer_than=cursor[1] if direction == "newer" else None,
+            page_size=page_size,
         )
+        if direction == "newer" and not more:
+            # Walked back to the top: show the regular newest page.
+            st.session_state.audit_cursor = cursor = direction = None
+            df, more = audit_page(audit_filters, page_size=page_size)
+
+        has_older = more if direction in (None, "older") else True
+        has_newer = direction is not None
+        first_key, last_key = page_keys(df)
+
+        n1, n2, n3 = st.columns(3)
+        with n1:
+            if st.button("⤒ Latest", use_container_width=True, disabled=not has_newer, key="audit_nav_latest"):
+                st.session_state.audit_cursor = None
+                st.rerun()
+        with n2:
+            if st.button("⟵ Newer", use_container_width=True, disabled=not has_newer, key="audit_nav_newer"):
+                st.session_state.audit_cursor = ("newer", first_key)
+                st.rerun()
+        with n3:
+            if st.button("Older ⟶", use_container_width=True, disabled=not has_older, key="audit_nav_older"):
+                st.session_state.audit_cursor = ("older", last_key)
+                st.rerun()
 
-    st.dataframe(df, use_container_width=True, hide_index=True)
+        st.dataframe(df, use_container_width=True, hide_index=True)
 
     with st.expander("View raw audit JSON (advanced)"):
-        audit_id = st.text_input("Paste audit_id to inspect")
+        page_ids = df["audit_id"].tolist() if not df.empty else []
+        picked = st.selectbox("Pick an entry from this page", [""] + page_ids, key="audit_pick")
+        audit_id = st.text_input("…or paste audit_id to inspect") or picked
         if audit_id:
-            row = db_query("SELECT * FROM audit_logs WHERE audit_id=?", (audit_id,))
-            if row.empty:
+            entry = get_audit_entry(audit_id.strip())
+            if entry is None:
                 st.warning("Not found.")
             else:
-                st.json(row.iloc[0].to_dict())
+                st.json(entry)
 
 # ------------------------------------------------------------
 # TAB 4: EXPORT
@@ -774,39 +779,49 @@ with tabs[3]:
     proj = active_project()
     export_scope = st.radio("Export scope", ["Active project", "All projects"], horizontal=True, index=0)
 
-    def make_exports(project_only: bool):
-        if project_only and proj:
-            pid = proj["project_id"]
-            return {
-                "projects": db_query("SELECT * FROM projects WHERE project_id=?", (pid,)),
-                "project_foundations": db_query("SELECT * FROM project_foundations WHERE project_id=?", (pid,)),
-                "credits": db_query("SELECT * FROM credits WHERE project_id=?", (pid,)),
-                "sales": db_query("SELECT * FROM sales WHERE project_id=?", (pid,)),
-                "audit": db_query("SELECT * FROM audit_logs WHERE project_id=? ORDER BY timestamp DESC", (pid,)),
-            }
-        else:
-            return {
-                "projects": db_query("SELECT * FROM projects ORDER BY updated_at DESC"),
-                "project_foundations": db_query("SELECT * FROM project_foundations ORDER BY updated_at DESC"),
-                "credits": db_query("SELECT * FROM credits ORDER BY updated_at DESC"),
-                "sales": db_query("SELECT * FROM sales ORDER BY updated_at DESC"),
-                "audit": db_query("SELECT * FROM audit_logs ORDER BY timestamp DESC"),
-            }
-
     if export_scope == "Active project" and not proj:
         st.warning("Select an active project in the Projects tab first.")
     else:
-        exports = make_exports(project_only=(export_scope == "Active project"))
-        st.markdown("### Download CSVs")
-        for name, df in exports.items():
-            csv = df.to_csv(index=False).encode("utf-8")
-            st.download_button(
-                label=f"Download {name}.csv",
-                data=csv,
-                file_name=f"{name}.csv",
-                mime="text/csv",
-                use_container_width=True,
-            )
+        export_pid = proj["project_id"] if export_scope == "Active project" else None
+        export_names = st.multiselect(
+            "Tables", list(EXPORT_TABLES.keys()), default=list(EXPORT_TABLES.keys()), key="export_tables"
+        )
+        formats = {"CSV": "csv", "Parquet (zstd)": "parquet", "Arrow IPC (zstd)": "arrow"}
+        export_format = formats[st.radio("Format", list(formats.keys()), horizontal=True, key="export_format")]
+        if export_format != "csv" and not columnar_available():
+            st.warning("Parquet/Arrow export needs `pyarrow` installed on the server.")
+        st.caption(
+            "Exports are built only when requested: each table streams in chunks into one ZIP with a manifest. "
+            "Prepared ZIPs are kept for up to an hour."
+        )
+
+        # Nothing is queried until the button is pressed; the ZIP lives in a temp file, not in memory.
+        can_export = bool(export_names) and (export_format == "csv" or columnar_available())
+        if st.button("Prepare ZIP export", use_container_width=True, disabled=not can_export):
+            previous = st.session_state.pop("export_zip", None)
+            if previous:
+                discard_export(previous["path"])
+            with st.spinner("Streaming tables into ZIP..."):
+                zip_path, manifest = build_export_zip(export_names, export_pid, fmt=export_format)
+            st.session_state.export_zip = {
+                "path": str(zip_path),
+                "scope": export_pid,
+                "format": export_format,
+                "file_name": export_file_name(proj["project_code"] if export_pid else None),
+                "manifest": manifest,
+            }
+
+        ready = st.session_state.get("export_zip")
+        if ready and ready["scope"] == export_pid and ready["format"] == export_format and Path(ready["path"]).exists():
+            st.dataframe(pd.DataFrame(ready["manifest"]["files"]), use_container_width=True, hide_index=True)
+            with open(ready["path"], "rb") as fh:
+                st.download_button(
+                    label=f"Download {ready['file_name']}",
+                    data=fh,
+                    file_name=ready["file_name"],
+                    mime="application/zip",
+                    use_container_width=True,
+                )
 
 st.divider()
 st.caption(
@@ -15,21 +15,24 @@
 # ------------------------------------------------------------
 
 import streamlit as st
-import sqlite3
 import json
 import uuid
-from pathlib import Path
 from datetime import datetime, date
 from typing import Optional, Dict, Any, Tuple, List
 
 import pandas as pd
 
+from utils import calc_cache, factors, line_stream, uncertainty, units
+from utils.importers import read_table
+from utils.line_items import LINE_COLUMNS, compute_line_items, lines_from_table, stack_lines, summarize_groups
 from utils.load_css import load_css
+from utils.schema import ensure_schema
+from utils.uow import unit_of_work
 
 # ------------------------------------------------------------
 # PAGE CONFIG
 # ------------------------------------------------------------
-from utils.ui import setup_page, render_hero
+from utils.ui import project_picker, render_hero, setup_page
 
 setup_page(
     page_title="Carbon Registry • Scopes",
@@ -38,131 +41,17 @@ setup_page(
     active_label="📊 Scope 1 / 2 / 3 Calculator",
 )
 
-)
-
-
-
 # ------------------------------------------------------------
-# DB (SQLite) — Cloud-safe
+# DB (SQLite) — shared layer in utils/db.py
 # ------------------------------------------------------------
-DB_PATH = Path("data/carbon_registry.db")
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-@st.cache_resource
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def db_exec(query: str, params: Tuple = ()) -> None:
-    conn = get_conn()
-    conn.execute(query, params)
-    conn.commit()
-
-def db_query(query: str, params: Tuple = ()) -> pd.DataFrame:
-    conn = get_conn()
-    rows = conn.execute(query, params).fetchall()
-    return pd.DataFrame([dict(r) for r in rows])
-
 def now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
-def ensure_schema() -> None:
-    db_exec(
-        """
-        CREATE TABLE IF NOT EXISTS calc_runs (
-            calc_id TEXT PRIMARY KEY,
-            project_id TEXT,
-            calc_type TEXT NOT NULL,      -- 'scope' | 'methodology'
-            calc_name TEXT NOT NULL,
-            scope_label TEXT,             -- 'Scope 1'/'Scope 2'/'Scope 3'
-            period_start TEXT,
-            period_end TEXT,
-            baseline_tco2e REAL,
-            project_tco2e REAL,
-            reduction_tco2e REAL,
-            inputs_json TEXT,
-            outputs_json TEXT,
-            factor_source TEXT,           -- required when saving
-            status TEXT DEFAULT 'final',
-            actor TEXT,
-            created_at TEXT NOT NULL
-        );
-        """
-    )
-
-    # If registry page already created this, no harm.
-    db_exec(
-        """
-        CREATE TABLE IF NOT EXISTS audit_logs (
-            audit_id TEXT PRIMARY KEY,
-            timestamp TEXT NOT NULL,
-            actor TEXT,
-            action TEXT NOT NULL,
-            entity_type TEXT NOT NULL,
-            entity_id TEXT,
-            project_id TEXT,
-            before_json TEXT,
-            after_json TEXT,
-            meta_json TEXT
-        );
-        """
-    )
-
 ensure_schema()
 
-# ------------------------------------------------------------
-# AUDIT
-# ------------------------------------------------------------
-def audit_log(
-    action: str,
-    entity_type: str,
-    entity_id: Optional[str] = None,
-    project_id: Optional[str] = None,
-    before: Optional[Dict[str, Any]] = None,
-    after: Optional[Dict[str, Any]] = None,
-    meta: Optional[Dict[str, Any]] = None,
-) -> None:
-    actor = st.session_state.get("actor_name", "unknown")
-    db_exec(
-        """
-        INSERT INTO audit_logs (audit_id, timestamp, actor, action, entity_type, entity_id, project_id, before_json, after_json, meta_json)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            str(uuid.uuid4()),
-            now_iso(),
-            actor,
-            action,
-            entity_type,
-            entity_id,
-            project_id,
-            json.dumps(before, ensure_ascii=False) if before else None,
-            json.dumps(after, ensure_ascii=False) if after else None,
-            json.dumps(meta, ensure_ascii=False) if meta else None,
-        ),
-    )
-
 # ------------------------------------------------------------
 # Projects + save helpers
 # ------------------------------------------------------------
-def list_projects() -> pd.DataFrame:
-    try:
-        df = db_query(
-            """
-            SELECT project_id, project_code, project_name, status
-            FROM projects
-            ORDER BY updated_at DESC
-            """
-        )
-        if not df.empty:
-            df["project_code"] = df["project_code"].fillna("")
-            df["project_name"] = df["project_name"].fillna("")
-            df["label"] = df["project_code"] + " — " + df["project_name"]
-        return df
-    except Exception:
-        return pd.DataFrame(columns=["project_id", "project_code", "project_name", "status", "label"])
-
 def save_calc_run(
     *,
     project_id: str,
@@ -182,55 +71,55 @@ def save_calc_run(
     actor = st.session_state.get("actor_name", "unknown")
     ts = now_iso()
 
-    db_exec(
-        """
-        INSERT INTO calc_runs (
-            calc_id, project_id, calc_type, calc_name, scope_label,
-            period_start, period_end,
-            baseline_tco2e, project_tco2e, reduction_tco2e,
-            inputs_json, outputs_json, factor_source,
-            status, actor, created_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            calc_id,
-            project_id,
-            "scope",
-            calc_name,
-            scope_label,
-            period_start,
-            period_end,
-            baseline_tco2e,
-            project_tco2e,
-            reduction_tco2e,
-            json.dumps(inputs, ensure_ascii=False),
-            json.dumps(outputs, ensure_ascii=False),
-            factor_source.strip(),
-            status,
-            actor,
-            ts,
-        ),
-    )
-
-    # Audit log entry
-    audit_log(
-        action="CREATE",
-        entity_type="calc_run",
-        entity_id=calc_id,
-        project_id=project_id,
-        after={
-            "calc_name": calc_name,
-            "scope_label": scope_label,
-            "period_start": period_start,
-            "period_end": period_end,
-            "baseline_tco2e": baseline_tco2e,
-            "project_tco2e": project_tco2e,
-            "reduction_tco2e": reduction_tco2e,
-            "factor_source": factor_source.strip(),
-            "status": status,
-        },
-        meta={"calc_type": "scope"},
-    )
+    # Run row + audit row commit together.
+    with unit_of_work(actor=actor) as uow:
+        uow.execute(
+            """
+            INSERT INTO calc_runs (
+                calc_id, project_id, calc_type, calc_name, scope_label,
+                period_start, period_end,
+                baseline_tco2e, project_tco2e, reduction_tco2e,
+                inputs_json, outputs_json, factor_source,
+                status, actor, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                calc_id,
+                project_id,
+                "scope",
+                calc_name,
+                scope_label,
+                period_start,
+                period_end,
+                baseline_tco2e,
+                project_tco2e,
+                reduction_tco2e,
+                json.dumps(inputs, ensure_ascii=False),
+                json.dumps(outputs, ensure_ascii=False),
+                factor_source.strip(),
+                status,
+                actor,
+                ts,
+            ),
+        )
+        uow.audit(
+            action="CREATE",
+            entity_type="calc_run",
+            entity_id=calc_id,
+            project_id=project_id,
+            after={
+                "calc_name": calc_name,
+                "scope_label": scope_label,
+                "period_start": period_start,
+                "period_end": period_end,
+                "baseline_tco2e": baseline_tco2e,
+                "project_tco2e": project_tco2e,
+                "reduction_tco2e": reduction_tco2e,
+                "factor_source": factor_source.strip(),
+                "status": status,
+            },
+            meta={"calc_type": "scope"},
+        )
 
     return calc_id
 
@@ -248,21 +137,14 @@ def render_save_panel(
 ) -> None:
     st.divider()
     with st.expander("💾 Save this result to a project (optional)", expanded=False):
-        projs = list_projects()
-        if projs.empty:
-            st.info("No projects found. Create a project in the Registry page first.")
-            return
-
-        active_pid = st.session_state.get("active_project_id")
-        options = projs["project_id"].tolist()
-        default_idx = options.index(active_pid) if active_pid in options else 0
-
-        pid = st.selectbox(
+        pid = project_picker(
             "Select project",
-            options=options,
-            index=default_idx,
-            format_func=lambda x: projs.loc[projs.project_id == x, "label"].values[0],
+            key=f"{scope_label}_save_project_pick",
+            default_id=st.session_state.get("active_project_id"),
         )
+        if pid is None:
+            st.info("No projects found. Create a project in the Registry page first.")
+            return
 
         c1, c2 = st.columns(2)
         with c1:
@@ -276,6 +158,7 @@ def render_save_panel(
 
         factor_source = st.text_area(
             "Emission factor source / reference (required to save)",
+            value=(inputs.get("ef_metadata") or {}).get("factor_reference") or "",
             placeholder=(
                 "Dataset/standard name, version, year, geography/boundary. "
                 "If Scope 2, also specify market vs location basis. "
@@ -369,7 +252,10 @@ def apply_uncertainty(value: float, rel_u: float) -> Tuple[float, float, float]:
     delta = abs(value) * rel_u
     return value - delta, value, value + delta
 
-def uncertainty_panel(scope_key: str) -> Dict[str, float]:
+MC_METHODS = ["Quadrature (first-order)", "Monte Carlo"]
+MC_SAMPLE_SIZES = [10_000, 100_000, 500_000]
+
+def uncertainty_panel(scope_key: str) -> Dict[str, Any]:
     with st.expander("📉 Uncertainty (screening-level, optional)", expanded=False):
         st.caption("Use this to express data quality for internal screening and MRV readiness.")
 
@@ -399,12 +285,30 @@ def uncertainty_panel(scope_key: str) -> Dict[str, float]:
 
         st.caption("Reduction uncertainty computed after calculation (baseline/project combined).")
 
+        method = st.radio("Propagation", MC_METHODS, horizontal=True, key=f"{scope_key}_u_method")
+        mc: Dict[str, Any] = {}
+        if method == "Monte Carlo":
+            m1, m2, m3, m4 = st.columns(4)
+            with m1:
+                mc["mc_distribution"] = st.selectbox("Distribution", list(uncertainty.DISTRIBUTIONS), key=f"{scope_key}_mc_dist")
+            with m2:
+                mc["mc_ef_correlation"] = st.slider(
+                    "Baseline/project EF correlation", -1.0, 1.0, 1.0, 0.05, key=f"{scope_key}_mc_rho",
+                    help="1.0 = the same factor applies to both sides; 0 = independent factors.",
+                )
+            with m3:
+                mc["mc_samples"] = st.selectbox("Samples", MC_SAMPLE_SIZES, index=1, key=f"{scope_key}_mc_n")
+            with m4:
+                mc["mc_seed"] = int(st.number_input("Seed", min_value=0, value=uncertainty.DEFAULT_SEED, step=1, key=f"{scope_key}_mc_seed"))
+
         return {
             "baseline_activity_u_pct": b_u,
             "project_activity_u_pct": p_u,
             "ef_u_pct": ef_u,
             "baseline_rel_u": baseline_rel,
             "project_rel_u": project_rel,
+            "method": method,
+            **mc,
         }
 
 def render_uncertainty_results(baseline_t: float, project_t: float, reduction_t: float, u_meta: Dict[str, float]) -> Dict[str, Any]:
@@ -437,6 +341,52 @@ def render_uncertainty_results(baseline_t: float, project_t: float, reduction_t:
         "reduction_rel_u": red_rel,
     }
 
+def render_monte_carlo_results(baseline_t: float, project_t: float, u_meta: Dict[str, Any]) -> Dict[str, Any]:
+    dist = u_meta.get("mc_distribution", "normal")
+    ef_u = u_meta.get("ef_u_pct", 0.0)
+    inputs = {
+        "baseline_t": uncertainty.fixed(baseline_t),
+        "project_t": uncertainty.fixed(project_t),
+        "baseline_activity": uncertainty.spec_from_band(1.0, u_meta.get("baseline_activity_u_pct", 0.0), dist),
+        "project_activity": uncertainty.spec_from_band(1.0, u_meta.get("project_activity_u_pct", 0.0), dist),
+        "baseline_ef": uncertainty.spec_from_band(1.0, u_meta.get("baseline_ef_u_pct", ef_u), dist),
+        "project_ef": uncertainty.spec_from_band(1.0, u_meta.get("project_ef_u_pct", ef_u), dist),
+    }
+    mc = uncertainty.simulate(
+        "baseline_project",
+        inputs,
+        [("baseline_ef", "project_ef", float(u_meta.get("mc_ef_correlation", 1.0)))],
+        n=int(u_meta.get("mc_samples", uncertainty.DEFAULT_SAMPLES)),
+        seed=u_meta.get("mc_seed"),
+    )
+
+    st.markdown(f"##### Monte Carlo ({mc['n']:,} draws, {dist}, seed {mc['seed']})")
+    rows = []
+    for label, key in (("Baseline", "baseline_tco2e"), ("Project", "project_tco2e"), ("Reduction", "reduction_tco2e")):
+        o = mc["outputs"][key]
+        rows.append({
+            "Quantity (tCO₂e)": label,
+            "Mean": o["mean"],
+            "SD": o["sd"],
+            "P5": o["percentiles"]["p5"],
+            "P50": o["percentiles"]["p50"],
+            "P95": o["percentiles"]["p95"],
+            "95% CI low": o["ci_low"],
+            "95% CI high": o["ci_high"],
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    red = mc["outputs"]["reduction_tco2e"]
+    hist = pd.DataFrame({"reduction_tco2e": red["hist"]["edges"][:-1], "draws": red["hist"]["counts"]})
+    st.bar_chart(hist, x="reduction_tco2e", y="draws", height=180)
+    return {
+        "method": "monte_carlo",
+        "distribution": dist,
+        "n": mc["n"],
+        "seed": mc["seed"],
+        "spec_hash": mc["spec_hash"],
+        "summary": {k: {kk: vv for kk, vv in v.items() if kk != "hist"} for k, v in mc["outputs"].items()},
+    }
+
 # ------------------------------------------------------------
 # EF guidance + metadata (direction, not numbers)
 # ------------------------------------------------------------
@@ -488,6 +438,9 @@ This tool does not provide official factors. Use a credible dataset and record:
             "ef_sanity_warnings_enabled": sanity_on,
         }
 
+# Generous upper bounds (kgCO₂e per canonical unit) for dimensions where typical factors are well known.
+EF_TYPICAL_MAX = {"kWh": 1.5, "L": 4.0}
+
 def ef_sanity_warnings(unit: str, ef_kg_per_unit: float) -> None:
     if ef_kg_per_unit <= 0:
         return
@@ -495,6 +448,53 @@ def ef_sanity_warnings(unit: str, ef_kg_per_unit: float) -> None:
         st.warning("EF is extremely large. Check units (kg vs t, kWh vs MWh, liters vs gallons, etc.).")
     if 0 < ef_kg_per_unit < 1e-6:
         st.warning("EF is extremely small. Check units (kg vs g) and activity unit consistency.")
+    canonical = units.canonical_unit(unit)
+    if canonical in EF_TYPICAL_MAX and units.is_known(unit):
+        per_canonical = ef_kg_per_unit * units.conversion_factor(canonical, unit)
+        if per_canonical > EF_TYPICAL_MAX[canonical]:
+            st.warning(
+                f"EF ≈ {per_canonical:,.4g} kgCO₂e per {canonical}, above the usual range (≤ {EF_TYPICAL_MAX[canonical]:g}). "
+                f"Is the factor per 1000 {canonical} (e.g. per MWh or m³), or in g rather than kg?"
+            )
+
+def ef_input(scope_key: str, unit: str, ef_meta: Dict[str, Any]) -> float:
+    """EF from the factor library or typed in any unit compatible with the activity unit.
+
+    Returns kgCO₂e per `unit`; library picks record factor_id + provenance in `ef_meta`.
+    """
+    library = factors.find_factors(activity_unit=unit)
+    if not library.empty and st.radio(
+        "EF source", ["Factor library", "Enter manually"], horizontal=True, key=f"{scope_key}_ef_src"
+    ) == "Factor library":
+        labels = {r["factor_id"]: factors.factor_label(r) for r in library.to_dict("records")}
+        fid = st.selectbox("Factor", list(labels), format_func=labels.get, key=f"{scope_key}_ef_factor")
+        rec = factors.get_factor(fid)
+        ef_kg = factors.value_per(rec, unit)
+        st.caption(f"= {ef_kg:,.6g} kgCO₂e per {unit} · factor_id `{fid}`")
+        ef_meta.update({
+            "factor_id": fid,
+            "factor_reference": factors.factor_reference(rec),
+            "ef_source_name": ef_meta.get("ef_source_name") or rec["dataset_name"],
+            "ef_year_version": ef_meta.get("ef_year_version") or rec["version"],
+            "ef_geography_boundary": ef_meta.get("ef_geography_boundary") or rec["geography"] or None,
+        })
+        if ef_meta.get("ef_sanity_warnings_enabled"):
+            ef_sanity_warnings(unit, ef_kg)
+        return ef_kg
+
+    options = units.compatible_units(unit)
+    c1, c2 = st.columns([2, 1])
+    with c2:
+        ef_per = st.selectbox("EF is per", options, key=f"{scope_key}_ef_per") if len(options) > 1 else unit
+    with c1:
+        ef_value = st.number_input(f"EF (kg CO₂e per {ef_per})", min_value=0.0, value=0.0, key=f"{scope_key}_ef")
+    ef_kg = float(ef_value) * units.conversion_factor(unit, ef_per)
+    if ef_per != unit:
+        st.caption(f"= {ef_kg:,.6g} kgCO₂e per {unit}")
+        ef_meta.update({"ef_value_entered": float(ef_value), "ef_entered_per": ef_per})
+    if ef_meta.get("ef_sanity_warnings_enabled"):
+        ef_sanity_warnings(unit, ef_kg)
+    return ef_kg
 
 # ------------------------------------------------------------
 # Light guidance blocks
@@ -536,11 +536,83 @@ def guidance_box(title: str, baseline_meaning: str, project_meaning: str, eviden
 def df_default(columns: List[str], n_rows: int = 6) -> pd.DataFrame:
     return pd.DataFrame([{c: "" for c in columns} for _ in range(n_rows)])
 
-def sum_numeric_column(df: pd.DataFrame, col: str) -> float:
-    if df is None or df.empty or col not in df.columns:
-        return 0.0
-    vals = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-    return float(vals.sum())
+LINE_EF_COL = "ef_kg_per_unit"
+MAX_SAVED_LINES = 2000  # larger ledgers are saved as group totals only
+
+def uploaded_lines(key: str, side: str, quantity_col: str, group_col: str, unit: str) -> pd.DataFrame:
+    """File upload -> aggregated line items (streamed once per file; only the aggregate is kept)."""
+    upload = st.file_uploader(
+        f"CSV / gzip'd CSV / Parquet with a `{quantity_col}` (or `quantity`) column", type=["csv", "gz", "parquet"],
+        key=f"{key}_upload",
+    )
+    if upload is None:
+        st.session_state.pop(f"{key}_stream", None)
+        return pd.DataFrame(columns=LINE_COLUMNS)
+    stamp = (upload.name, upload.size, unit, quantity_col)
+    cached = st.session_state.get(f"{key}_stream")
+    if cached is None or cached["stamp"] != stamp:
+        status = st.empty()
+        try:
+            result = line_stream.aggregate_file(
+                upload, upload.name, side=side, quantity_col=quantity_col, group_col=group_col, unit=unit,
+                known_factor_ids=factors.library().index,
+                progress=lambda s: status.info(f"Chunk {s['chunks']}: {s['rows']:,} rows read…"),
+            )
+        except (ValueError, RuntimeError) as e:
+            status.error(f"Upload: {e}")
+            return pd.DataFrame(columns=LINE_COLUMNS)
+        status.empty()
+        cached = {"stamp": stamp, **result}
+        st.session_state[f"{key}_stream"] = cached
+    st.caption(
+        f"{cached['rows']:,} rows · {cached['accepted']:,} accepted · {cached['rejected']:,} rejected · "
+        f"{len(cached['lines']):,} aggregated lines"
+    )
+    if cached["groups_pooled"]:
+        st.caption(f"{cached['groups_pooled']:,} rows beyond {line_stream.MAX_GROUPS:,} distinct labels were pooled as “{line_stream.OTHER_GROUP}”.")
+    if cached.get("lines_capped"):
+        st.warning(
+            f"{cached['lines_capped']:,} rows were rejected: the file has more than {line_stream.MAX_LINES:,} distinct "
+            "group / unit / EF / uncertainty combinations. Pre-aggregate it or reference factor_id instead of per-row EFs."
+        )
+    with st.expander("Sample rows and rejected rows", expanded=False):
+        st.dataframe(cached["sample"], use_container_width=True, hide_index=True)
+        if not cached["errors"].empty:
+            st.warning(f"{cached['rejected']:,} row(s) rejected (first {len(cached['errors']):,} problems shown).")
+            st.dataframe(cached["errors"], use_container_width=True, hide_index=True)
+    return cached["lines"]
+
+def line_item_tables(key_prefix: str, cols: List[str], quantity_col: str, group_col: str, unit: str,
+                     baseline_title: str, project_title: str) -> Tuple[pd.DataFrame, float, float]:
+    """Baseline/project line-item editors -> (stacked line items, baseline total, project total)."""
+    st.caption(
+        f"Optional per-line `unit` (blank = {unit}; convertible units such as "
+        f"{', '.join(units.compatible_units(unit)[1:4]) or unit} are converted) and `{LINE_EF_COL}` "
+        "(kgCO₂e per the line's unit), or a library `factor_id`; lines with neither use the EF below."
+    )
+    source = st.radio(
+        "Line source", ["Edit table", "Upload file (large extracts)"], horizontal=True, key=f"{key_prefix}_source"
+    )
+    frames = []
+    for side, title in (("baseline", baseline_title), ("project", project_title)):
+        key = f"{key_prefix}_{side}"
+        st.markdown(f"**{title}**")
+        if source.startswith("Upload"):
+            frames.append(uploaded_lines(key, side, quantity_col, group_col, unit))
+            continue
+        if key not in st.session_state:
+            st.session_state[key] = df_default(cols)
+        df = st.data_editor(st.session_state[key], key=f"{key}_editor", use_container_width=True, num_rows="dynamic")
+        st.session_state[key] = df
+        frames.append(lines_from_table(df, quantity_col, side=side, group_col=group_col, unit=unit, ef_col=LINE_EF_COL))
+    lines = stack_lines(*frames)
+    try:
+        converted = units.convert_array(lines["quantity"], lines["unit"], unit)
+    except units.UnitError as e:
+        st.warning(f"Line units: {e}")
+        converted = lines["quantity"].to_numpy(dtype=float)
+    is_baseline = (lines["side"] == "baseline").to_numpy()
+    return lines, float(converted[is_baseline].sum()), float(converted[~is_baseline].sum())
 
 # ------------------------------------------------------------
 # Scope scaffolds
@@ -589,21 +661,72 @@ RESULT_KEYS = {
 def compute_and_render(scope_label: str, category: str, unit: str,
                        period_start: str, period_end: str,
                        baseline_activity: float, project_activity: float, ef_kg: float,
-                       inputs_extra: Dict[str, Any]) -> None:
+                       inputs_extra: Dict[str, Any], lines: Optional[pd.DataFrame] = None) -> None:
 
+    if lines is not None and lines.empty:
+        lines = None
     if not require_nonnegative_activity(baseline_activity, "Baseline activity"):
         return
     if not require_nonnegative_activity(project_activity, "Project activity"):
         return
-    if not require_positive_ef(ef_kg):
+    if lines is not None and (lines["quantity"] < 0).any():
+        st.error("Line quantities must be ≥ 0.")
         return
+    if lines is not None:
+        try:
+            lines = factors.resolve_line_factors(lines, unit)
+        except (KeyError, units.UnitError) as e:
+            st.error(f"Line factors: {e}")
+            return
+    # With line items the page EF is only a fallback for lines without their own EF.
+    if lines is None or lines[LINE_EF_COL].isna().any():
+        if not require_positive_ef(ef_kg):
+            return
+
+    u_meta = inputs_extra.get("uncertainty", {})
+    line_result = None
+    if lines is None:
+        res = compute_baseline_project_reduction(baseline_activity, project_activity, ef_kg)
+    else:
+        activity_u_default = lines["side"].map({
+            "baseline": u_meta.get("baseline_activity_u_pct", 0.0),
+            "project": u_meta.get("project_activity_u_pct", 0.0),
+        })
+        line_input = lines.assign(activity_u_pct=lines["activity_u_pct"].fillna(activity_u_default))
+        line_args = {"default_ef": ef_kg, "default_ef_u_pct": u_meta.get("ef_u_pct", 0.0), "unit": unit}
+        try:
+            # Same ledger + EF + unit from any session is computed once (utils/calc_cache.py).
+            line_result = calc_cache.get_or_compute(
+                "line_items.compute_line_items",
+                {"lines": line_input, **line_args},
+                lambda: compute_line_items(line_input, **line_args),
+            )
+        except units.UnitError as e:
+            st.error(f"Line units: {e}")
+            return
+        totals = line_result["totals"]
+        res = {k: totals[k] for k in ("baseline_tco2e", "project_tco2e", "reduction_tco2e", "reduction_pct")}
+        if u_meta:
+            # Line-level propagation replaces the single-band estimate.
+            def rel(key: str, side: str) -> float:
+                return totals[key] / res[f"{side}_tco2e"] if res[f"{side}_tco2e"] else 0.0
+
+            u_meta = {
+                **u_meta,
+                "baseline_rel_u": rel("baseline_u_tco2e", "baseline"),
+                "project_rel_u": rel("project_u_tco2e", "project"),
+                "baseline_activity_u_pct": 100.0 * rel("baseline_activity_u_tco2e", "baseline"),
+                "project_activity_u_pct": 100.0 * rel("project_activity_u_tco2e", "project"),
+                "baseline_ef_u_pct": 100.0 * rel("baseline_ef_u_tco2e", "baseline"),
+                "project_ef_u_pct": 100.0 * rel("project_ef_u_tco2e", "project"),
+            }
 
-    res = compute_baseline_project_reduction(baseline_activity, project_activity, ef_kg)
     st.success("Calculated.")
     metric_row(res["baseline_tco2e"], res["project_tco2e"], res["reduction_tco2e"], res["reduction_pct"])
 
-    u_meta = inputs_extra.get("uncertainty", {})
     u_results = render_uncertainty_results(res["baseline_tco2e"], res["project_tco2e"], res["reduction_tco2e"], u_meta)
+    if u_meta.get("method") == "Monte Carlo":
+        u_results["monte_carlo"] = render_monte_carlo_results(res["baseline_tco2e"], res["project_tco2e"], u_meta)
 
     inputs = {
         "scope": scope_label,
@@ -617,16 +740,44 @@ def compute_and_render(scope_label: str, category: str, unit: str,
         **inputs_extra,
     }
     outputs = {**res, "scope": scope_label, "category": category, "unit": unit, "uncertainty_results": u_results}
+    if line_result is not None:
+        groups = summarize_groups(line_result["groups"])
+        inputs["line_items"] = (
+            lines.astype(object).where(lines.notna(), None).to_dict("records") if len(lines) <= MAX_SAVED_LINES else None
+        )
+        inputs["line_groups"] = groups
+        outputs["line_item_totals"] = line_result["totals"]
+        outputs["line_groups"] = groups
+
+        with st.expander(f"Line-item breakdown ({line_result['totals']['n_lines']:,} lines)", expanded=False):
+            st.dataframe(line_result["groups"], use_container_width=True, hide_index=True)
+            flagged = line_result["lines"][line_result["lines"]["flag"].isin(["check EF units", "EF missing"])]
+            if not flagged.empty:
+                st.warning(f"{len(flagged):,} line(s) have a suspicious or missing EF.")
+                st.dataframe(flagged, use_container_width=True, hide_index=True)
+            if line_result["totals"]["n_default_ef"]:
+                st.caption(f"{line_result['totals']['n_default_ef']:,} line(s) used the page EF ({ef_kg:,.6g} kgCO₂e/{unit}).")
 
     with st.expander("Show calculation details", expanded=False):
-        st.markdown(
-            f"""
+        if line_result is None:
+            st.markdown(
+                f"""
 **Equation:** Emissions (tCO₂e) = Activity × EF ÷ 1000
 
 - Baseline: {baseline_activity:,.6g} {unit} × {ef_kg:,.6g} kgCO₂e/{unit} ÷ 1000
 - Project: {project_activity:,.6g} {unit} × {ef_kg:,.6g} kgCO₂e/{unit} ÷ 1000
-            """.strip()
-        )
+                """.strip()
+            )
+        else:
+            st.markdown(
+                f"""
+**Equation:** Emissions (tCO₂e) = Σ lines (Quantity × EF_line) ÷ 1000
+
+- Baseline: {baseline_activity:,.6g} {unit} over {int(line_result["groups"].loc[line_result["groups"]["side"] == "baseline", "n_lines"].sum()):,} lines
+- Project: {project_activity:,.6g} {unit} over {int(line_result["groups"].loc[line_result["groups"]["side"] == "project", "n_lines"].sum()):,} lines
+- Blank line EFs use {ef_kg:,.6g} kgCO₂e/{unit}; EF uncertainty is correlated across lines sharing a factor.
+                """.strip()
+            )
         if res["reduction_pct"] is None:
             st.caption("Reduction % is N/A because baseline emissions are 0.")
 
@@ -656,6 +807,7 @@ def calc_scope1() -> None:
     baseline_activity = 0.0
     project_activity = 0.0
     guided_method = None
+    lines: Optional[pd.DataFrame] = None
 
     if mode.startswith("Guided"):
         guided_method = st.selectbox(
@@ -665,23 +817,10 @@ def calc_scope1() -> None:
         )
 
         if guided_method == "Fuel from invoices (table)":
-            cols = ["date", "supplier", f"quantity_{unit}", "notes"]
-            key_b = "s1_inv_baseline"
-            key_p = "s1_inv_project"
-            if key_b not in st.session_state:
-                st.session_state[key_b] = df_default(cols)
-            if key_p not in st.session_state:
-                st.session_state[key_p] = df_default(cols)
-
-            st.markdown("**Baseline invoices**")
-            dfb = st.data_editor(st.session_state[key_b], key="s1_inv_baseline_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_b] = dfb
-            baseline_activity = sum_numeric_column(dfb, f"quantity_{unit}")
-
-            st.markdown("**Project invoices**")
-            dfp = st.data_editor(st.session_state[key_p], key="s1_inv_project_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_p] = dfp
-            project_activity = sum_numeric_column(dfp, f"quantity_{unit}")
+            cols = ["date", "supplier", f"quantity_{unit}", "unit", LINE_EF_COL, "factor_id", "notes"]
+            lines, baseline_activity, project_activity = line_item_tables(
+                "s1_inv", cols, f"quantity_{unit}", "supplier", unit, "Baseline invoices", "Project invoices"
+            )
 
             st.info(f"Derived baseline: **{baseline_activity:,.3f} {unit}** • project: **{project_activity:,.3f} {unit}**")
 
@@ -724,9 +863,7 @@ def calc_scope1() -> None:
     u_meta = uncertainty_panel("s1")
 
     st.markdown("#### Emission factor")
-    ef_kg = st.number_input(f"EF (kg CO₂e per {unit})", min_value=0.0, value=0.0, key="s1_ef")
-    if ef_meta.get("ef_sanity_warnings_enabled"):
-        ef_sanity_warnings(unit, ef_kg)
+    ef_kg = ef_input("s1", unit, ef_meta)
 
     if st.button("Calculate Scope 1", use_container_width=True, key="s1_calc"):
         compute_and_render(
@@ -737,7 +874,8 @@ def calc_scope1() -> None:
                 "guided_method": guided_method,
                 "ef_metadata": ef_meta,
                 "uncertainty": u_meta,
-            }
+            },
+            lines=lines,
         )
 
     if RESULT_KEYS["scope1"] in st.session_state:
@@ -775,28 +913,17 @@ def calc_scope2() -> None:
     baseline_activity = 0.0
     project_activity = 0.0
     guided_method = None
+    lines: Optional[pd.DataFrame] = None
 
     if mode.startswith("Guided"):
         guided_method = st.selectbox("Guided method", ["Bills / meter readings (table)", "PV displacement helper (simple)", "Custom (manual total)"], key="s2_method")
 
         if guided_method == "Bills / meter readings (table)":
-            cols = ["period_label", f"consumption_{unit}", "notes"]
-            key_b = "s2_tbl_baseline"
-            key_p = "s2_tbl_project"
-            if key_b not in st.session_state:
-                st.session_state[key_b] = df_default(cols)
-            if key_p not in st.session_state:
-                st.session_state[key_p] = df_default(cols)
-
-            st.markdown("**Baseline bills / meter readings**")
-            dfb = st.data_editor(st.session_state[key_b], key="s2_tbl_baseline_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_b] = dfb
-            baseline_activity = sum_numeric_column(dfb, f"consumption_{unit}")
-
-            st.markdown("**Project bills / meter readings**")
-            dfp = st.data_editor(st.session_state[key_p], key="s2_tbl_project_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_p] = dfp
-            project_activity = sum_numeric_column(dfp, f"consumption_{unit}")
+            cols = ["period_label", f"consumption_{unit}", "unit", LINE_EF_COL, "factor_id", "notes"]
+            lines, baseline_activity, project_activity = line_item_tables(
+                "s2_tbl", cols, f"consumption_{unit}", "period_label", unit,
+                "Baseline bills / meter readings", "Project bills / meter readings",
+            )
 
             st.info(f"Derived baseline: **{baseline_activity:,.3f} {unit}** • project: **{project_activity:,.3f} {unit}**")
 
@@ -822,9 +949,7 @@ def calc_scope2() -> None:
     u_meta = uncertainty_panel("s2")
 
     st.markdown("#### Emission factor")
-    ef_kg = st.number_input(f"EF (kg CO₂e per {unit})", min_value=0.0, value=0.0, key="s2_ef")
-    if ef_meta.get("ef_sanity_warnings_enabled"):
-        ef_sanity_warnings(unit, ef_kg)
+    ef_kg = ef_input("s2", unit, ef_meta)
 
     c3, c4 = st.columns(2)
     with c3:
@@ -844,7 +969,8 @@ def calc_scope2() -> None:
                 "grid_region": grid_region,
                 "ef_metadata": ef_meta,
                 "uncertainty": u_meta,
-            }
+            },
+            lines=lines,
         )
 
     if RESULT_KEYS["scope2"] in st.session_state:
@@ -884,66 +1010,29 @@ def calc_scope3() -> None:
     baseline_activity = 0.0
     project_activity = 0.0
     guided_method = None
+    lines: Optional[pd.DataFrame] = None
 
     if mode.startswith("Guided"):
         guided_method = st.selectbox("Guided method", ["Spend-based (table)", "Distance-based (table)", "Mass-based (table)", "Custom (manual total)"], key="s3_method")
 
         if guided_method == "Spend-based (table)":
-            cols = ["supplier/category", f"spend_{unit}", "notes"]
-            key_b = "s3_spend_baseline"
-            key_p = "s3_spend_project"
-            if key_b not in st.session_state:
-                st.session_state[key_b] = df_default(cols)
-            if key_p not in st.session_state:
-                st.session_state[key_p] = df_default(cols)
-
-            st.markdown("**Baseline spend lines**")
-            dfb = st.data_editor(st.session_state[key_b], key="s3_spend_baseline_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_b] = dfb
-            baseline_activity = sum_numeric_column(dfb, f"spend_{unit}")
-
-            st.markdown("**Project spend lines**")
-            dfp = st.data_editor(st.session_state[key_p], key="s3_spend_project_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_p] = dfp
-            project_activity = sum_numeric_column(dfp, f"spend_{unit}")
+            cols = ["supplier/category", f"spend_{unit}", "unit", LINE_EF_COL, "factor_id", "notes"]
+            lines, baseline_activity, project_activity = line_item_tables(
+                "s3_spend", cols, f"spend_{unit}", "supplier/category", unit, "Baseline spend lines", "Project spend lines"
+            )
 
         elif guided_method == "Distance-based (table)":
-            cols = ["route/activity", f"distance_{unit}", "notes"]
-            key_b = "s3_dist_baseline"
-            key_p = "s3_dist_project"
-            if key_b not in st.session_state:
-                st.session_state[key_b] = df_default(cols)
-            if key_p not in st.session_state:
-                st.session_state[key_p] = df_default(cols)
-
-            st.markdown("**Baseline distance lines**")
-            dfb = st.data_editor(st.session_state[key_b], key="s3_dist_baseline_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_b] = dfb
-            baseline_activity = sum_numeric_column(dfb, f"distance_{unit}")
-
-            st.markdown("**Project distance lines**")
-            dfp = st.data_editor(st.session_state[key_p], key="s3_dist_project_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_p] = dfp
-            project_activity = sum_numeric_column(dfp, f"distance_{unit}")
+            cols = ["route/activity", f"distance_{unit}", "unit", LINE_EF_COL, "factor_id", "notes"]
+            lines, baseline_activity, project_activity = line_item_tables(
+                "s3_dist", cols, f"distance_{unit}", "route/activity", unit, "Baseline distance lines", "Project distance lines"
+            )
 
         elif guided_method == "Mass-based (table)":
-            cols = ["material/waste type", f"mass_{unit}", "notes"]
-            key_b = "s3_mass_baseline"
-            key_p = "s3_mass_project"
-            if key_b not in st.session_state:
-                st.session_state[key_b] = df_default(cols)
-            if key_p not in st.session_state:
-                st.session_state[key_p] = df_default(cols)
-
-            st.markdown("**Baseline mass lines**")
-            dfb = st.data_editor(st.session_state[key_b], key="s3_mass_baseline_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_b] = dfb
-            baseline_activity = sum_numeric_column(dfb, f"mass_{unit}")
-
-            st.markdown("**Project mass lines**")
-            dfp = st.data_editor(st.session_state[key_p], key="s3_mass_project_editor", use_container_width=True, num_rows="dynamic")
-            st.session_state[key_p] = dfp
-            project_activity = sum_numeric_column(dfp, f"mass_{unit}")
+            cols = ["material/waste type", f"mass_{unit}", "unit", LINE_EF_COL, "factor_id", "notes"]
+            lines, baseline_activity, project_activity = line_item_tables(
+                "s3_mass", cols, f"mass_{unit}", "material/waste type", unit, "Baseline mass lines", "Project mass lines"
+            )
+
         else:
             baseline_activity = st.number_input(f"Baseline activity total ({unit})", min_value=0.0, value=0.0, key="s3_base_custom")
             project_activity = st.number_input(f"Project activity total ({unit})", min_value=0.0, value=0.0, key="s3_proj_custom")
@@ -955,9 +1044,7 @@ def calc_scope3() -> None:
     u_meta = uncertainty_panel("s3")
 
     st.markdown("#### Emission factor")
-    ef_kg = st.number_input(f"EF (kg CO₂e per {unit})", min_value=0.0, value=0.0, key="s3_ef")
-    if ef_meta.get("ef_sanity_warnings_enabled"):
-        ef_sanity_warnings(unit, ef_kg)
+    ef_kg = ef_input("s3", unit, ef_meta)
 
     c5, c6 = st.columns(2)
     with c5:
@@ -976,7 +1063,8 @@ def calc_scope3() -> None:
                 "boundary_note": boundary_note,
                 "ef_metadata": ef_meta,
                 "uncertainty": u_meta,
-            }
+            },
+            lines=lines,
         )
 
     if RESULT_KEYS["scope3"] in st.session_state:
@@ -995,9 +1083,55 @@ def calc_scope3() -> None:
             outputs=o,
         )
 
+# ------------------------------------------------------------
+# Emission-factor library (utils/factors.py)
+# ------------------------------------------------------------
+def factor_library_panel() -> None:
+    with st.expander("📚 Emission factor library", expanded=False):
+        st.dataframe(factors.datasets(), use_container_width=True, hide_index=True)
+        st.caption(
+            "Columns: " + ", ".join(factors.FACTOR_FILE_COLUMNS)
+            + " (factor_value in factor_unit per unit; factor_unit defaults to kgCO2e)."
+        )
+        upload = st.file_uploader("Load a factor dataset (CSV / XLSX)", type=["csv", "xlsx"], key="ef_lib_upload")
+        c1, c2, c3 = st.columns([1, 1, 2])
+        with c1:
+            name = st.text_input("Dataset name", key="ef_lib_name")
+        with c2:
+            version = st.text_input("Version", key="ef_lib_version")
+        with c3:
+            source = st.text_input("Source / URL", key="ef_lib_source")
+        replace = st.checkbox("Replace this version if already loaded", key="ef_lib_replace")
+        if upload is None:
+            return
+        try:
+            clean, errors, warnings = factors.validate_factors(read_table(upload, upload.name))
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        for w in warnings:
+            st.warning(w)
+        if not errors.empty:
+            st.error(f"{errors['row'].nunique():,} row(s) have problems; fix them before loading.")
+            st.dataframe(errors.head(500), use_container_width=True, hide_index=True)
+            return
+        st.info(f"{len(clean):,} factor(s) ready.")
+        if st.button("Load dataset", type="primary", disabled=not (name.strip() and version.strip()), key="ef_lib_load"):
+            try:
+                result = factors.load_dataset(
+                    clean, name=name, version=version, source=source.strip() or None,
+                    actor=st.session_state.get("actor_name", "unknown"), replace=replace,
+                )
+            except ValueError as e:
+                st.error(str(e))
+                return
+            st.success(f"Loaded {result['factors']:,} factors as {result['name']} {result['version']}.")
+
 # ------------------------------------------------------------
 # MAIN NAV
 # ------------------------------------------------------------
+factor_library_panel()
+
 st.divider()
 choice = st.radio(
     "Select scope:",
@@ -1,18 +1,23 @@
 from __future__ import annotations
 
+import dataclasses
 import json
-import sqlite3
 import uuid
 from datetime import datetime, date
-from pathlib import Path
-from typing import Tuple, Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 import altair as alt
 import numpy as np
 import pandas as pd
 import streamlit as st
 
-from utils.ui import setup_page, render_hero
+from methodologies import am0124, vm0038, vmr0007
+from methodologies.base import as_values, input_fields
+from utils import calc_cache, factors, scenarios, uncertainty, units
+from utils.db import db_exec
+from utils.importers import read_table
+from utils.schema import ensure_schema
+from utils.ui import project_picker, render_hero, setup_page
 
 # IMPORTANT: first Streamlit call in this file
 setup_page(
@@ -28,87 +33,12 @@ render_hero(
 )
 
 # ------------------------------------------------------------
-# DB (SQLite) — Cloud-safe
+# DB (SQLite) — shared layer in utils/db.py
 # ------------------------------------------------------------
-DB_PATH = Path(__file__).resolve().parents[1] / "data" / "carbon_registry.db"
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-
-@st.cache_resource
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
-
-
-def db_exec(query: str, params: Tuple = ()) -> None:
-    conn = get_conn()
-    conn.execute(query, params)
-    conn.commit()
-
-
-def db_query(query: str, params: Tuple = ()) -> pd.DataFrame:
-    conn = get_conn()
-    rows = conn.execute(query, params).fetchall()
-    return pd.DataFrame([dict(r) for r in rows])
-
-
 def now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 
-def ensure_schema() -> None:
-    # projects table should already exist from Registry page, but we guard anyway
-    db_exec(
-        """
-    CREATE TABLE IF NOT EXISTS projects (
-        project_id TEXT PRIMARY KEY,
-        project_code TEXT,
-        project_name TEXT,
-        status TEXT DEFAULT 'active',
-        updated_at TEXT
-    );
-    """
-    )
-
-    # A simple emissions ledger for methodology saves
-    db_exec(
-        """
-    CREATE TABLE IF NOT EXISTS emissions (
-        emission_id TEXT PRIMARY KEY,
-        project_id TEXT,
-        methodology TEXT,
-        record_date TEXT,
-        quantity_tco2e REAL,
-        notes TEXT,
-        inputs_json TEXT,
-        outputs_json TEXT,
-        created_at TEXT,
-        FOREIGN KEY(project_id) REFERENCES projects(project_id) ON DELETE SET NULL
-    );
-    """
-    )
-
-
-def list_projects() -> pd.DataFrame:
-    df = db_query(
-        """
-        SELECT project_id, project_code, project_name, status, updated_at
-        FROM projects
-        WHERE COALESCE(status,'active') != 'archived'
-        ORDER BY updated_at DESC
-    """
-    )
-    if df.empty:
-        return df
-    df["project_code"] = df["project_code"].fillna("")
-    df["project_name"] = df["project_name"].fillna("")
-    df["label"] = df["project_code"] + " — " + df["project_name"]
-    df.loc[df["label"].str.strip() == "—", "label"] = df["project_id"]
-    return df
-
-
 def save_emission(
     project_id: str,
     methodology: str,
@@ -150,21 +80,18 @@ def render_save_panel(
 ):
     st.divider()
     with st.expander("💾 Save this result to Emissions Ledger", expanded=False):
-        projects = list_projects()
-        if projects.empty:
+        project_id = project_picker(
+            "Select project",
+            key=f"{methodology}_project_pick",
+            scope="open",
+            default_id=st.session_state.get("active_project_id"),
+        )
+        if project_id is None:
             st.warning(
                 "No projects found yet. Go to **Carbon Registry** page and create a project first."
             )
             return
 
-        pick = st.selectbox(
-            "Select project",
-            projects["label"].tolist(),
-            index=0,
-            key=f"{methodology}_project_pick",
-        )
-        project_id = projects.loc[projects["label"] == pick, "project_id"].iloc[0]
-
         c1, c2 = st.columns(2)
         with c1:
             rec_date = st.date_input(
@@ -193,27 +120,323 @@ def render_save_panel(
             st.success(f"Saved ✅ Emission ID: {eid}")
 
 
+def quantity_input(label: str, unit: str, *, key: str, value: float, step: float) -> float:
+    """Number + unit picker; returns the value converted to `unit` (see utils/units.py)."""
+    c1, c2 = st.columns([3, 1])
+    with c2:
+        entered_unit = st.selectbox("Unit", units.compatible_units(unit), key=f"{key}_unit")
+    with c1:
+        entered = st.number_input(f"{label} ({entered_unit})", min_value=0.0, value=value, step=step, key=key)
+    return units.convert(entered, entered_unit, unit)
+
+
+# ------------------------------------------------------------
+# Monte Carlo uncertainty (see utils/uncertainty.py)
+# ------------------------------------------------------------
+def monte_carlo_panel(
+    methodology: str,
+    model: str,
+    inputs: Dict[str, Tuple[float, float]],
+    fixed_params: Dict[str, float],
+    correlations: Optional[List[Tuple[str, str, float]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Per-input distributions (value, default ±% at 1σ) -> simulated baseline / project / ER."""
+    with st.expander("🎲 Monte Carlo uncertainty (optional)", expanded=False):
+        st.caption("Bands are 1σ as % of the value. ER keeps the max(…, 0) clamp, so its interval can be skewed.")
+        table = pd.DataFrame(
+            [{"input": k, "value": v, "distribution": "normal", "u_pct": u} for k, (v, u) in inputs.items()]
+        )
+        edited = st.data_editor(
+            table,
+            key=f"{methodology}_mc_inputs",
+            hide_index=True,
+            use_container_width=True,
+            disabled=["input", "value"],
+            column_config={
+                "distribution": st.column_config.SelectboxColumn("distribution", options=list(uncertainty.DISTRIBUTIONS)),
+                "u_pct": st.column_config.NumberColumn("± % (1σ)", min_value=0.0, step=1.0),
+            },
+        )
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            n = st.selectbox("Samples", [10_000, 100_000, 500_000], index=1, key=f"{methodology}_mc_n")
+        with c2:
+            seed = int(st.number_input("Seed", min_value=0, value=uncertainty.DEFAULT_SEED, step=1, key=f"{methodology}_mc_seed"))
+        with c3:
+            run = st.checkbox("Run simulation", value=False, key=f"{methodology}_mc_run")
+        if not run:
+            return None
+
+        specs = {
+            row["input"]: uncertainty.spec_from_band(row["value"], float(row["u_pct"] or 0.0), row["distribution"])
+            for row in edited.to_dict("records")
+        }
+        specs.update({k: uncertainty.fixed(v) for k, v in fixed_params.items()})
+        mc = uncertainty.simulate(model, specs, correlations or [], n=int(n), seed=seed)
+
+        rows = []
+        for key, o in mc["outputs"].items():
+            rows.append({
+                "output (tCO₂e)": key,
+                "mean": o["mean"],
+                "P5": o["percentiles"]["p5"],
+                "P50": o["percentiles"]["p50"],
+                "P95": o["percentiles"]["p95"],
+                "95% CI": f"{o['ci_low']:,.3f} – {o['ci_high']:,.3f}",
+                "P(=0)": o["p_zero"],
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        er = mc["outputs"]["er_tco2e"]
+        st.bar_chart(
+            pd.DataFrame({"er_tco2e": er["hist"]["edges"][:-1], "draws": er["hist"]["counts"]}),
+            x="er_tco2e", y="draws", height=180,
+        )
+        return {
+            "n": mc["n"],
+            "seed": mc["seed"],
+            "spec_hash": mc["spec_hash"],
+            "inputs": specs,
+            "summary": {k: {kk: vv for kk, vv in v.items() if kk != "hist"} for k, v in mc["outputs"].items()},
+        }
+
+
+# ------------------------------------------------------------
+# Scenario sweeps (see utils/scenarios.py)
+# ------------------------------------------------------------
+SWEEP_OUTPUTS = ["er_tco2e", "baseline_tco2e", "project_tco2e"]
+SWEEP_DEFAULT_STEPS = 21
+
+
+def scenario_panel(
+    methodology: str,
+    model: str,
+    base: Dict[str, float],
+    params: Dict[str, Tuple[str, float, float]],
+) -> Optional[Dict[str, Any]]:
+    """Full-grid sweep over chosen inputs ({name: (label, low, high)}) + tornado and surface charts."""
+    with st.expander("📈 Scenario sweep (optional)", expanded=False):
+        st.caption(
+            "Every combination of the ticked ranges is evaluated in one vectorized pass "
+            f"(up to {scenarios.MAX_POINTS:,} points); other inputs stay at the values above."
+        )
+        table = pd.DataFrame(
+            [
+                {"input": name, "label": label, "sweep": i < 3, "low": lo, "high": hi, "steps": SWEEP_DEFAULT_STEPS}
+                for i, (name, (label, lo, hi)) in enumerate(params.items())
+            ]
+        )
+        edited = st.data_editor(
+            table,
+            key=f"{methodology}_sweep_ranges",
+            hide_index=True,
+            use_container_width=True,
+            disabled=["input", "label"],
+            column_config={
+                "input": None,
+                "steps": st.column_config.NumberColumn("steps", min_value=1, max_value=scenarios.MAX_STEPS, step=1),
+            },
+        )
+        c1, c2 = st.columns(2)
+        with c1:
+            output = st.selectbox("Output", SWEEP_OUTPUTS, key=f"{methodology}_sweep_output")
+        with c2:
+            run = st.checkbox("Run sweep", value=False, key=f"{methodology}_sweep_run")
+        if not run:
+            return None
+
+        rows = edited.to_dict("records")
+        labels = {r["input"]: r["label"] for r in rows}
+        ranges = {r["input"]: (float(r["low"]), float(r["high"]), int(r["steps"] or 1)) for r in rows if r["sweep"]}
+        if not ranges:
+            st.info("Tick at least one input to sweep.")
+            return None
+        try:
+            result = scenarios.sweep(model, base, ranges)
+        except ValueError as e:
+            st.error(str(e))
+            return None
+        summary = scenarios.grid_summary(result, output)
+        st.caption(f"{result['points']:,} combinations evaluated in {result['seconds'] * 1000:,.0f} ms.")
+        st.dataframe(pd.DataFrame([summary]), use_container_width=True, hide_index=True)
+
+        tor = scenarios.tornado(model, base, {r["input"]: (float(r["low"]), float(r["high"]), 2) for r in rows}, output)
+        tor["label"] = tor["input"].map(labels)
+        st.markdown("**Tornado (one input at a time, others at the values above)**")
+        bars = alt.Chart(tor).mark_bar().encode(
+            y=alt.Y("label:N", sort=list(tor["label"]), title=None),
+            x=alt.X("output_at_low:Q", title=output),
+            x2="output_at_high:Q",
+            tooltip=["label", "low_value", "high_value", "output_at_low", "output_at_high"],
+        )
+        rule = alt.Chart(pd.DataFrame({"base": [float(tor["base_output"].iloc[0])]})).mark_rule(color="black").encode(x="base:Q")
+        st.altair_chart((bars + rule).properties(height=40 + 28 * len(tor)), use_container_width=True)
+
+        swept = list(result["axes"])
+        if len(swept) >= 2:
+            c3, c4 = st.columns(2)
+            with c3:
+                x = st.selectbox("Surface x", swept, format_func=labels.get, key=f"{methodology}_sweep_x")
+            with c4:
+                y = st.selectbox("Surface y", [k for k in swept if k != x], format_func=labels.get, key=f"{methodology}_sweep_y")
+            surf = scenarios.surface(result, x, y, output, base, max_side=60)
+            st.altair_chart(
+                alt.Chart(surf).mark_rect().encode(
+                    x=alt.X(f"{x}:O", title=labels[x], axis=alt.Axis(format=".3~g")),
+                    y=alt.Y(f"{y}:O", title=labels[y], sort="descending", axis=alt.Axis(format=".3~g")),
+                    color=alt.Color(f"{output}:Q", scale=alt.Scale(scheme="viridis")),
+                    tooltip=[x, y, output],
+                ).properties(height=320),
+                use_container_width=True,
+            )
+        else:
+            (only,) = swept
+            line = pd.DataFrame({only: result["axes"][only], output: result["outputs"][output]})
+            st.line_chart(line, x=only, y=output, height=220)
+
+        return {
+            "output": output,
+            "ranges": {k: list(v) for k, v in ranges.items()},
+            "summary": summary,
+            "tornado": tor.drop(columns=["label"]).to_dict("records"),
+        }
+
+
 # ------------------------------------------------------------
 # Methodology 1: VM0038 (EV Charging) demo-style
 # ------------------------------------------------------------
-FUEL_EF = {
-    "Petrol": 2.31,
-    "Diesel": 2.68,
-    "LPG": 1.51,
-    "Other": None,
-}  # kg CO2e/L (demo defaults)
-WTT_EF = {"Petrol": 0.52, "Diesel": 0.58, "LPG": 0.21}  # kg CO2e/L (demo defaults)
-FUEL_ENERGY_MJ = {
-    "Petrol": 34.2,
-    "Diesel": 38.6,
-    "LPG": 26.8,
-    "Other": 0.0,
-}  # MJ/L
-RENEWABLE_EF = 0.0  # kg CO2e/kWh (assumed)
+# Demo defaults come from the factor library (dataset "demo-defaults", utils/factors.py).
+def fuel_defaults() -> Tuple[Dict[str, Any], Dict[str, float], Dict[str, float]]:
+    """(tailpipe kg CO2e/L incl. "Other": None, WTT kg CO2e/L, energy MJ/L incl. "Other": 0)."""
+    demo = factors.demo_defaults()
+    fuel_ef: Dict[str, Any] = {**demo.get("tank-to-wheel", {}), "Other": None}
+    return fuel_ef, dict(demo.get("well-to-tank", {})), {**demo.get("net calorific value", {}), "Other": 0.0}
+
+
+def evaluate_cached(module: Any, inputs: Any) -> Any:
+    """module.evaluate(inputs) through the shared calculation cache (reruns and other sessions hit it)."""
+    return calc_cache.get_or_compute(f"{module.NAME}.evaluate", inputs, lambda: module.evaluate(inputs))
+
+
+def portfolio_panel(module: Any, defaults: Dict[str, Any]) -> None:
+    """Evaluate a portfolio file with methodologies.<module>.evaluate_batch (one vectorized call)."""
+    with st.expander("🗂️ Portfolio batch (one row per project)", expanded=False):
+        fields = input_fields(module.Inputs)
+        st.caption(
+            "Columns: " + ", ".join(f"`{name}` ({meta.get('unit') or kind.__name__})" for name, kind, _d, meta in fields)
+            + ". Other columns (e.g. project_code) are passed through; blank cells use the values above. "
+            f"For large files use `python -m methodologies {module.NAME} <file>`."
+        )
+        st.download_button(
+            "Download template (CSV)",
+            data=pd.DataFrame(columns=["project_code", *(name for name, *_rest in fields)]).to_csv(index=False).encode("utf-8"),
+            file_name=f"{module.NAME.lower()}_portfolio_template.csv",
+            mime="text/csv",
+            key=f"{module.NAME}_portfolio_template",
+        )
+        upload = st.file_uploader("Portfolio file (CSV / XLSX)", type=["csv", "xlsx"], key=f"{module.NAME}_portfolio_file")
+        if upload is None:
+            return
+        try:
+            results, errors = calc_cache.get_or_compute(
+                f"{module.NAME}.evaluate_batch",
+                {"file": upload.getvalue(), "name": upload.name, "defaults": defaults},
+                lambda: module.evaluate_batch(read_table(upload, upload.name), defaults),
+            )
+        except (RuntimeError, ValueError) as e:
+            st.error(str(e))
+            return
+        if not errors.empty:
+            st.warning(f"{errors['row'].nunique():,} row(s) skipped.")
+            st.dataframe(errors, use_container_width=True, hide_index=True)
+        if results.empty:
+            return
+        p1, p2, p3 = st.columns(3)
+        p1.metric("Projects", f"{len(results):,}")
+        p2.metric("Baseline (tCO₂e)", f"{results['baseline_tco2e'].sum():,.3f}")
+        p3.metric("ER (tCO₂e)", f"{results['er_tco2e'].sum():,.3f}")
+        st.dataframe(results, use_container_width=True, hide_index=True)
+        st.download_button(
+            "Download results (CSV)",
+            data=results.to_csv(index=False).encode("utf-8"),
+            file_name=f"{module.NAME.lower()}_portfolio_results.csv",
+            mime="text/csv",
+            key=f"{module.NAME}_portfolio_download",
+        )
+
+
+def vm0038_site_batch(defaults: Dict[str, Any], fuel_ef: Dict[str, Any], wtt_ef: Dict[str, float],
+                      fuel_energy_mj: Dict[str, float]) -> None:
+    """Many sites in one vectorized call (methodologies/vm0038.py); blank cells use the values above."""
+    with st.expander("🏭 Site batch (many sites / fleets at once)", expanded=False):
+        st.caption(
+            "One row per site: either `litres_year` (fuel avoided) or all of "
+            f"{', '.join(vm0038.FLEET_COLUMNS)} (charger fleet). Blank cells use the values above."
+        )
+        st.download_button(
+            "Download template (CSV)",
+            data=pd.DataFrame(columns=vm0038.SITE_COLUMNS).to_csv(index=False).encode("utf-8"),
+            file_name="vm0038_sites_template.csv",
+            mime="text/csv",
+            key="vm0038_batch_template",
+        )
+        upload = st.file_uploader("Sites file (CSV / XLSX)", type=["csv", "xlsx"], key="vm0038_batch_file")
+        if upload is None:
+            return
+        try:
+            table, result, errors = calc_cache.get_or_compute(
+                "VM0038.site_batch",
+                {"file": upload.getvalue(), "name": upload.name, "defaults": defaults,
+                 "factors": [fuel_ef, wtt_ef, fuel_energy_mj]},
+                lambda: vm0038.site_batch(read_table(upload, upload.name), defaults, fuel_ef, wtt_ef, fuel_energy_mj),
+            )
+        except (RuntimeError, ValueError) as e:
+            st.error(str(e))
+            return
+        if not errors.empty:
+            st.warning(f"{errors['row'].nunique():,} row(s) skipped.")
+            st.dataframe(errors, use_container_width=True, hide_index=True)
+        if table.empty:
+            return
+
+        b1, b2, b3 = st.columns(3)
+        b1.metric("Sites", f"{len(table):,}")
+        b2.metric("Baseline (tCO₂e)", f"{table['baseline_tco2e'].sum():,.3f}")
+        b3.metric("ER (tCO₂e)", f"{table['er_tco2e'].sum():,.3f}")
+        by_year = pd.DataFrame(
+            {
+                "Year": result["years"],
+                "Baseline (tCO2e)": result["baseline"].sum(axis=0),
+                "Project (tCO2e)": result["project"].sum(axis=0),
+                "ER (tCO2e)": result["er"].sum(axis=0),
+            }
+        )
+        st.line_chart(by_year, x="Year", height=220)
+        st.dataframe(table, use_container_width=True, hide_index=True)
+
+        n_sites, horizon = result["er"].shape
+        long = pd.DataFrame(
+            {
+                "site_id": np.repeat(table["site_id"].to_numpy(), horizon),
+                "year": np.tile(result["years"], n_sites),
+                "baseline_tco2e": result["baseline"].ravel(),
+                "project_tco2e": result["project"].ravel(),
+                "er_tco2e": result["er"].ravel(),
+            }
+        )
+        long = long[long["year"] <= np.repeat(result["site_years"], horizon)]
+        st.download_button(
+            "Download site × year results (CSV)",
+            data=long.to_csv(index=False).encode("utf-8"),
+            file_name="vm0038_sites_by_year.csv",
+            mime="text/csv",
+            key="vm0038_batch_download",
+        )
 
 
 def vm0038_ev():
     st.subheader("⚡ VM0038 (demo-style) — EV Charging")
+    FUEL_EF, WTT_EF, FUEL_ENERGY_MJ = fuel_defaults()
+    fuel_index = list(FUEL_EF).index("Diesel") if "Diesel" in FUEL_EF else 0
 
     with st.expander("📘 Overview", expanded=False):
         st.markdown(
@@ -257,14 +480,10 @@ This is a **VM0038-style demonstration**:
     if mode == "Fuel avoided (baseline)":
         with right:
             fuel_type = st.selectbox(
-                "ICE fuel type", list(FUEL_EF.keys()), index=1, key="vm0038_fuel"
+                "ICE fuel type", list(FUEL_EF.keys()), index=fuel_index, key="vm0038_fuel"
             )
-            litres_year = st.number_input(
-                "Fuel avoided (litres/year)",
-                min_value=0.0,
-                value=25000.0,
-                step=500.0,
-                key="vm0038_litres",
+            litres_year = quantity_input(
+                "Fuel avoided per year", "L", value=25000.0, step=500.0, key="vm0038_litres"
             )
             if fuel_type == "Other":
                 ef_tail = st.number_input(
@@ -285,12 +504,9 @@ This is a **VM0038-style demonstration**:
                 ef_tail = float(FUEL_EF[fuel_type])
                 ef_wtt = float(WTT_EF.get(fuel_type, 0.0))
 
-            baseline_kg = float(litres_year) * (ef_tail + (ef_wtt if include_wtt else 0.0))
 
             # Project electricity from energy equivalence (demo approach)
-            mj = float(litres_year) * float(FUEL_ENERGY_MJ.get(fuel_type, 0.0))
-            # assume 1 kWh = 3.6 MJ
-            kwh_year = mj / 3.6 if mj > 0 else 0.0
+            kwh_year = float(vm0038.fuel_kwh(litres_year, FUEL_ENERGY_MJ.get(fuel_type, 0.0)))
 
             charge_eff = st.slider(
                 "Charging efficiency (%)", 70, 100, 90, key="vm0038_eff"
@@ -322,18 +538,17 @@ This is a **VM0038-style demonstration**:
                     "Operating days/year", min_value=0, value=300, step=1, key="vm0038_days"
                 )
 
-            kwh_year = float(n_chargers) * sessions_per_day * kwh_per_session * float(operating_days)
+            kwh_year = float(vm0038.fleet_kwh(n_chargers, sessions_per_day, kwh_per_session, operating_days))
             st.info(f"Derived annual electricity: **{kwh_year:,.1f} kWh/year**")
             charge_eff = st.slider("Charging efficiency (%)", 70, 100, 90, key="vm0038_eff2")
             kwh_delivered = kwh_year / (charge_eff / 100.0) if charge_eff > 0 else 0.0
 
-            # Baseline fuel avoided derived from kWh equivalence (demo)
-            # assume 2.5 kWh/L avoided (placeholder)
-            litres_year = kwh_year / 2.5 if kwh_year > 0 else 0.0
+            # Baseline fuel avoided derived from kWh equivalence (demo placeholder kWh per litre)
+            litres_year = kwh_year / vm0038.KWH_PER_LITRE_AVOIDED if kwh_year > 0 else 0.0
             fuel_type = st.selectbox(
                 "ICE fuel type (for baseline)",
                 list(FUEL_EF.keys()),
-                index=1,
+                index=fuel_index,
                 key="vm0038_fuel2",
             )
             if fuel_type == "Other":
@@ -346,44 +561,28 @@ This is a **VM0038-style demonstration**:
             else:
                 ef_tail = float(FUEL_EF[fuel_type])
                 ef_wtt = float(WTT_EF.get(fuel_type, 0.0))
-            baseline_kg = float(litres_year) * (ef_tail + (ef_wtt if include_wtt else 0.0))
 
-    # Project emissions with renewables + decarb
     ren_frac = float(renewable_frac) / 100.0
-    eff_grid_ef = float(grid_ef) * (1.0 - ren_frac) + float(RENEWABLE_EF) * ren_frac
-    project_kg_year0 = float(kwh_delivered) * eff_grid_ef
-
-    # Apply decarbonisation over years
-    series = []
-    total_baseline = 0.0
-    total_project = 0.0
-    total_er = 0.0
-
-    for y in range(1, int(years) + 1):
-        grid_factor = (1.0 - float(annual_decarb) / 100.0) ** (y - 1)
-        proj_y = project_kg_year0 * grid_factor
-        base_y = baseline_kg
-        er_y = max(base_y - proj_y, 0.0)
-
-        total_baseline += base_y
-        total_project += proj_y
-        total_er += er_y
-
-        series.append(
-            {
-                "Year": y,
-                "Baseline (tCO2e)": base_y / 1000.0,
-                "Project (tCO2e)": proj_y / 1000.0,
-                "ER (tCO2e)": er_y / 1000.0,
-            }
-        )
-
+    vm_inputs = vm0038.Inputs(
+        litres_year=float(litres_year),
+        ef_tail=float(ef_tail),
+        ef_wtt=float(ef_wtt),
+        include_wtt=bool(include_wtt),
+        kwh_delivered=float(kwh_delivered),
+        grid_ef=float(grid_ef),
+        ren_frac=ren_frac,
+        annual_decarb=float(annual_decarb) / 100.0,
+        years=int(years),
+    )
+    result = evaluate_cached(vm0038, vm_inputs)
+    total_baseline_t, total_project_t, total_er_t = result.baseline_tco2e, result.project_tco2e, result.er_tco2e
+    series = result.yearly
     df = pd.DataFrame(series)
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("Baseline (tCO₂e)", f"{total_baseline/1000.0:,.3f}")
-    c2.metric("Project (tCO₂e)", f"{total_project/1000.0:,.3f}")
-    c3.metric("Emission Reductions (tCO₂e)", f"{total_er/1000.0:,.3f}")
+    c1.metric("Baseline (tCO₂e)", f"{total_baseline_t:,.3f}")
+    c2.metric("Project (tCO₂e)", f"{total_project_t:,.3f}")
+    c3.metric("Emission Reductions (tCO₂e)", f"{total_er_t:,.3f}")
 
     chart = (
         alt.Chart(df.melt("Year"))
@@ -395,6 +594,20 @@ This is a **VM0038-style demonstration**:
 
     st.dataframe(df, use_container_width=True)
 
+    vm0038_site_batch(
+        {
+            "fuel_type": fuel_type,
+            "litres_year": float(litres_year),
+            "charge_eff_pct": float(charge_eff),
+            "grid_ef": float(grid_ef),
+            "renewable_frac_pct": float(renewable_frac),
+            "annual_decarb_pct": float(annual_decarb),
+            "years": int(years),
+            "include_wtt": bool(include_wtt),
+        },
+        FUEL_EF, WTT_EF, FUEL_ENERGY_MJ,
+    )
+
     inputs = {
         "mode": mode,
         "grid_ef_kg_per_kwh": float(grid_ef),
@@ -407,19 +620,64 @@ This is a **VM0038-style demonstration**:
         "kwh_year": float(kwh_year),
         "charging_eff_pct": float(charge_eff),
         "kwh_delivered": float(kwh_delivered),
-        "baseline_kg": float(baseline_kg),
+        "baseline_kg": result.baseline_tco2e * 1000.0 / int(years),
+        "factor_dataset": f"{factors.DEMO_DATASET['name']} {factors.DEMO_DATASET['version']}" if fuel_type != "Other" else None,
+        "engine": dataclasses.asdict(vm_inputs),
+        # factor_id -> engine field it supplies (utils/recompute.py follows factor revisions through this)
+        "engine_factors": {
+            factors.demo_factor_id(fuel_type, "tank-to-wheel"): "ef_tail",
+            factors.demo_factor_id(fuel_type, "well-to-tank"): "ef_wtt",
+        } if fuel_type != "Other" else {},
     }
 
     outputs = {
-        "total_baseline_tco2e": float(total_baseline / 1000.0),
-        "total_project_tco2e": float(total_project / 1000.0),
-        "total_er_tco2e": float(total_er / 1000.0),
+        "total_baseline_tco2e": total_baseline_t,
+        "total_project_tco2e": total_project_t,
+        "total_er_tco2e": total_er_t,
         "yearly_table": series,
     }
 
+    mc = monte_carlo_panel(
+        "VM0038",
+        "VM0038",
+        {
+            "litres_year": (float(litres_year), 5.0),
+            "ef_tail": (float(ef_tail), 5.0),
+            "ef_wtt": (float(ef_wtt), 20.0),
+            "kwh_delivered": (float(kwh_delivered), 5.0),
+            "grid_ef": (float(grid_ef), 10.0),
+        },
+        {
+            "include_wtt": 1.0 if include_wtt else 0.0,
+            "ren_frac": ren_frac,
+            "annual_decarb": float(annual_decarb) / 100.0,
+            "years": float(years),
+        },
+        # In charger-fleet mode fuel avoided is derived from the same kWh, so they move together.
+        [("litres_year", "kwh_delivered", 1.0)] if mode != "Fuel avoided (baseline)" else None,
+    )
+    if mc is not None:
+        outputs["monte_carlo"] = mc
+
+    sweep = scenario_panel(
+        "VM0038",
+        "VM0038",
+        as_values(vm_inputs),
+        {
+            "grid_ef": ("Grid EF (kg CO₂e/kWh)", 0.0, 1.2),
+            "ren_frac": ("Renewable fraction (0–1)", 0.0, 1.0),
+            "annual_decarb": ("Annual grid decarbonisation (0–1)", 0.0, 0.2),
+            "kwh_delivered": ("Electricity delivered (kWh/yr)", 0.5 * float(kwh_delivered), 1.5 * float(kwh_delivered)),
+            "litres_year": ("Fuel avoided (L/yr)", 0.5 * float(litres_year), 1.5 * float(litres_year)),
+            "years": ("Crediting period (years)", 1.0, 10.0),
+        },
+    )
+    if sweep is not None:
+        outputs["scenario_sweep"] = sweep
+
     render_save_panel(
         methodology="VM0038",
-        quantity_tco2e=float(total_er / 1000.0),
+        quantity_tco2e=total_er_t,
         inputs=inputs,
         outputs=outputs,
         notes_default="VM0038 demo-style ER calculation (replace factors with vetted datasets).",
@@ -446,7 +704,7 @@ This is not a formal applicability check; it's a structured example for transpar
     col1, col2 = st.columns(2)
 
     with col1:
-        h2_tons = st.number_input("Hydrogen produced (tons/year)", min_value=0.0, value=120.0, step=5.0)
+        h2_tons = quantity_input("Hydrogen produced per year", "t", value=120.0, step=5.0, key="am0124_h2")
         kwh_per_kg = st.number_input("Electrolyser energy intensity (kWh/kg H2)", min_value=0.0, value=55.0, step=0.5)
         grid_ef = st.number_input("Grid EF (kg CO₂e/kWh)", min_value=0.0, value=0.95, step=0.01)
         renewable_frac = st.slider("Renewable fraction (%)", 0, 100, 0)
@@ -470,41 +728,29 @@ This is not a formal applicability check; it's a structured example for transpar
         leakage_pct = st.slider("H2 leakage (%) [demo placeholder]", 0.0, 5.0, 0.0, 0.1)
         years = st.number_input("Crediting period (years)", min_value=1, value=7, step=1)
 
-    # Derived energy use
-    h2_kg = float(h2_tons) * 1000.0
-    elec_kwh = h2_kg * float(kwh_per_kg)
-
+    h2_kg = units.convert(h2_tons, "t", "kg")
     ren_frac = float(renewable_frac) / 100.0
-    proj_kg = elec_kwh * float(grid_ef) * (1.0 - ren_frac)
-
-    # Baseline
-    if baseline_mode == "Grey H2 (SMR) equivalent":
-        base_kg = h2_kg * float(smr_kg_per_kg)
-    else:
-        # assume baseline would be same electricity with no renewables (demo)
-        base_kg = elec_kwh * float(grid_ef)
-
-    # Leakage penalty (demo)
-    leak_penalty = base_kg * (float(leakage_pct) / 100.0)
-
-    # ER per year
-    er_kg_y = max(base_kg - proj_kg - leak_penalty, 0.0)
-
-    # Over years
-    total_base = base_kg * float(years)
-    total_proj = proj_kg * float(years)
-    total_pen = leak_penalty * float(years)
-    total_er = er_kg_y * float(years)
+    am_inputs = am0124.Inputs(
+        h2_kg=h2_kg,
+        kwh_per_kg=float(kwh_per_kg),
+        grid_ef=float(grid_ef),
+        ren_frac=ren_frac,
+        grey_baseline=baseline_mode == "Grey H2 (SMR) equivalent",
+        smr_kg_per_kg=float(smr_kg_per_kg),
+        leakage_frac=float(leakage_pct) / 100.0,
+        years=int(years),
+    )
+    r = evaluate_cached(am0124, am_inputs)
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("Baseline (tCO₂e)", f"{total_base/1000.0:,.3f}")
-    c2.metric("Project (tCO₂e)", f"{total_proj/1000.0:,.3f}")
-    c3.metric("ER (tCO₂e)", f"{total_er/1000.0:,.3f}")
+    c1.metric("Baseline (tCO₂e)", f"{r.baseline_tco2e:,.3f}")
+    c2.metric("Project (tCO₂e)", f"{r.project_tco2e:,.3f}")
+    c3.metric("ER (tCO₂e)", f"{r.er_tco2e:,.3f}")
 
     df = pd.DataFrame(
         {
             "Metric": ["H2 produced (kg)", "Electricity (kWh)", "Leakage penalty (tCO2e/yr)", "ER (tCO2e/yr)"],
-            "Value": [h2_kg, elec_kwh, leak_penalty / 1000.0, er_kg_y / 1000.0],
+            "Value": [h2_kg, r.elec_kwh_year, r.leakage_penalty_tco2e_year, r.er_tco2e_per_year],
         }
     )
     st.dataframe(df, use_container_width=True)
@@ -512,25 +758,63 @@ This is not a formal applicability check; it's a structured example for transpar
     inputs = {
         "h2_tons_year": float(h2_tons),
         "kwh_per_kg": float(kwh_per_kg),
-        "elec_kwh_year": float(elec_kwh),
+        "elec_kwh_year": r.elec_kwh_year,
         "grid_ef_kg_per_kwh": float(grid_ef),
         "renewable_fraction_pct": float(renewable_frac),
         "baseline_mode": baseline_mode,
         "smr_ef_kg_per_kg": float(smr_kg_per_kg),
         "leakage_pct": float(leakage_pct),
         "years": int(years),
+        "engine": dataclasses.asdict(am_inputs),
     }
     outputs = {
-        "baseline_tco2e_total": float(total_base / 1000.0),
-        "project_tco2e_total": float(total_proj / 1000.0),
-        "penalty_tco2e_total": float(total_pen / 1000.0),
-        "er_tco2e_total": float(total_er / 1000.0),
-        "er_tco2e_per_year": float(er_kg_y / 1000.0),
+        "baseline_tco2e_total": r.baseline_tco2e,
+        "project_tco2e_total": r.project_tco2e,
+        "penalty_tco2e_total": r.penalty_tco2e,
+        "er_tco2e_total": r.er_tco2e,
+        "er_tco2e_per_year": r.er_tco2e_per_year,
     }
 
+    mc = monte_carlo_panel(
+        "AM0124",
+        "AM0124",
+        {
+            "h2_kg": (h2_kg, 2.0),
+            "kwh_per_kg": (float(kwh_per_kg), 5.0),
+            "grid_ef": (float(grid_ef), 10.0),
+            "smr_kg_per_kg": (float(smr_kg_per_kg), 10.0),
+        },
+        {
+            "ren_frac": ren_frac,
+            "grey_baseline": 1.0 if baseline_mode == "Grey H2 (SMR) equivalent" else 0.0,
+            "leakage_frac": float(leakage_pct) / 100.0,
+            "years": float(years),
+        },
+    )
+    if mc is not None:
+        outputs["monte_carlo"] = mc
+
+    sweep = scenario_panel(
+        "AM0124",
+        "AM0124",
+        as_values(am_inputs),
+        {
+            "grid_ef": ("Grid EF (kg CO₂e/kWh)", 0.0, 1.2),
+            "ren_frac": ("Renewable fraction (0–1)", 0.0, 1.0),
+            "kwh_per_kg": ("Electrolyser intensity (kWh/kg H₂)", 40.0, 70.0),
+            "leakage_frac": ("H₂ leakage (0–1)", 0.0, 0.05),
+            "smr_kg_per_kg": ("SMR EF (kg CO₂e/kg H₂)", 8.0, 12.0),
+            "h2_kg": ("Hydrogen produced (kg/yr)", 0.5 * h2_kg, 1.5 * h2_kg),
+        },
+    )
+    if sweep is not None:
+        outputs["scenario_sweep"] = sweep
+
+    portfolio_panel(am0124, dataclasses.asdict(am_inputs))
+
     render_save_panel(
         methodology="AM0124",
-        quantity_tco2e=float(total_er / 1000.0),
+        quantity_tco2e=r.er_tco2e,
         inputs=inputs,
         outputs=outputs,
         notes_default="AM0124 demo-style ER calculation (replace assumptions/factors with vetted datasets).",
@@ -557,7 +841,7 @@ Replace all defaults with your verified method inputs and GHG parameters for rea
     col1, col2, col3 = st.columns(3)
     with col1:
         material = st.selectbox("Material", ["Plastic", "Paper", "Glass", "Metal"], index=0)
-        tons = st.number_input("Waste processed (tons/year)", min_value=0.0, value=500.0, step=10.0)
+        tons = quantity_input("Waste processed per year", "t", value=500.0, step=10.0, key="vmr0007_tons")
         contamination = st.slider("Contamination (%)", 0.0, 50.0, 10.0, 1.0)
 
     with col2:
@@ -575,26 +859,26 @@ Replace all defaults with your verified method inputs and GHG parameters for rea
         )
 
     with col3:
-        transport_km = st.number_input("Transport distance (km) [demo]", min_value=0.0, value=80.0, step=5.0)
+        transport_km = quantity_input("Transport distance [demo]", "km", value=80.0, step=5.0, key="vmr0007_km")
         transport_ef = st.number_input("Transport EF (tCO₂e/ton-km) [demo]", min_value=0.0, value=0.00012, step=0.00001, format="%.5f")
         energy_tco2e = st.number_input("Other energy emissions (tCO₂e/year) [demo]", min_value=0.0, value=5.0, step=0.5)
 
-    clean_tons = float(tons) * (1.0 - float(contamination) / 100.0)
-    residue_tons = float(tons) - clean_tons
-
-    baseline = float(tons) * float(landfill_ef)
-    project_recycling = clean_tons * float(recycle_ef)
-    project_residue = residue_tons * float(landfill_ef)  # residue still landfilled (demo)
-    project_transport = float(tons) * float(transport_km) * float(transport_ef)
-    project_energy = float(energy_tco2e)
-
-    project_total = project_recycling + project_residue + project_transport + project_energy
-    er = max(baseline - project_total, 0.0)
+    wr_inputs = vmr0007.Inputs(
+        tons=float(tons),
+        landfill_ef=float(landfill_ef),
+        recycle_ef=float(recycle_ef),
+        contamination_frac=float(contamination) / 100.0,
+        transport_km=float(transport_km),
+        transport_ef=float(transport_ef),
+        energy_tco2e=float(energy_tco2e),
+        material=material,
+    )
+    r = evaluate_cached(vmr0007, wr_inputs)
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("Baseline (tCO₂e)", f"{baseline:,.3f}")
-    c2.metric("Project (tCO₂e)", f"{project_total:,.3f}")
-    c3.metric("ER (tCO₂e)", f"{er:,.3f}")
+    c1.metric("Baseline (tCO₂e)", f"{r.baseline_tco2e:,.3f}")
+    c2.metric("Project (tCO₂e)", f"{r.project_tco2e:,.3f}")
+    c3.metric("ER (tCO₂e)", f"{r.er_tco2e:,.3f}")
 
     st.dataframe(
         pd.DataFrame(
@@ -608,12 +892,12 @@ Replace all defaults with your verified method inputs and GHG parameters for rea
                     "Energy emissions",
                 ],
                 "Value": [
-                    clean_tons,
-                    residue_tons,
-                    project_recycling,
-                    project_residue,
-                    project_transport,
-                    project_energy,
+                    r.clean_tons,
+                    r.residue_tons,
+                    r.recycling_tco2e,
+                    r.residue_landfill_tco2e,
+                    r.transport_tco2e,
+                    wr_inputs.energy_tco2e,
                 ],
             }
         ),
@@ -629,24 +913,61 @@ Replace all defaults with your verified method inputs and GHG parameters for rea
         "transport_km": float(transport_km),
         "transport_ef_tco2e_per_ton_km": float(transport_ef),
         "energy_tco2e_year": float(energy_tco2e),
+        "engine": dataclasses.asdict(wr_inputs),
     }
     outputs = {
-        "clean_tons": float(clean_tons),
-        "residue_tons": float(residue_tons),
-        "baseline_tco2e": float(baseline),
-        "project_tco2e": float(project_total),
-        "er_tco2e": float(er),
+        "clean_tons": r.clean_tons,
+        "residue_tons": r.residue_tons,
+        "baseline_tco2e": r.baseline_tco2e,
+        "project_tco2e": r.project_tco2e,
+        "er_tco2e": r.er_tco2e,
         "breakdown": {
-            "recycling": float(project_recycling),
-            "residue_landfill": float(project_residue),
-            "transport": float(project_transport),
-            "energy": float(project_energy),
+            "recycling": r.recycling_tco2e,
+            "residue_landfill": r.residue_landfill_tco2e,
+            "transport": r.transport_tco2e,
+            "energy": wr_inputs.energy_tco2e,
         },
     }
 
+    mc = monte_carlo_panel(
+        "VMR0007",
+        "VMR0007",
+        {
+            "tons": (float(tons), 2.0),
+            "landfill_ef": (float(landfill_ef), 20.0),
+            "recycle_ef": (float(recycle_ef), 20.0),
+            "transport_ef": (float(transport_ef), 10.0),
+            "energy_tco2e": (float(energy_tco2e), 10.0),
+        },
+        {
+            "contamination_frac": float(contamination) / 100.0,
+            "transport_km": float(transport_km),
+        },
+    )
+    if mc is not None:
+        outputs["monte_carlo"] = mc
+
+    sweep = scenario_panel(
+        "VMR0007",
+        "VMR0007",
+        as_values(wr_inputs),
+        {
+            "contamination_frac": ("Contamination (0–1)", 0.0, 0.5),
+            "landfill_ef": ("Landfill EF (tCO₂e/t)", 0.5, 2.0),
+            "recycle_ef": ("Recycling EF (tCO₂e/t)", 0.05, 0.4),
+            "transport_km": ("Transport distance (km)", 10.0, 300.0),
+            "transport_ef": ("Transport EF (tCO₂e/t·km)", 0.00005, 0.0002),
+            "tons": ("Waste processed (t/yr)", 0.5 * float(tons), 1.5 * float(tons)),
+        },
+    )
+    if sweep is not None:
+        outputs["scenario_sweep"] = sweep
+
+    portfolio_panel(vmr0007, dataclasses.asdict(wr_inputs))
+
     render_save_panel(
         methodology="VMR0007",
-        quantity_tco2e=float(er),
+        quantity_tco2e=r.er_tco2e,
         inputs=inputs,
         outputs=outputs,
         notes_default="VMR0007 demo-style ER calculation (replace assumptions/factors with vetted datasets).",
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+from utils import analytics
+from utils.schema import ensure_schema
+from utils.ui import render_hero, setup_page
+
+# IMPORTANT: first Streamlit call in this file
+setup_page(
+    page_title="Carbon Registry • Portfolio",
+    page_icon="📈",
+    layout="wide",
+    active_label="📈 Portfolio",
+)
+
+render_hero(
+    title="📈 Portfolio",
+    subtitle_html="Cross-project analytics: issuance vs sales by vintage, revenue by buyer, emissions by methodology and by month.",
+)
+
+ensure_schema()
+
+# ------------------------------------------------------------
+# Cached aggregates (read-only; see utils/analytics.py)
+# ------------------------------------------------------------
+@st.cache_data(ttl=60, show_spinner="Aggregating portfolio…")
+def cached(name: str, filter_items: tuple) -> pd.DataFrame:
+    return getattr(analytics, name)(dict(filter_items))
+
+
+@st.cache_data(ttl=300)
+def cached_filter_options() -> Dict[str, Any]:
+    return analytics.filter_options()
+
+
+# ------------------------------------------------------------
+# Filters
+# ------------------------------------------------------------
+options = cached_filter_options()
+f1, f2, f3, f4, f5 = st.columns([1, 1, 1, 1, 0.6])
+with f1:
+    sector = st.selectbox("Sector", ["(all)"] + options["sector"])
+with f2:
+    country = st.selectbox("Country", ["(all)"] + options["country"])
+with f3:
+    standard = st.selectbox("Standard", ["(all)"] + options["standard"])
+with f4:
+    include_archived = st.checkbox("Include archived projects", value=False)
+with f5:
+    if st.button("↻ Refresh", use_container_width=True):
+        cached.clear()
+        cached_filter_options.clear()
+        st.rerun()
+
+filters = {
+    "sector": None if sector == "(all)" else sector,
+    "country": None if country == "(all)" else country,
+    "standard": None if standard == "(all)" else standard,
+    "include_archived": include_archived,
+}
+filter_items = tuple(sorted(filters.items()))
+
+st.caption(f"Engine: {analytics.engine()} (read-only) · results cached for 60 s")
+
+tab_vintage, tab_buyers, tab_emissions, tab_monthly, tab_projects = st.tabs(
+    [
+        "🏷️ Issued vs sold by vintage",
+        "🤝 Revenue by buyer",
+        "🌫️ Emissions by methodology",
+        "📅 tCO₂e by month",
+        "🏆 Projects",
+    ]
+)
+
+with tab_vintage:
+    df = cached("issued_vs_sold_by_vintage", filter_items)
+    if df.empty:
+        st.info("No issuances or sales recorded yet.")
+    else:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Credits issued", f"{df['credits_issued'].sum():,.2f}")
+        c2.metric("Credits sold", f"{df['credits_sold'].sum():,.2f}")
+        c3.metric("Remaining", f"{df['remaining'].sum():,.2f}")
+        chart = (
+            alt.Chart(df.melt("vintage_year", ["credits_issued", "credits_sold"]))
+            .mark_bar()
+            .encode(x="vintage_year:O", y="value:Q", color="variable:N", xOffset="variable:N")
+            .properties(height=280)
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption("Vintage 0 = sales not linked to an issuance.")
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+with tab_buyers:
+    df = cached("revenue_by_buyer", filter_items)
+    if df.empty:
+        st.info("No sales recorded yet.")
+    else:
+        chart = (
+            alt.Chart(df.head(20))
+            .mark_bar()
+            .encode(x="revenue:Q", y=alt.Y("buyer:N", sort="-x"), color="currency:N")
+            .properties(height=360)
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption("Revenue is nominal, per currency (no FX conversion).")
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+with tab_emissions:
+    df = cached("emissions_by_methodology", filter_items)
+    if df.empty:
+        st.info("The emissions ledger is empty.")
+    else:
+        chart = (
+            alt.Chart(df)
+            .mark_bar()
+            .encode(x="year:O", y="quantity_tco2e:Q", color="methodology:N")
+            .properties(height=280)
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+with tab_monthly:
+    df = cached("emissions_by_month", filter_items)
+    if df.empty:
+        st.info("No saved runs or ledger entries yet.")
+    else:
+        months = sorted(df["month"].unique())
+        if len(months) > 1:
+            m1, m2 = st.select_slider("Months", options=months, value=(months[max(0, len(months) - 60)], months[-1]))
+            df = df[(df["month"] >= m1) & (df["month"] <= m2)]
+        df = df.copy()
+        df["series"] = (df["scope_label"] + " " + df["methodology"]).str.strip().replace("", "(unlabelled)")
+        df["series"] = df["source_table"].map({"calc_runs": "Run", "emissions": "Ledger"}) + " · " + df["series"]
+        c1, c2 = st.columns(2)
+        c1.metric("tCO₂e in range", f"{df['tco2e'].sum():,.2f}")
+        c2.metric("Months", f"{df['month'].nunique():,}")
+        chart = (
+            alt.Chart(df)
+            .mark_bar()
+            .encode(x=alt.X("yearmonth(month):T", title="Month"), y="sum(tco2e):Q", color="series:N")
+            .properties(height=300)
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption(
+            "Runs are pro-rated by day over their period; ledger entries fall in their record month. "
+            "Scope runs count reduction_tco2e, ledger entries quantity_tco2e. "
+            "Only runs saved to a registry project are counted, with or without filters."
+        )
+        st.dataframe(df.drop(columns="series"), use_container_width=True, hide_index=True)
+
+with tab_projects:
+    df = cached("project_league", filter_items)
+    if df.empty:
+        st.info("No issuances or sales recorded yet.")
+    else:
+        st.dataframe(df, use_container_width=True, hide_index=True)
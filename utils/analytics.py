@@ -0,0 +1,223 @@
+"""
+utils/analytics.py
+
+Read-only portfolio analytics across all projects.
+
+Key guarantees:
+- When the optional duckdb package (and its sqlite extension) is available, the registry DB is
+  ATTACHed READ_ONLY in an in-process DuckDB and aggregates run there: columnar, vectorized,
+  multi-threaded. Nothing is copied and no service is needed.
+- Without DuckDB, or if DuckDB rejects a query (e.g. a stray '' in a REAL column — SQLite is
+  dynamically typed, DuckDB is not), the same SQL runs on the SQLite reader instead.
+- Every query is a pure SELECT; the registry is never written from here.
+- Result frames are small (grouped) and cheap to cache; pages cache them with st.cache_data.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from utils import db as _db
+from utils.db import db_query
+
+try:
+    import duckdb
+except ImportError:  # optional: falls back to SQLite
+    duckdb = None
+
+
+log = logging.getLogger(__name__)
+
+ATTACH_AS = "reg"
+
+_duck_lock = threading.Lock()
+_duck: Optional["duckdb.DuckDBPyConnection"] = None
+_duck_failed = False
+
+
+def _duck_connection() -> Optional["duckdb.DuckDBPyConnection"]:
+    """Process-wide DuckDB with the registry attached (None when unavailable)."""
+    global _duck, _duck_failed
+    if duckdb is None or _duck_failed:
+        return None
+    with _duck_lock:
+        if _duck is None and not _duck_failed:
+            try:
+                _db.get_reader()  # make sure the DB exists and is in WAL mode first
+                conn = duckdb.connect(":memory:")
+                conn.execute("INSTALL sqlite; LOAD sqlite;")
+                conn.execute(f"ATTACH '{_db.DB_PATH}' AS {ATTACH_AS} (TYPE sqlite, READ_ONLY);")
+                _duck = conn
+            except Exception as e:
+                log.warning("DuckDB unavailable for analytics (%s); using SQLite.", e)
+                _duck_failed = True
+    return _duck
+
+
+def engine() -> str:
+    return "duckdb" if _duck_connection() is not None else "sqlite"
+
+
+def _run(sql: str, params: Tuple = ()) -> pd.DataFrame:
+    """Run `sql` (tables written as {t}name) on DuckDB, or on the SQLite reader as a fallback."""
+    conn = _duck_connection()
+    if conn is not None:
+        try:
+            # cursor(): a per-call handle on the shared database, safe across session threads.
+            return conn.cursor().execute(sql.format(t=f"{ATTACH_AS}."), list(params)).df()
+        except duckdb.Error as e:
+            log.warning("DuckDB query failed (%s); retrying on SQLite.", e)
+    return db_query(sql.format(t=""), params)
+
+
+# ------------------------------------------------------------
+# Portfolio filters (joined through projects)
+# ------------------------------------------------------------
+def _project_filter(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """WHERE fragment on alias p; filters: sector, country, standard, include_archived."""
+    filters = filters or {}
+    where = [] if filters.get("include_archived") else ["COALESCE(p.status, 'Active') != 'Archived'"]
+    params: List[Any] = []
+    for col in ("sector", "country", "standard"):
+        if filters.get(col):
+            where.append(f"p.{col} = ?")
+            params.append(filters[col])
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def filter_options() -> Dict[str, List[str]]:
+    """Distinct sector / country / standard values for the filter widgets."""
+    out = {}
+    for col in ("sector", "country", "standard"):
+        df = db_query(f"SELECT DISTINCT {col} FROM projects WHERE {col} IS NOT NULL AND {col} != '' ORDER BY {col}")
+        out[col] = df[col].tolist()
+    return out
+
+
+# ------------------------------------------------------------
+# Aggregates
+# ------------------------------------------------------------
+def issued_vs_sold_by_vintage(filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """Portfolio issued / sold / remaining per vintage (vintage 0 = sales not linked to an issuance)."""
+    where, params = _project_filter(filters)
+    return _run(
+        f"""
+        SELECT r.vintage_year,
+               SUM(r.credits_issued) AS credits_issued,
+               SUM(r.credits_sold) AS credits_sold,
+               SUM(r.credits_issued) - SUM(r.credits_sold) AS remaining,
+               COUNT(DISTINCT r.project_id) AS n_projects
+        FROM {{t}}credit_rollups r JOIN {{t}}projects p ON p.project_id = r.project_id
+        {where}
+        GROUP BY r.vintage_year
+        ORDER BY r.vintage_year
+        """,
+        tuple(params),
+    )
+
+
+def revenue_by_buyer(filters: Optional[Dict[str, Any]] = None, *, limit: int = 50) -> pd.DataFrame:
+    """Top buyers by nominal revenue, per currency."""
+    where, params = _project_filter(filters)
+    return _run(
+        f"""
+        SELECT COALESCE(NULLIF(s.buyer, ''), '(unknown)') AS buyer,
+               COALESCE(s.currency, '') AS currency,
+               COUNT(*) AS n_sales,
+               COUNT(DISTINCT s.project_id) AS n_projects,
+               SUM(s.credits_sold) AS credits_sold,
+               SUM(s.credits_sold * COALESCE(s.price_per_credit, 0)) AS revenue,
+               SUM(s.credits_sold * COALESCE(s.price_per_credit, 0)) / NULLIF(SUM(s.credits_sold), 0) AS avg_price,
+               MIN(s.sale_date) AS first_sale,
+               MAX(s.sale_date) AS last_sale
+        FROM {{t}}sales s JOIN {{t}}projects p ON p.project_id = s.project_id
+        {where}
+        GROUP BY 1, 2
+        ORDER BY revenue DESC
+        LIMIT ?
+        """,
+        tuple(params) + (int(limit),),
+    )
+
+
+def emissions_by_methodology(filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """Emissions ledger totals per methodology and record year (from the monthly buckets)."""
+    where, params = _project_filter(filters)
+    where = (where + " AND" if where else " WHERE") + " m.source_table = 'emissions'"
+    return _run(
+        f"""
+        SELECT COALESCE(NULLIF(m.methodology, ''), '(none)') AS methodology,
+               SUBSTR(m.month, 1, 4) AS year,
+               SUM(m.n_records) AS n_records,
+               COUNT(DISTINCT m.project_id) AS n_projects,
+               SUM(m.tco2e) AS quantity_tco2e
+        FROM {{t}}emission_monthly m JOIN {{t}}projects p ON p.project_id = m.project_id
+        {where}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        """,
+        tuple(params),
+    )
+
+
+def emissions_by_month(filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """tCO₂e per month and (source, scope, methodology), runs pro-rated over their periods.
+
+    Only runs linked to a registry project count, with or without filters. Without sector /
+    country / standard filters this reads the portfolio totals minus unlinked runs (project '')
+    and, unless included, archived projects — a few hundred rows however many projects there are.
+    """
+    filters = filters or {}
+    keys = "month, source_table, scope_label, methodology"
+    sums = "SUM(baseline_tco2e) AS baseline_tco2e, SUM(project_tco2e) AS project_tco2e, SUM(tco2e) AS tco2e"
+    if any(filters.get(col) for col in ("sector", "country", "standard")):
+        where, params = _project_filter(filters)
+        # Driven from the matching projects: primary-key prefix seeks on the buckets.
+        source = (
+            "SELECT * FROM {t}emission_monthly "
+            f"WHERE project_id IN (SELECT p.project_id FROM {{t}}projects p {where})"
+        )
+    else:
+        params = []
+        excluded = "SELECT ''"
+        if not filters.get("include_archived"):
+            excluded += " UNION ALL SELECT project_id FROM {t}projects WHERE status = 'Archived'"
+        source = f"""
+            SELECT {keys}, baseline_tco2e, project_tco2e, tco2e, n_records FROM {{t}}emission_monthly_totals
+            UNION ALL
+            SELECT {keys}, -baseline_tco2e, -project_tco2e, -tco2e, -n_records
+            FROM {{t}}emission_monthly
+            WHERE project_id IN ({excluded})
+        """
+    return _run(
+        f"""
+        SELECT {keys}, {sums}
+        FROM ({source}) s
+        GROUP BY {keys}
+        HAVING SUM(n_records) > 0
+        ORDER BY {keys}
+        """,
+        tuple(params),
+    )
+
+
+def project_league(filters: Optional[Dict[str, Any]] = None, *, limit: int = 100) -> pd.DataFrame:
+    """Projects ranked by credits issued, with sold / remaining / revenue."""
+    where, params = _project_filter(filters)
+    return _run(
+        f"""
+        SELECT p.project_code, p.project_name, p.sector, p.country, p.standard,
+               r.credits_issued, r.credits_sold,
+               r.credits_issued - r.credits_sold AS remaining,
+               r.revenue
+        FROM {{t}}credit_rollup_totals r JOIN {{t}}projects p ON p.project_id = r.project_id
+        {where}
+        ORDER BY r.credits_issued DESC
+        LIMIT ?
+        """,
+        tuple(params) + (int(limit),),
+    )
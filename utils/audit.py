@@ -0,0 +1,208 @@
+"""
+utils/audit.py
+
+Audit trail writer for the registry.
+
+Key guarantees:
+- Entries are written by utils/uow.py in the same transaction as the change they
+  describe (make_row() + INSERT_SQL), so they never pay a commit of their own.
+- Reading is keyset-paginated on (timestamp, audit_id): page N costs the same as page 1.
+- search_audit() ranks payload matches through the FTS5 index (bm25 + snippets).
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.db import db_query
+
+
+INSERT_SQL = """
+    INSERT INTO audit_logs (audit_id, timestamp, actor, action, entity_type, entity_id, project_id, before_json, after_json, meta_json)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+AuditRow = Tuple[str, str, str, str, str, Optional[str], Optional[str], Optional[str], Optional[str], Optional[str]]
+
+
+def now_iso() -> str:
+    return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+
+
+def _dumps(obj: Optional[Dict[str, Any]]) -> Optional[str]:
+    # default=str: before/after images often come from DataFrame rows (numpy scalars, Timestamps).
+    return json.dumps(obj, ensure_ascii=False, default=str) if obj else None
+
+
+def make_row(
+    action: str,
+    entity_type: str,
+    entity_id: Optional[str] = None,
+    project_id: Optional[str] = None,
+    before: Optional[Dict[str, Any]] = None,
+    after: Optional[Dict[str, Any]] = None,
+    meta: Optional[Dict[str, Any]] = None,
+    *,
+    actor: str = "unknown",
+) -> AuditRow:
+    """Build one audit_logs row (id + timestamp are fixed at call time, not commit time)."""
+    return (
+        str(uuid.uuid4()),
+        now_iso(),
+        actor,
+        action,
+        entity_type,
+        entity_id,
+        project_id,
+        _dumps(before),
+        _dumps(after),
+        _dumps(meta),
+    )
+
+
+# ------------------------------------------------------------
+# Reading: keyset pagination + server-side filters
+# ------------------------------------------------------------
+LIST_COLUMNS = "audit_id, timestamp, actor, action, entity_type, entity_id, project_id"
+
+AuditKey = Tuple[str, str]  # (timestamp, audit_id)
+
+FILTER_COLUMNS = ("project_id", "actor", "action", "entity_type", "entity_id")
+
+
+def audit_page(
+    filters: Optional[Dict[str, Any]] = None,
+    *,
+    older_than: Optional[AuditKey] = None,
+    newer_than: Optional[AuditKey] = None,
+    page_size: int = 100,
+) -> Tuple[pd.DataFrame, bool]:
+    """One page of audit rows, newest first.
+
+    filters: equality on any of FILTER_COLUMNS, plus `since` / `until` ISO timestamps (inclusive).
+    older_than / newer_than: the (timestamp, audit_id) key of the last / first row of the page
+    you are coming from. Returns (page, more) where `more` says another page exists in that direction.
+    """
+    filters = filters or {}
+    where: List[str] = []
+    params: List[Any] = []
+    for col in FILTER_COLUMNS:
+        if filters.get(col):
+            where.append(f"{col} = ?")
+            params.append(filters[col])
+    if filters.get("since"):
+        where.append("timestamp >= ?")
+        params.append(filters["since"])
+    if filters.get("until"):
+        where.append("timestamp <= ?")
+        params.append(filters["until"])
+
+    order = "DESC"
+    if older_than:
+        where.append("(timestamp, audit_id) < (?, ?)")
+        params.extend(older_than)
+    elif newer_than:
+        where.append("(timestamp, audit_id) > (?, ?)")
+        params.extend(newer_than)
+        order = "ASC"  # walk towards newer rows, then flip back to newest-first below
+
+    query = f"SELECT {LIST_COLUMNS} FROM audit_logs"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY timestamp {order}, audit_id {order} LIMIT ?"
+    df = db_query(query, tuple(params) + (int(page_size) + 1,), table="audit_logs")
+
+    more = len(df) > page_size
+    df = df.iloc[:page_size]
+    if order == "ASC":
+        df = df.iloc[::-1]
+    return df.reset_index(drop=True), more
+
+
+def page_keys(df: pd.DataFrame) -> Tuple[Optional[AuditKey], Optional[AuditKey]]:
+    """(first, last) keyset keys of a page, for the newer / older navigation."""
+    if df.empty:
+        return None, None
+    first, last = df.iloc[0], df.iloc[-1]
+    return (first["timestamp"], first["audit_id"]), (last["timestamp"], last["audit_id"])
+
+
+def get_entry(audit_id: str) -> Optional[Dict[str, Any]]:
+    df = db_query("SELECT * FROM audit_logs WHERE audit_id=?", (audit_id,), table="audit_logs")
+    return None if df.empty else df.iloc[0].to_dict()
+
+
+# ------------------------------------------------------------
+# Full-text search over before/after/meta JSON
+# ------------------------------------------------------------
+def fts_available() -> bool:
+    df = db_query("SELECT name FROM sqlite_master WHERE type='table' AND name='audit_fts'")
+    return not df.empty
+
+
+def fts_query(text: str) -> Optional[str]:
+    """User text -> FTS5 MATCH expression: every term must match; a trailing * keeps prefix search.
+
+    Terms are quoted, so serials and ids containing '-' or ':' are matched literally.
+    """
+    terms = []
+    for raw in text.split():
+        prefix = raw.endswith("*")
+        term = raw.rstrip("*").replace('"', "")
+        if term:
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(terms) or None
+
+
+def search_audit(text: str, filters: Optional[Dict[str, Any]] = None, *, limit: int = 100) -> pd.DataFrame:
+    """Best-ranked audit entries whose payloads match `text` (filters as in audit_page)."""
+    match = fts_query(text)
+    if not match:
+        return pd.DataFrame()
+    filters = filters or {}
+    where: List[str] = []
+    params: List[Any] = []
+    for col in FILTER_COLUMNS:
+        if filters.get(col):
+            where.append(f"a.{col} = ?")
+            params.append(filters[col])
+    if filters.get("since"):
+        where.append("a.timestamp >= ?")
+        params.append(filters["since"])
+    if filters.get("until"):
+        where.append("a.timestamp <= ?")
+        params.append(filters["until"])
+    extra = "".join(f" AND {w}" for w in where)
+    cols = ", ".join(f"a.{c.strip()}" for c in LIST_COLUMNS.split(","))
+
+    if fts_available():
+        return db_query(
+            f"""
+            SELECT {cols},
+                   snippet(audit_fts, -1, '«', '»', ' … ', 12) AS snippet,
+                   bm25(audit_fts) AS rank
+            FROM audit_fts JOIN audit_logs a ON a.rowid = audit_fts.rowid
+            WHERE audit_fts MATCH ?{extra}
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (match, *params, int(limit)),
+        )
+
+    # No FTS5 in this SQLite build: unranked substring scan (slow on big tables, but correct).
+    like = f"%{text.strip()}%"
+    return db_query(
+        f"""
+        SELECT {cols}, COALESCE(a.after_json, a.before_json, a.meta_json) AS snippet
+        FROM audit_logs a
+        WHERE (a.before_json LIKE ? OR a.after_json LIKE ? OR a.meta_json LIKE ?){extra}
+        ORDER BY a.timestamp DESC, a.audit_id DESC
+        LIMIT ?
+        """,
+        (like, like, like, *params, int(limit)),
+    )
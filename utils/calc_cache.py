@@ -0,0 +1,324 @@
+"""
+utils/calc_cache.py
+
+Content-addressed cache for calculation results, shared by every session in the process.
+
+Key guarantees:
+- Keys are SHA-256 of a canonical JSON form of (namespace, input record): dict keys sorted,
+  dataclasses as dicts, every number as a float (7 and 7.0 key alike, -0.0 as 0.0), NumPy arrays,
+  DataFrames and bytes by dtype / shape / content hash. Equal inputs share a key however they
+  were built; CACHE_VERSION is part of every key (bump it when a cached formula changes).
+- Memory tier: one LRU bounded in entries and approximate bytes, behind a lock. Concurrent
+  requests for the same key compute once; the others wait for that result.
+- Disk tier (optional: CARBON_REGISTRY_CALC_CACHE_DISK=1 or configure(disk=True)): pickled results
+  in the calc_cache table, capped per entry and in rows (oldest first out). A disk hit is promoted
+  to memory; a disk failure is a miss, never a failed calculation.
+- Hits (memory / disk) and misses are counted per namespace; stats() exposes them.
+- Callers get a deep copy unless they pass shared=True (read-only results, e.g. sweep arrays).
+"""
+
+from __future__ import annotations
+
+import copy
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from utils.audit import now_iso
+from utils.db import db_query, get_reader, writer
+
+
+T = TypeVar("T")
+
+CACHE_VERSION = 1
+MAX_ENTRIES = 512
+MAX_BYTES = 256 * 1024 * 1024
+MAX_DISK_ENTRY_BYTES = 4 * 1024 * 1024  # larger results stay memory-only
+MAX_DISK_ROWS = 20_000
+TRIM_EVERY = 256  # disk writes between row-cap checks
+
+_DISK_ERRORS = (sqlite3.Error, pickle.PickleError, AttributeError, EOFError, ImportError, TypeError)
+
+
+# ------------------------------------------------------------
+# Canonical keys
+# ------------------------------------------------------------
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _normal(value: Any) -> Any:
+    """JSON-ready canonical form of an input record."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)) and abs(int(value)) > 2**53:
+        return int(value)  # not exact as a float
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        f = float(value)
+        if f != f:
+            return "NaN"
+        if f in (float("inf"), float("-inf")):
+            return "Infinity" if f > 0 else "-Infinity"
+        return f + 0.0  # -0.0 -> 0.0
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {"__type__": type(value).__qualname__, **{f.name: _normal(getattr(value, f.name)) for f in dataclasses.fields(value)}}
+    if isinstance(value, dict):
+        return {str(k): _normal(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normal(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normal(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"__bytes__": _digest(bytes(value))}
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "biuf":
+            data = np.ascontiguousarray(value, dtype=np.float64) + 0.0
+            return {"__array__": [list(value.shape), _digest(data.tobytes())]}
+        return {"__array__": [list(value.shape), _normal(value.tolist())]}
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        hashed = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        return {
+            "__frame__": [
+                [str(c) for c in frame.columns],
+                [str(t) for t in frame.dtypes],
+                _digest(hashed.tobytes()),
+            ]
+        }
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    raise TypeError(f"Cannot key a calculation cache on {type(value).__name__}")
+
+
+def cache_key(namespace: str, record: Any) -> str:
+    """SHA-256 hex of the canonical (version, namespace, record)."""
+    payload = json.dumps([CACHE_VERSION, namespace, _normal(record)], sort_keys=True, separators=(",", ":"))
+    return _digest(payload.encode("utf-8"))
+
+
+def _size(value: Any) -> int:
+    """Approximate bytes held by a result (arrays and frames dominate)."""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=False)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, dict):
+        return 64 + sum(_size(k) + _size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return 56 + sum(_size(v) for v in value)
+    if isinstance(value, (str, bytes)):
+        return 49 + len(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return 64 + sum(_size(getattr(value, f.name)) for f in dataclasses.fields(value))
+    return 32
+
+
+# ------------------------------------------------------------
+# Cache
+# ------------------------------------------------------------
+class CalcCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, disk: bool = False) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Any, int, str]]" = OrderedDict()  # key -> (value, bytes, namespace)
+        self._bytes = 0
+        self._inflight: Dict[str, threading.Event] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._evictions = 0
+        self._disk_writes = 0
+
+    def _count(self, namespace: str, what: str) -> None:
+        ns = self._counts.setdefault(namespace, {"hits": 0, "disk_hits": 0, "misses": 0})
+        ns[what] += 1
+
+    def _put(self, key: str, value: Any, namespace: str) -> None:
+        size = _size(value)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, namespace)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _key, (_value, dropped, _ns) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                self._evictions += 1
+
+    # -- disk tier (calc_cache table, migration 10) --
+    def _disk_get(self, key: str) -> Tuple[bool, Any]:
+        try:
+            row = get_reader().execute("SELECT value FROM calc_cache WHERE cache_key = ?", (key,)).fetchone()
+            return (True, pickle.loads(row[0])) if row else (False, None)
+        except _DISK_ERRORS:
+            return False, None
+
+    def _disk_put(self, key: str, value: Any, namespace: str) -> None:
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(blob) > MAX_DISK_ENTRY_BYTES:
+                return
+            with writer() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO calc_cache (cache_key, namespace, value, n_bytes, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, sqlite3.Binary(blob), len(blob), now_iso()),
+                )
+                self._disk_writes += 1
+                if self._disk_writes % TRIM_EVERY == 0:
+                    conn.execute(
+                        """
+                        DELETE FROM calc_cache WHERE cache_key IN (
+                            SELECT cache_key FROM calc_cache ORDER BY created_at
+                            LIMIT max((SELECT COUNT(*) FROM calc_cache) - ?, 0)
+                        )
+                        """,
+                        (MAX_DISK_ROWS,),
+                    )
+        except _DISK_ERRORS:
+            pass
+
+    def get_or_compute(
+        self, namespace: str, record: Any, compute: Callable[[], T], *, disk: Optional[bool] = None, shared: bool = False
+    ) -> T:
+        """Cached `compute()` for `record`; `disk` overrides the cache-wide disk setting for this call."""
+        key = cache_key(namespace, record)
+        use_disk = self.disk if disk is None else disk
+        while True:
+            with self._lock:
+                hit = self._entries.get(key)
+                if hit is not None:
+                    self._entries.move_to_end(key)
+                    self._count(namespace, "hits")
+                    value = hit[0]
+                    break
+                event = self._inflight.get(key)
+                owner = event is None
+                if owner:
+                    event = self._inflight[key] = threading.Event()
+            if not owner:
+                event.wait()
+                continue  # the owner stored the result (or failed, and this caller computes)
+            try:
+                found, value = self._disk_get(key) if use_disk else (False, None)
+                with self._lock:
+                    self._count(namespace, "disk_hits" if found else "misses")
+                if not found:
+                    value = compute()
+                    if use_disk:
+                        self._disk_put(key, value, namespace)
+                self._put(key, value, namespace)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key).set()
+            break
+        return value if shared else copy.deepcopy(value)
+
+    def clear(self, namespace: Optional[str] = None, *, disk: bool = True) -> None:
+        """Drop cached results (one namespace or all) from memory and, by default, disk."""
+        with self._lock:
+            for key in [k for k, (_v, _s, ns) in self._entries.items() if namespace is None or ns == namespace]:
+                self._bytes -= self._entries.pop(key)[1]
+        if disk:
+            try:
+                with writer() as conn:
+                    if namespace is None:
+                        conn.execute("DELETE FROM calc_cache")
+                    else:
+                        conn.execute("DELETE FROM calc_cache WHERE namespace = ?", (namespace,))
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit / miss counters (total and per namespace) plus current size."""
+        with self._lock:
+            namespaces = {ns: dict(c) for ns, c in sorted(self._counts.items())}
+            entries, used = len(self._entries), self._bytes
+        totals = {k: sum(c[k] for c in namespaces.values()) for k in ("hits", "disk_hits", "misses")}
+        requests = sum(totals.values())
+        return {
+            **totals,
+            "hit_rate": (totals["hits"] + totals["disk_hits"]) / requests if requests else None,
+            "entries": entries,
+            "bytes": used,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+            "disk": self.disk,
+            "namespaces": namespaces,
+        }
+
+
+_cache = CalcCache(disk=os.environ.get("CARBON_REGISTRY_CALC_CACHE_DISK", "") == "1")
+
+
+def configure(*, max_entries: Optional[int] = None, max_bytes: Optional[int] = None, disk: Optional[bool] = None) -> None:
+    if max_entries is not None:
+        _cache.max_entries = int(max_entries)
+    if max_bytes is not None:
+        _cache.max_bytes = int(max_bytes)
+    if disk is not None:
+        _cache.disk = bool(disk)
+
+
+def get_or_compute(
+    namespace: str, record: Any, compute: Callable[[], T], *, disk: Optional[bool] = None, shared: bool = False
+) -> T:
+    """Process-wide cached `compute()`, keyed by `record` within `namespace`."""
+    return _cache.get_or_compute(namespace, record, compute, disk=disk, shared=shared)
+
+
+def memoize(namespace: str, *, disk: Optional[bool] = None, shared: bool = False) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator: cache a pure function on its (args, kwargs)."""
+    def wrap(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def cached(*args: Any, **kwargs: Any) -> T:
+            return _cache.get_or_compute(namespace, [args, kwargs], lambda: fn(*args, **kwargs), disk=disk, shared=shared)
+
+        return cached
+
+    return wrap
+
+
+def clear(namespace: Optional[str] = None, *, disk: bool = True) -> None:
+    _cache.clear(namespace, disk=disk)
+
+
+def stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from utils.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Calculation cache: disk-tier summary or clear.")
+    parser.add_argument("cmd", choices=["stats", "clear"])
+    parser.add_argument("--namespace", default=None)
+    args = parser.parse_args()
+
+    ensure_schema()
+    if args.cmd == "clear":
+        clear(args.namespace)
+    print(
+        db_query(
+            "SELECT namespace, COUNT(*) AS entries, SUM(n_bytes) AS bytes, MAX(created_at) AS newest FROM calc_cache GROUP BY namespace"
+        ).to_string(index=False)
+    )
@@ -0,0 +1,246 @@
+"""
+utils/db.py
+
+Shared SQLite data-access layer for the Carbon Registry Streamlit app.
+
+Key guarantees:
+- One absolute DB path (data/carbon_registry.db under the project root), regardless of CWD.
+- WAL journaling + busy timeout, so readers never block the writer (and vice versa).
+- Per-thread reader connections: every Streamlit session thread reads on its own connection.
+- One dedicated writer connection, serialized by a process-wide lock.
+- Foreign keys are enforced on every connection (the old per-page connections never turned
+  them on; schema migration 13 repairs the orphans that allowed).
+- Results are built column-by-column straight from the cursor (no per-row dicts),
+  with explicit dtypes from utils/tables.py; db_query_iter() streams fixed-size chunks.
+- Optional Arrow output (db_query_arrow / db_query_batches) when pyarrow is installed;
+  stray text in INTEGER/REAL columns becomes null instead of breaking the schema.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.tables import COLUMN_DTYPES, table_dtypes
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: only the Arrow/Parquet paths need it
+    pa = None
+
+
+DB_PATH = Path(__file__).resolve().parents[1] / "data" / "carbon_registry.db"
+
+BUSY_TIMEOUT_MS = 5000
+CHUNK_ROWS = 50_000
+
+_local = threading.local()
+_writer_lock = threading.RLock()
+_writer: sqlite3.Connection | None = None
+
+
+def _connect(*, read_only: bool) -> sqlite3.Connection:
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # isolation_level=None: we issue BEGIN/COMMIT ourselves (see `writer()`).
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000.0,
+        isolation_level=None,
+        check_same_thread=read_only,
+    )
+    # Readers return plain tuples (fast columnar path); the writer keeps sqlite3.Row for
+    # dict-style access in units of work.
+    conn.row_factory = None if read_only else sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+    conn.execute("PRAGMA foreign_keys = ON;")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON;")
+    else:
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+    return conn
+
+
+def get_writer() -> sqlite3.Connection:
+    """The single process-wide writer connection (created on first use).
+
+    Callers must hold the writer lock while using it; prefer `writer()` or `db_exec()`.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _connect(read_only=False)
+        return _writer
+
+
+def get_reader() -> sqlite3.Connection:
+    """Reader connection owned by the calling thread."""
+    conn = getattr(_local, "reader", None)
+    if conn is None:
+        get_writer()  # make sure the DB file exists and WAL is enabled first
+        conn = _connect(read_only=True)
+        _local.reader = conn
+    return conn
+
+
+@contextmanager
+def writer() -> Iterator[sqlite3.Connection]:
+    """Hold the writer for one transaction: BEGIN IMMEDIATE … COMMIT (ROLLBACK on error)."""
+    with _writer_lock:
+        conn = get_writer()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+        conn.execute("COMMIT;")
+
+
+def db_exec(query: str, params: Tuple = ()) -> None:
+    with writer() as conn:
+        conn.execute(query, params)
+
+
+# ------------------------------------------------------------
+# Columnar result materialisation
+# ------------------------------------------------------------
+def _dtypes_for(table: Optional[str]) -> Dict[str, Any]:
+    return table_dtypes(table) if table else COLUMN_DTYPES
+
+
+def _column(values: np.ndarray, dtype: Any) -> Any:
+    """Type one object-array result column; unknown or untypeable columns are left to pandas."""
+    try:
+        if dtype is object:
+            return values
+        if dtype is np.float64:
+            return values.astype(np.float64)  # None -> NaN
+        if dtype is np.int64:
+            try:
+                return values.astype(np.int64)
+            except TypeError:  # NULLs present -> float64 with NaN
+                return values.astype(np.float64)
+    except (TypeError, ValueError):
+        pass  # SQLite is dynamically typed: e.g. '' stored in a REAL column
+    return values.tolist()
+
+
+def _frame(names: List[str], rows: List[Tuple], dtypes: Dict[str, Any]) -> pd.DataFrame:
+    # One 2-D object block filled straight from the row tuples, then sliced per column.
+    block = np.empty((len(rows), len(names)), dtype=object)
+    if rows:
+        block[:] = rows
+    return pd.DataFrame(
+        {name: _column(block[:, i], dtypes.get(name)) for i, name in enumerate(names)},
+        columns=names,
+    )
+
+
+def _names(cur: sqlite3.Cursor) -> List[str]:
+    return [d[0] for d in cur.description] if cur.description else []
+
+
+def db_query(query: str, params: Tuple = (), *, table: Optional[str] = None) -> pd.DataFrame:
+    """Run a SELECT on this thread's reader and return a DataFrame.
+
+    `table` picks that table's dtypes; by default the merged column map is used.
+    """
+    cur = get_reader().execute(query, params)
+    return _frame(_names(cur), cur.fetchall(), _dtypes_for(table))
+
+
+def db_query_iter(
+    query: str,
+    params: Tuple = (),
+    *,
+    chunk_rows: int = CHUNK_ROWS,
+    table: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield the result in DataFrames of at most `chunk_rows` rows (at least one, possibly empty)."""
+    cur = get_reader().execute(query, params)
+    names, dtypes = _names(cur), _dtypes_for(table)
+    try:
+        rows = cur.fetchmany(chunk_rows)
+        yield _frame(names, rows, dtypes)
+        while len(rows) == chunk_rows:
+            rows = cur.fetchmany(chunk_rows)
+            if rows:
+                yield _frame(names, rows, dtypes)
+    finally:
+        cur.close()
+
+
+# ------------------------------------------------------------
+# Arrow (optional)
+# ------------------------------------------------------------
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed (pip install pyarrow) — Arrow/Parquet output unavailable.")
+
+
+def arrow_schema(names: List[str], table: Optional[str] = None) -> "pa.Schema":
+    """Stable Arrow schema for a result: INTEGER -> int64, REAL -> float64, everything else -> string."""
+    _require_pyarrow()
+    dtypes = _dtypes_for(table)
+    kinds = {np.int64: pa.int64(), np.float64: pa.float64()}
+    return pa.schema([pa.field(n, kinds.get(dtypes.get(n), pa.string())) for n in names])
+
+
+def _numeric(value: Any, integer: bool) -> Any:
+    """Coerce one SQLite value to int/float, or None when it cannot be typed (e.g. '' in a REAL column)."""
+    if isinstance(value, int):
+        return value if integer else float(value)
+    if isinstance(value, float):
+        return value if not integer else (int(value) if value.is_integer() else None)
+    return None
+
+
+def _arrow_column(field: "pa.Field", values: Tuple) -> "pa.Array":
+    if pa.types.is_string(field.type):
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        return pa.array(values, type=field.type, from_pandas=True)
+    try:
+        return pa.array(values, type=field.type, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        # SQLite is dynamically typed: null the stray cells rather than fail (or re-type) the column.
+        integer = pa.types.is_integer(field.type)
+        return pa.array([_numeric(v, integer) for v in values], type=field.type, from_pandas=True)
+
+
+def _record_batch(schema: "pa.Schema", rows: List[Tuple]) -> "pa.RecordBatch":
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = [_arrow_column(field, values) for field, values in zip(schema, columns)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def db_query_batches(
+    query: str,
+    params: Tuple = (),
+    *,
+    chunk_rows: int = CHUNK_ROWS,
+    table: Optional[str] = None,
+) -> Iterator["pa.RecordBatch"]:
+    """Yield Arrow record batches of at most `chunk_rows` rows (at least one, possibly empty)."""
+    _require_pyarrow()
+    cur = get_reader().execute(query, params)
+    schema = arrow_schema(_names(cur), table)
+    try:
+        rows = cur.fetchmany(chunk_rows)
+        yield _record_batch(schema, rows)
+        while len(rows) == chunk_rows:
+            rows = cur.fetchmany(chunk_rows)
+            if rows:
+                yield _record_batch(schema, rows)
+    finally:
+        cur.close()
+
+
+def db_query_arrow(query: str, params: Tuple = (), *, table: Optional[str] = None) -> "pa.Table":
+    return pa.Table.from_batches(list(db_query_batches(query, params, table=table)))
@@ -0,0 +1,270 @@
+"""
+utils/export.py
+
+On-demand registry exports.
+
+Key guarantees:
+- Nothing is queried until an export is actually requested.
+- Each table streams from a reader cursor in fixed-size chunks straight into a ZIP entry,
+  so peak memory is one chunk, not the whole table (the ZIP spools to a temp file).
+- Temp ZIPs never outlive their use for long: they are removed at process exit, and every
+  build sweeps carbon_registry_export_* files older than EXPORT_MAX_AGE_S (abandoned sessions).
+- Every ZIP carries manifest.json: scope, schema version, row counts, byte sizes, SHA-256.
+- Columnar formats (Parquet / Arrow IPC, zstd-compressed) use a stable typed schema per
+  table and write one row group / record batch per chunk. They need the optional pyarrow.
+"""
+
+from __future__ import annotations
+
+import atexit
+import csv
+import hashlib
+import io
+import json
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Sequence, Tuple
+
+from utils.db import CHUNK_ROWS, arrow_schema, db_query_batches, get_reader, pa
+from utils.schema import schema_version
+from utils.tables import TABLES
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional: Parquet export only
+    pq = None
+
+
+# name -> (table, ORDER BY)
+EXPORT_TABLES: Dict[str, Tuple[str, str]] = {
+    "projects": ("projects", "updated_at DESC"),
+    "project_foundations": ("project_foundations", "updated_at DESC"),
+    "credits": ("credits", "updated_at DESC"),
+    "sales": ("sales", "updated_at DESC"),
+    "audit": ("audit_logs", "timestamp DESC"),
+    "calc_runs": ("calc_runs", "created_at DESC"),
+    "emissions": ("emissions", "created_at DESC"),
+    "calc_revisions": ("calc_revisions", "created_at DESC"),
+}
+
+# format -> (file extension, needs pyarrow)
+EXPORT_FORMATS: Dict[str, Tuple[str, bool]] = {
+    "csv": ("csv", False),
+    "parquet": ("parquet", True),
+    "arrow": ("arrow", True),
+}
+
+COMPRESSION = "zstd"
+
+
+def columnar_available() -> bool:
+    return pa is not None and pq is not None
+
+
+def export_query(name: str, project_id: Optional[str] = None) -> Tuple[str, Tuple]:
+    """SELECT for one export table, optionally scoped to a single project.
+
+    Columns are listed explicitly (canonical order), so every export of a table has the same layout
+    even when older databases had columns appended by migrations.
+    """
+    table, order_by = EXPORT_TABLES[name]
+    cols = ", ".join(col for col, _decl in TABLES[table][0])
+    if project_id:
+        return f"SELECT {cols} FROM {table} WHERE project_id=? ORDER BY {order_by}", (project_id,)
+    return f"SELECT {cols} FROM {table} ORDER BY {order_by}", ()
+
+
+class _HashingWriter(io.RawIOBase):
+    """Pass-through writer that counts and hashes the bytes of one ZIP entry."""
+
+    def __init__(self, raw: BinaryIO) -> None:
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.n_bytes = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.sha256.update(b)
+        self.n_bytes += len(b)
+        return self.raw.write(b)
+
+
+def _write_csv(raw: BinaryIO, query: str, params: Tuple, chunk_rows: int) -> Dict[str, Any]:
+    sink = _HashingWriter(raw)
+    text = io.TextIOWrapper(io.BufferedWriter(sink), encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    cur = get_reader().execute(query, params)
+    n_rows = 0
+    try:
+        writer.writerow([d[0] for d in cur.description])
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            writer.writerows(rows)
+            n_rows += len(rows)
+    finally:
+        cur.close()
+        text.flush()
+        text.detach()
+    return {"rows": n_rows, "bytes": sink.n_bytes, "sha256": sink.sha256.hexdigest()}
+
+
+def _write_columnar(path: Path, fmt: str, name: str, query: str, params: Tuple, chunk_rows: int) -> int:
+    """Write one table as Parquet or Arrow IPC, one row group / batch per chunk. Returns the row count."""
+    table = EXPORT_TABLES[name][0]
+    schema = arrow_schema([col for col, _decl in TABLES[table][0]], table)
+    n_rows = 0
+    if fmt == "parquet":
+        with pq.ParquetWriter(path, schema, compression=COMPRESSION) as out:
+            for batch in db_query_batches(query, params, chunk_rows=chunk_rows, table=table):
+                if batch.num_rows:
+                    out.write_batch(batch, row_group_size=chunk_rows)
+                n_rows += batch.num_rows
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, schema, options=options) as out:
+            for batch in db_query_batches(query, params, chunk_rows=chunk_rows, table=table):
+                if batch.num_rows:
+                    out.write_batch(batch)
+                n_rows += batch.num_rows
+    return n_rows
+
+
+def _file_stats(path: Path) -> Dict[str, Any]:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    return {"bytes": path.stat().st_size, "sha256": sha.hexdigest()}
+
+
+def write_export_zip(
+    fileobj: BinaryIO,
+    names: Sequence[str],
+    project_id: Optional[str] = None,
+    *,
+    fmt: str = "csv",
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, Any]:
+    """Stream the selected tables (+ manifest.json) into a ZIP written to `fileobj`. Returns the manifest."""
+    ext, needs_arrow = EXPORT_FORMATS[fmt]
+    if needs_arrow and not columnar_available():
+        raise RuntimeError("pyarrow is not installed (pip install pyarrow) — Parquet/Arrow export unavailable.")
+
+    manifest: Dict[str, Any] = {
+        "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
+        "scope": {"project_id": project_id} if project_id else "all",
+        "schema_version": schema_version(),
+        "format": fmt,
+        "files": [],
+    }
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name in names:
+            query, params = export_query(name, project_id)
+            file_name = f"{name}.{ext}"
+            if fmt == "csv":
+                with zf.open(file_name, "w", force_zip64=True) as raw:
+                    stats = _write_csv(raw, query, params, chunk_rows)
+            else:
+                # Columnar files are already compressed: stage on disk, store uncompressed in the ZIP.
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    tmp_path = Path(tmp_dir) / file_name
+                    n_rows = _write_columnar(tmp_path, fmt, name, query, params, chunk_rows)
+                    stats = {"rows": n_rows, **_file_stats(tmp_path)}
+                    zf.write(tmp_path, arcname=file_name, compress_type=zipfile.ZIP_STORED)
+            manifest["files"].append({"name": name, "file": file_name, **stats})
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    return manifest
+
+
+EXPORT_PREFIX = "carbon_registry_export_"
+EXPORT_MAX_AGE_S = 3600
+
+_live_lock = threading.Lock()
+_live: set = set()  # temp ZIPs built by this process
+
+
+def discard_export(path: Any) -> None:
+    """Delete a temp export ZIP (e.g. when the session prepares another one)."""
+    path = Path(path)
+    with _live_lock:
+        _live.discard(path)
+    path.unlink(missing_ok=True)
+
+
+def sweep_exports(max_age_s: float = EXPORT_MAX_AGE_S) -> int:
+    """Delete temp export ZIPs older than `max_age_s` (left by abandoned sessions or crashed processes)."""
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for path in Path(tempfile.gettempdir()).glob(f"{EXPORT_PREFIX}*.zip"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                discard_export(path)
+                removed += 1
+        except OSError:
+            continue  # already gone, or owned by someone else
+    return removed
+
+
+@atexit.register
+def _discard_live_exports() -> None:
+    with _live_lock:
+        paths = list(_live)
+    for path in paths:
+        discard_export(path)
+
+
+def build_export_zip(
+    names: Sequence[str], project_id: Optional[str] = None, *, fmt: str = "csv"
+) -> Tuple[Path, Dict[str, Any]]:
+    """Write the export ZIP to a temp file and return (path, manifest).
+
+    The file is removed by discard_export(), at process exit, or by the next build's sweep once
+    older than EXPORT_MAX_AGE_S.
+    """
+    sweep_exports()
+    tmp = tempfile.NamedTemporaryFile(prefix=EXPORT_PREFIX, suffix=".zip", delete=False)
+    path = Path(tmp.name)
+    with _live_lock:
+        _live.add(path)
+    try:
+        with tmp:
+            manifest = write_export_zip(tmp, names, project_id, fmt=fmt)
+    except BaseException:
+        discard_export(path)
+        raise
+    return path, manifest
+
+
+def export_file_name(project_code: Optional[str] = None, ext: str = "zip") -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    scope = "".join(c if c.isalnum() or c in "-_" else "_" for c in project_code) if project_code else "all"
+    return f"carbon_registry_{scope}_{stamp}.{ext}"
+
+
+if __name__ == "__main__":
+    # Headless export for scheduled jobs, e.g.:  python -m utils.export --format parquet --out exports/
+    import argparse
+
+    from utils.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Export registry tables to a ZIP (CSV, Parquet or Arrow IPC).")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("--project-id", default=None)
+    parser.add_argument("--tables", nargs="*", default=list(EXPORT_TABLES), choices=list(EXPORT_TABLES))
+    parser.add_argument("--out", type=Path, default=Path("."))
+    args = parser.parse_args()
+
+    ensure_schema()
+    args.out.mkdir(parents=True, exist_ok=True)
+    target = args.out / export_file_name(args.project_id, ext="zip")
+    with open(target, "wb") as fh:
+        result = write_export_zip(fh, args.tables, args.project_id, fmt=args.format)
+    print(json.dumps({"path": str(target), **result}, indent=2))
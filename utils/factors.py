@@ -0,0 +1,361 @@
+"""
+utils/factors.py
+
+Versioned emission-factor library (no Streamlit here).
+
+Key guarantees:
+- Factors live in `emission_factors`, grouped into datasets (`ef_datasets`: name + version).
+  Lookups use the composite index on (category, unit, geography, year, version, basis).
+- factor_id is derived from dataset name, version and key (uuid5), so reloading a dataset
+  version keeps the ids that saved calculations reference.
+- A dataset loads in one unit of work: one executemany plus one IMPORT audit row. Replacing a
+  version swaps all of its factors atomically.
+- The library is cached per process as one DataFrame indexed by factor_id and reloaded only when
+  the dataset catalogue changes, so resolving thousands of line factors is one indexed join.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.audit import now_iso
+from utils.db import db_query, get_reader
+from utils.importers import ERROR_COLUMNS
+from utils.units import UnitError, conversion_factor, is_known, parse_unit
+from utils.uow import unit_of_work
+
+
+EF_UNIT = "kgCO2e"  # factor_unit of factors usable as kgCO2e per activity unit
+FACTOR_KEY = ("category", "unit", "geography", "year", "version", "basis")
+FACTOR_FILE_COLUMNS = ["category", "unit", "geography", "year", "basis", "factor_value", "factor_unit", "source", "notes"]
+FACTOR_REQUIRED_COLUMNS = ("category", "unit", "factor_value")
+
+_NAMESPACE = uuid.UUID("5b0f3c1e-8d7a-4f57-9b1e-6c2f4a9d0e11")
+
+# The Methodologies page defaults (demo placeholders), shipped as a dataset by migration 8.
+DEMO_DATASET = {"name": "demo-defaults", "version": "2024.1", "source": "Methodology Tools demo placeholders (not for crediting)"}
+DEMO_FACTORS: List[Dict[str, Any]] = [
+    *({"category": f, "unit": "L", "basis": "tank-to-wheel", "factor_value": v} for f, v in
+      (("Petrol", 2.31), ("Diesel", 2.68), ("LPG", 1.51))),
+    *({"category": f, "unit": "L", "basis": "well-to-tank", "factor_value": v} for f, v in
+      (("Petrol", 0.52), ("Diesel", 0.58), ("LPG", 0.21))),
+    *({"category": f, "unit": "L", "basis": "net calorific value", "factor_value": v, "factor_unit": "MJ"} for f, v in
+      (("Petrol", 34.2), ("Diesel", 38.6), ("LPG", 26.8))),
+]
+
+
+# ------------------------------------------------------------
+# Ids + SQL
+# ------------------------------------------------------------
+def dataset_id(name: str, version: str) -> str:
+    return str(uuid.uuid5(_NAMESPACE, json.dumps(["dataset", name, version])))
+
+
+def factor_id(name: str, version: str, rec: Dict[str, Any]) -> str:
+    key = [rec["category"], rec["unit"], rec.get("geography") or "", int(rec.get("year") or 0), rec.get("basis") or ""]
+    return str(uuid.uuid5(_NAMESPACE, json.dumps(["factor", name, version, *key])))
+
+
+DATASET_UPSERT_SQL = """
+    INSERT INTO ef_datasets (dataset_id, name, version, source, n_factors, loaded_by, loaded_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(dataset_id) DO UPDATE SET
+        source = excluded.source, n_factors = excluded.n_factors,
+        loaded_by = excluded.loaded_by, loaded_at = excluded.loaded_at
+"""
+
+FACTOR_INSERT_SQL = """
+    INSERT INTO emission_factors (
+        factor_id, dataset_id, category, unit, geography, year, version, basis,
+        factor_value, factor_unit, source, notes
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _factor_params(name: str, version: str, records: List[Dict[str, Any]]) -> List[Tuple]:
+    did = dataset_id(name, version)
+    return [
+        (
+            factor_id(name, version, r), did, r["category"], r["unit"], r.get("geography") or "",
+            int(r.get("year") or 0), version, r.get("basis") or "", float(r["factor_value"]),
+            r.get("factor_unit") or EF_UNIT, r.get("source"), r.get("notes"),
+        )
+        for r in records
+    ]
+
+
+# ------------------------------------------------------------
+# Validation + bulk load
+# ------------------------------------------------------------
+def validate_factors(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """Check a factor file (headers normalised, string cells). Returns (clean, errors, warnings)."""
+    warnings: List[str] = []
+    unknown = [c for c in df.columns if c not in FACTOR_FILE_COLUMNS]
+    if unknown:
+        warnings.append(f"Ignored unknown column(s): {', '.join(unknown)}")
+    missing = [c for c in FACTOR_REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        errors = pd.DataFrame(
+            [{"row": 1, "column": c, "value": "", "error": "required column missing"} for c in missing],
+            columns=ERROR_COLUMNS,
+        )
+        return pd.DataFrame(columns=["row", *FACTOR_FILE_COLUMNS]), errors, warnings
+
+    data = df.reindex(columns=FACTOR_FILE_COLUMNS, fill_value="").fillna("")
+    data.insert(0, "row", range(2, len(data) + 2))
+    problems: List[pd.DataFrame] = []
+
+    def flag(mask: pd.Series, column: str, error: str) -> None:
+        if mask.any():
+            problems.append(
+                pd.DataFrame({"row": data.loc[mask, "row"], "column": column, "value": data.loc[mask, column], "error": error})
+            )
+
+    for col in FACTOR_REQUIRED_COLUMNS:
+        flag(data[col] == "", col, "required")
+    value = pd.to_numeric(data["factor_value"].where(data["factor_value"] != ""), errors="coerce")
+    flag((data["factor_value"] != "") & (value.isna() | (value < 0)), "factor_value", "must be a number ≥ 0")
+    year = pd.to_numeric(data["year"].where(data["year"] != ""), errors="coerce")
+    flag((data["year"] != "") & ~(year.between(1900, 2100) & (year % 1 == 0)), "year", "must be a year 1900–2100")
+    key = data[["category", "unit", "geography", "year", "basis"]]
+    flag(key.duplicated(keep=False) & (data["category"] != ""), "category", "duplicate key in file")
+
+    units = data["unit"][data["unit"] != ""].unique()
+    opaque = [u for u in units if not is_known(u)]
+    if opaque:
+        warnings.append(f"Unit(s) not in the unit registry (matched literally, never converted): {', '.join(opaque[:10])}")
+
+    errors = (
+        pd.concat(problems, ignore_index=True).sort_values(["row", "column"], kind="stable").reset_index(drop=True)
+        if problems
+        else pd.DataFrame(columns=ERROR_COLUMNS)
+    )
+    clean = data[~data["row"].isin(errors["row"])].copy()
+    clean["factor_value"] = value.loc[clean.index]
+    clean["year"] = year.loc[clean.index].fillna(0).astype(int)
+    clean["factor_unit"] = clean["factor_unit"].replace("", EF_UNIT)
+    clean[["source", "notes"]] = clean[["source", "notes"]].replace("", None)
+    return clean.reset_index(drop=True), errors, warnings
+
+
+def load_dataset(
+    clean: pd.DataFrame, *, name: str, version: str, source: Optional[str], actor: str, replace: bool = False
+) -> Dict[str, Any]:
+    """Load validated factors as dataset (name, version) in one transaction."""
+    name, version = name.strip(), version.strip()
+    if not name or not version:
+        raise ValueError("Dataset name and version are required.")
+    did = dataset_id(name, version)
+    params = _factor_params(name, version, clean.to_dict("records"))
+    with unit_of_work(actor=actor) as uow:
+        existing = uow.fetch_one("SELECT n_factors FROM ef_datasets WHERE dataset_id = ?", (did,))
+        if existing and not replace:
+            raise ValueError(f"Dataset {name} {version} is already loaded; load a new version or replace it.")
+        if existing:
+            uow.execute("DELETE FROM emission_factors WHERE dataset_id = ?", (did,))
+        uow.execute(DATASET_UPSERT_SQL, (did, name, version, source, len(params), actor, now_iso()))
+        uow.executemany(FACTOR_INSERT_SQL, params)
+        uow.audit(
+            action="IMPORT",
+            entity_type="ef_dataset",
+            entity_id=did,
+            before={"n_factors": existing["n_factors"]} if existing else None,
+            after={"name": name, "version": version, "n_factors": len(params)},
+            meta={"source": source, "replaced": bool(existing)},
+        )
+    invalidate_cache()
+    return {"dataset_id": did, "name": name, "version": version, "factors": len(params), "replaced": bool(existing)}
+
+
+# ------------------------------------------------------------
+# Cached library
+# ------------------------------------------------------------
+_cache_lock = threading.Lock()
+_cache: Dict[str, Any] = {"stamp": None, "frame": None}
+
+
+def _catalog_stamp() -> Tuple:
+    return tuple(get_reader().execute("SELECT COUNT(*), MAX(loaded_at), SUM(n_factors) FROM ef_datasets").fetchone())
+
+
+def invalidate_cache() -> None:
+    with _cache_lock:
+        _cache["stamp"] = None
+
+
+def library() -> pd.DataFrame:
+    """All factors (with dataset name), indexed by factor_id; reloaded when a dataset changes."""
+    stamp = _catalog_stamp()
+    with _cache_lock:
+        if _cache["stamp"] != stamp or _cache["frame"] is None:
+            frame = db_query(
+                """
+                SELECT f.*, d.name AS dataset_name
+                FROM emission_factors f JOIN ef_datasets d ON d.dataset_id = f.dataset_id
+                ORDER BY f.category, f.unit, f.geography, f.year DESC, f.version DESC, f.basis
+                """
+            )
+            _cache["frame"] = frame.set_index("factor_id", drop=False)
+            _cache["stamp"] = stamp
+        return _cache["frame"]
+
+
+def datasets() -> pd.DataFrame:
+    return db_query("SELECT * FROM ef_datasets ORDER BY name, version DESC")
+
+
+def _same_dimension(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    try:
+        return parse_unit(a).dims == parse_unit(b).dims
+    except UnitError:
+        return False
+
+
+def find_factors(
+    *,
+    activity_unit: Optional[str] = None,
+    factor_unit: Optional[str] = EF_UNIT,
+    **key: Any,
+) -> pd.DataFrame:
+    """Factors matching the given key columns (exact), optionally convertible to `activity_unit`."""
+    df = library()
+    for col, value in key.items():
+        if col not in FACTOR_KEY and col != "dataset_name":
+            raise KeyError(f"Unknown factor key column: {col}")
+        if value is not None:
+            df = df[df[col] == value]
+    if factor_unit is not None:
+        df = df[df["factor_unit"] == factor_unit]
+    if activity_unit is not None and not df.empty:
+        ok = {u: _same_dimension(u, activity_unit) for u in df["unit"].unique()}
+        df = df[df["unit"].map(ok)]
+    return df
+
+
+def lookup(
+    category: str, unit: str, *, geography: str = "", basis: str = "", year: Optional[int] = None,
+    version: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """Best kgCO2e factor for one key straight from SQL (composite-index seek): newest year/version
+    unless pinned."""
+    sql = """
+        SELECT f.*, d.name AS dataset_name
+        FROM emission_factors f JOIN ef_datasets d ON d.dataset_id = f.dataset_id
+        WHERE f.category = ? AND f.unit = ? AND f.geography = ? AND f.basis = ? AND f.factor_unit = ?
+    """
+    params: List[Any] = [category, unit, geography, basis, EF_UNIT]
+    if year is not None:
+        sql += " AND f.year = ?"
+        params.append(int(year))
+    if version is not None:
+        sql += " AND f.version = ?"
+        params.append(version)
+    df = db_query(sql + " ORDER BY f.year DESC, f.version DESC LIMIT 1", tuple(params))
+    return df.iloc[0].to_dict() if not df.empty else None
+
+
+def get_factor(fid: str) -> Optional[Dict[str, Any]]:
+    df = library()
+    return df.loc[fid].to_dict() if fid in df.index else None
+
+
+def factor_label(rec: Dict[str, Any]) -> str:
+    parts = [rec["category"], f"{rec['factor_value']:g} {rec['factor_unit']}/{rec['unit']}"]
+    parts += [p for p in (rec.get("geography"), str(rec["year"]) if rec.get("year") else None, rec.get("basis")) if p]
+    return " · ".join(parts) + f" [{rec['dataset_name']} {rec['version']}]"
+
+
+def factor_reference(rec: Dict[str, Any]) -> str:
+    """Provenance string for calc_runs.factor_source."""
+    ref = f"{rec['dataset_name']} {rec['version']} — {rec['category']}"
+    extra = [p for p in (rec.get("geography"), str(rec["year"]) if rec.get("year") else None, rec.get("basis")) if p]
+    return ref + (f" ({', '.join(extra)})" if extra else "") + f" [factor_id {rec['factor_id']}]"
+
+
+def value_per(rec: Dict[str, Any], activity_unit: str) -> float:
+    """Factor value expressed per `activity_unit` (e.g. a per-MWh factor used on kWh)."""
+    return float(rec["factor_value"]) * conversion_factor(activity_unit, rec["unit"])
+
+
+def resolve_line_factors(lines: pd.DataFrame, unit: str) -> pd.DataFrame:
+    """Fill blank line EFs from `factor_id` (one indexed join; EFs are per each line's unit).
+
+    An EF typed on the line wins over its factor_id. Raises KeyError for unknown ids and
+    UnitError when a factor's unit does not fit the line's unit.
+    """
+    if "factor_id" not in lines.columns:
+        return lines
+    ids = lines["factor_id"].fillna("").astype(str).str.strip()
+    wanted = (ids != "") & lines["ef_kg_per_unit"].isna()
+    if not wanted.any():
+        return lines
+    lib = library()
+    pos = lib.index.get_indexer(ids[wanted])
+    if (pos < 0).any():
+        missing = sorted(set(ids[wanted][pos < 0]))
+        raise KeyError(f"Unknown factor_id(s): {', '.join(missing[:5])}")
+    if (lib["factor_unit"].to_numpy()[pos] != EF_UNIT).any():
+        raise UnitError(f"Only {EF_UNIT} factors can be used as emission factors.")
+    line_units = lines.loc[wanted, "unit"].fillna("").astype(str).replace("", unit).to_numpy()
+    factor_units = lib["unit"].to_numpy()[pos]
+    pair_codes, pairs = pd.factorize(pd.Series(list(zip(line_units, factor_units))))
+    conv = np.array([conversion_factor(a, b) for a, b in pairs], dtype=np.float64)
+    ef = lines["ef_kg_per_unit"].to_numpy(dtype=np.float64).copy()
+    ef[wanted.to_numpy()] = lib["factor_value"].to_numpy(dtype=np.float64)[pos] * conv[pair_codes]
+    return lines.assign(ef_kg_per_unit=ef)
+
+
+def demo_factor_id(category: str, basis: str) -> str:
+    """factor_id of a demo-dataset fuel factor (per litre), e.g. ("Diesel", "tank-to-wheel")."""
+    return factor_id(DEMO_DATASET["name"], DEMO_DATASET["version"], {"category": category, "unit": "L", "basis": basis})
+
+
+def demo_defaults() -> Dict[str, Dict[str, float]]:
+    """{basis: {fuel: value}} for the Methodologies demo (from the library, constants as fallback)."""
+    df = find_factors(dataset_name=DEMO_DATASET["name"], version=DEMO_DATASET["version"], factor_unit=None)
+    records = df.to_dict("records") if not df.empty else DEMO_FACTORS
+    out: Dict[str, Dict[str, float]] = {}
+    for r in records:
+        out.setdefault(r["basis"], {})[r["category"]] = float(r["factor_value"])
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from utils.importers import read_table
+    from utils.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Emission-factor library: load a dataset or list datasets.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    load = sub.add_parser("load")
+    load.add_argument("path")
+    load.add_argument("--name", required=True)
+    load.add_argument("--version", required=True)
+    load.add_argument("--source", default=None)
+    load.add_argument("--replace", action="store_true")
+    load.add_argument("--actor", default="factors-cli")
+    sub.add_parser("list")
+    args = parser.parse_args()
+
+    ensure_schema()
+    if args.cmd == "list":
+        print(datasets().to_string(index=False))
+    else:
+        with open(args.path, "rb") as fh:
+            clean, errors, warnings = validate_factors(read_table(fh, args.path))
+        for w in warnings:
+            print(f"warning: {w}")
+        if not errors.empty:
+            print(errors.to_string(index=False))
+            raise SystemExit(1)
+        print(json.dumps(load_dataset(clean, name=args.name, version=args.version, source=args.source,
+                                      actor=args.actor, replace=args.replace), indent=2))
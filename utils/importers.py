@@ -0,0 +1,183 @@
+"""
+utils/importers.py
+
+Bulk imports into the registry (no Streamlit here).
+
+Key guarantees:
+- Files are validated against the canonical `projects` definition before anything is written;
+  every problem is reported with its file row number, column and value.
+- project_code uniqueness is checked within the file and against the database (one query).
+- An import is one unit of work: a single executemany INSERT, one IMPORT audit entry for the
+  batch plus one CREATE entry per project, all committed together (or not at all).
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import uuid
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.audit import now_iso
+from utils.db import get_reader
+from utils.tables import TABLES
+from utils.uow import unit_of_work
+
+
+PROJECT_STATUSES = ("Active", "Archived")
+
+# Columns a file may supply: everything except the generated id and timestamps.
+PROJECT_IMPORT_COLUMNS: List[str] = [
+    col for col, _decl in TABLES["projects"][0] if col not in ("project_id", "created_at", "updated_at")
+]
+PROJECT_REQUIRED_COLUMNS = ("project_code", "project_name")
+
+ERROR_COLUMNS = ["row", "column", "value", "error"]
+
+
+# ------------------------------------------------------------
+# Reading
+# ------------------------------------------------------------
+def normalise_header(name: Any) -> str:
+    # "Retirement/Cancellation Date" -> "retirement_cancellation_date"
+    return re.sub(r"[^0-9a-z]+", "_", str(name).strip().lower()).strip("_")
+
+
+def read_table(fileobj: BinaryIO, file_name: str) -> pd.DataFrame:
+    """CSV or XLSX -> DataFrame of stripped strings ('' for blanks), headers normalised."""
+    if file_name.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            df = pd.read_excel(fileobj, dtype=str, keep_default_na=False)  # needs openpyxl
+        except ImportError as e:
+            raise RuntimeError("Reading .xlsx needs openpyxl (pip install openpyxl) — or upload a CSV.") from e
+    else:
+        df = pd.read_csv(fileobj, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    df.columns = [normalise_header(c) for c in df.columns]
+    return df.apply(lambda s: s.str.strip())
+
+
+def project_template_csv() -> bytes:
+    return (",".join(PROJECT_IMPORT_COLUMNS) + "\n").encode("utf-8")
+
+
+# ------------------------------------------------------------
+# Validation
+# ------------------------------------------------------------
+def _existing_codes(codes: List[str]) -> set:
+    """Which of `codes` already exist (one query: the list is passed as a JSON array)."""
+    if not codes:
+        return set()
+    rows = get_reader().execute(
+        "SELECT project_code FROM projects WHERE project_code IN (SELECT value FROM json_each(?))",
+        (json.dumps(codes),),
+    ).fetchall()
+    return {r[0] for r in rows}
+
+
+def _iso_dates(values: pd.Series) -> pd.Series:
+    """YYYY-MM-DD strings -> datetimes (NaT where blank or invalid)."""
+    return pd.to_datetime(values.where(values != ""), format="%Y-%m-%d", errors="coerce")
+
+
+def validate_projects(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """Check an uploaded projects table.
+
+    Returns (clean, errors, warnings): `clean` holds the valid rows in canonical columns (None for
+    blanks, `row` = file row number), `errors` one line per problem (ERROR_COLUMNS).
+    """
+    warnings: List[str] = []
+    unknown = [c for c in df.columns if c not in PROJECT_IMPORT_COLUMNS]
+    if unknown:
+        warnings.append(f"Ignored unknown column(s): {', '.join(unknown)}")
+
+    missing = [c for c in PROJECT_REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        errors = pd.DataFrame(
+            [{"row": 1, "column": c, "value": "", "error": "required column missing"} for c in missing],
+            columns=ERROR_COLUMNS,
+        )
+        return pd.DataFrame(columns=["row", *PROJECT_IMPORT_COLUMNS]), errors, warnings
+
+    data = df.reindex(columns=PROJECT_IMPORT_COLUMNS, fill_value="")
+    data.insert(0, "row", range(2, len(data) + 2))  # file row numbers (header is row 1)
+    problems: List[pd.DataFrame] = []
+
+    def flag(mask: pd.Series, column: str, error: str) -> None:
+        if mask.any():
+            problems.append(
+                pd.DataFrame({"row": data.loc[mask, "row"], "column": column, "value": data.loc[mask, column], "error": error})
+            )
+
+    for col in PROJECT_REQUIRED_COLUMNS:
+        flag(data[col] == "", col, "required")
+
+    codes = data["project_code"]
+    flag((codes != "") & codes.duplicated(keep=False), "project_code", "duplicate in file")
+    existing = _existing_codes(codes[codes != ""].unique().tolist())
+    flag(codes.isin(existing), "project_code", "already exists in the registry")
+
+    year = pd.to_numeric(data["baseline_year"].where(data["baseline_year"] != ""), errors="coerce")
+    flag((data["baseline_year"] != "") & ~year.between(1900, 2100), "baseline_year", "must be a year 1900–2100")
+    flag(year.notna() & (year % 1 != 0), "baseline_year", "must be a whole year")
+
+    start, end = _iso_dates(data["start_date"]), _iso_dates(data["end_date"])
+    flag((data["start_date"] != "") & start.isna(), "start_date", "expected YYYY-MM-DD")
+    flag((data["end_date"] != "") & end.isna(), "end_date", "expected YYYY-MM-DD")
+    flag(start.notna() & end.notna() & (end < start), "end_date", "before start_date")
+
+    status = data["status"].str.capitalize()
+    flag((status != "") & ~status.isin(PROJECT_STATUSES), "status", f"one of {', '.join(PROJECT_STATUSES)}")
+
+    errors = (
+        pd.concat(problems, ignore_index=True).sort_values(["row", "column"], kind="stable").reset_index(drop=True)
+        if problems
+        else pd.DataFrame(columns=ERROR_COLUMNS)
+    )
+
+    clean = data[~data["row"].isin(errors["row"])].copy()
+    clean["status"] = clean["status"].str.capitalize().replace("", "Active")
+    clean["baseline_year"] = year.loc[clean.index].astype("Int64")
+    clean = clean.astype(object).where(clean != "", None)
+    clean = clean.where(clean.notna(), None)
+    return clean.reset_index(drop=True), errors, warnings
+
+
+# ------------------------------------------------------------
+# Import
+# ------------------------------------------------------------
+PROJECT_INSERT_SQL = f"""
+    INSERT INTO projects (project_id, {", ".join(PROJECT_IMPORT_COLUMNS)}, created_at, updated_at)
+    VALUES ({", ".join(["?"] * (len(PROJECT_IMPORT_COLUMNS) + 3))})
+"""
+
+
+def import_projects(clean: pd.DataFrame, *, actor: str, source: Optional[str] = None) -> Dict[str, Any]:
+    """Insert validated rows (from validate_projects) in one transaction. Returns a summary."""
+    import_id = str(uuid.uuid4())
+    ts = now_iso()
+    records = clean[PROJECT_IMPORT_COLUMNS].to_dict("records")
+    project_ids = [str(uuid.uuid4()) for _ in records]
+    params = [
+        (pid, *[rec[c] for c in PROJECT_IMPORT_COLUMNS], ts, ts) for pid, rec in zip(project_ids, records)
+    ]
+
+    with unit_of_work(actor=actor) as uow:
+        uow.executemany(PROJECT_INSERT_SQL, params)
+        uow.audit(
+            action="IMPORT",
+            entity_type="project_import",
+            entity_id=import_id,
+            meta={"source": source, "rows": len(params), "imported_at": ts},
+        )
+        for pid, rec in zip(project_ids, records):
+            uow.audit(
+                action="CREATE",
+                entity_type="project",
+                entity_id=pid,
+                project_id=pid,
+                after={"project_code": rec["project_code"], "project_name": rec["project_name"]},
+                meta={"import_id": import_id},
+            )
+    return {"import_id": import_id, "rows": len(params), "project_ids": project_ids}
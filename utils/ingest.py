@@ -0,0 +1,345 @@
+"""
+utils/ingest.py
+
+Streaming bulk ingest of registry issuance / retirement exports into credits and sales.
+
+Key guarantees:
+- Files are read in fixed-size chunks (CSV, gzip'd CSV, or Parquet with pyarrow); memory is one
+  chunk plus the project code map and a capped error sample, never the whole file.
+- Registry-style headers (Verra / Gold Standard exports) are mapped through column aliases.
+- Every row needs a natural key, source_ref (an explicit id column, else the serial range).
+  Rows upsert on (project_id, source_ref), and unchanged rows are not rewritten, so
+  re-importing the same file is cheap and idempotent.
+- Each chunk is one unit of work: its upsert plus one IMPORT audit entry.
+
+    python -m utils.ingest credits issuances.csv --actor ops
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.audit import now_iso
+from utils.db import CHUNK_ROWS, get_reader, pa
+from utils.importers import ERROR_COLUMNS, normalise_header
+from utils.uow import unit_of_work
+
+
+MAX_REPORTED_ERRORS = 1_000
+DAYFIRST_DEFAULT = False  # ambiguous 03/04/2024 is 4 March unless asked; UI, CLI and API agree
+
+# canonical column -> accepted (normalised) headers, in priority order
+TARGETS: Dict[str, Dict[str, Any]] = {
+    "credits": {
+        "id_column": "credit_id",
+        "aliases": {
+            "project": ["project_code", "project_id", "project", "id", "gsid", "gs_id"],
+            "source_ref": ["source_ref", "issuance_id", "transaction_id", "batch_id"],
+            "vintage_year": ["vintage_year", "vintage", "vintage_start", "vintage_start_date", "vintage_end"],
+            "credits_issued": ["credits_issued", "quantity_issued", "quantity_of_units_issued", "quantity", "credits"],
+            "issuance_date": ["issuance_date", "date_of_issuance", "issued_on", "issue_date"],
+            "serial_range": ["serial_range", "serial_number", "serial_numbers", "serials"],
+            "registry_program": ["registry_program", "program", "registry", "standard"],
+            "notes": ["notes", "comment", "comments"],
+        },
+        "required": ["vintage_year", "credits_issued"],
+        "numeric": ["credits_issued"],
+        "dates": ["issuance_date"],
+    },
+    "sales": {
+        "id_column": "sale_id",
+        "aliases": {
+            "project": ["project_code", "project_id", "project", "id", "gsid", "gs_id"],
+            "source_ref": ["source_ref", "retirement_id", "transaction_id", "cancellation_id"],
+            "sale_date": ["sale_date", "retirement_date", "date_of_retirement", "retirement_cancellation_date", "date"],
+            "buyer": ["buyer", "retirement_beneficiary", "beneficiary", "retired_on_behalf_of", "account_holder"],
+            "credits_sold": ["credits_sold", "quantity_retired", "quantity_of_units", "quantity", "credits"],
+            "price_per_credit": ["price_per_credit", "price", "unit_price"],
+            "currency": ["currency", "ccy"],
+            "contract_ref": ["contract_ref", "contract", "retirement_reason_details"],
+            "serial_range": ["serial_range", "serial_number", "serial_numbers", "serials"],
+            "notes": ["notes", "retirement_reason", "comment", "comments"],
+        },
+        "required": ["sale_date", "credits_sold"],
+        "numeric": ["credits_sold", "price_per_credit"],
+        "dates": ["sale_date"],
+    },
+}
+
+# Mapped but not stored on that table (sales have no serial_range column: it only feeds source_ref).
+_NOT_STORED = {"sales": {"serial_range"}}
+
+
+# ------------------------------------------------------------
+# Chunked readers
+# ------------------------------------------------------------
+def iter_chunks(fileobj: BinaryIO, file_name: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield the file as string DataFrames of at most `chunk_rows` rows ('' for blanks)."""
+    name = file_name.lower()
+    if name.endswith(".parquet"):
+        if pa is None:
+            raise RuntimeError("Reading Parquet needs pyarrow (pip install pyarrow) — or upload a CSV.")
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(fileobj).iter_batches(batch_size=chunk_rows):
+            df = batch.to_pandas()
+            yield df.astype(str).where(df.notna(), "")
+        return
+    compression = "gzip" if name.endswith(".gz") else None
+    reader = pd.read_csv(
+        fileobj,
+        dtype=str,
+        keep_default_na=False,
+        encoding="utf-8-sig",
+        compression=compression,
+        chunksize=chunk_rows,
+    )
+    with reader:
+        yield from reader
+
+
+def map_columns(headers: List[str], target: str) -> Dict[str, str]:
+    """canonical column -> file header, using the first alias present in the file."""
+    normalised = {normalise_header(h): h for h in headers}
+    mapping = {}
+    for col, aliases in TARGETS[target]["aliases"].items():
+        for alias in aliases:
+            if alias in normalised and normalised[alias] not in mapping.values():
+                mapping[col] = normalised[alias]
+                break
+    return mapping
+
+
+# ------------------------------------------------------------
+# Per-chunk coercion
+# ------------------------------------------------------------
+def _numbers(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values.str.replace(r"[,\s]", "", regex=True).where(values != ""), errors="coerce")
+
+
+def _dates(values: pd.Series, dayfirst: bool) -> pd.Series:
+    """Any common date spelling -> 'YYYY-MM-DD' (None where blank or unparseable)."""
+    blank = values == ""
+    parsed = pd.to_datetime(values.where(~blank), format="ISO8601", errors="coerce")
+    retry = parsed.isna() & ~blank
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], format="mixed", dayfirst=dayfirst, errors="coerce")
+    return parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), None)
+
+
+def _years(values: pd.Series) -> pd.Series:
+    # '2019', '01/01/2019', '2019-01-01 - 2019-12-31' -> 2019
+    return pd.to_numeric(values.str.extract(r"((?:19|20)\d{2})", expand=False), errors="coerce")
+
+
+def _project_map() -> Dict[str, str]:
+    """project_code -> project_id, plus project_id -> itself (files may carry either)."""
+    rows = get_reader().execute("SELECT project_id, project_code FROM projects").fetchall()
+    out = {pid: pid for pid, _code in rows}
+    out.update({code: pid for pid, code in rows if code})
+    return out
+
+
+def _prepare(
+    chunk: pd.DataFrame,
+    target: str,
+    mapping: Dict[str, str],
+    projects: Dict[str, str],
+    default_project_id: Optional[str],
+    first_row: int,
+    dayfirst: bool,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Coerce one chunk to canonical columns. Returns (valid rows, errors)."""
+    spec = TARGETS[target]
+    data = pd.DataFrame({col: chunk[header].str.strip() for col, header in mapping.items()})
+    data.insert(0, "row", range(first_row, first_row + len(chunk)))
+    problems: List[pd.DataFrame] = []
+
+    def flag(mask: pd.Series, column: str, value: pd.Series, error: str) -> None:
+        if mask.any():
+            problems.append(pd.DataFrame({"row": data.loc[mask, "row"], "column": column, "value": value[mask], "error": error}))
+
+    raw_project = data["project"] if "project" in data else pd.Series("", index=data.index)
+    data["project_id"] = raw_project.map(projects)
+    if default_project_id:
+        data.loc[raw_project == "", "project_id"] = default_project_id
+    flag(data["project_id"].isna(), "project", raw_project, "unknown project")
+
+    for col in spec["required"]:
+        if col not in data:
+            data[col] = ""
+        flag(data[col] == "", col, data[col], "required")
+    for col in spec["numeric"]:
+        if col in data:
+            raw = data[col]
+            data[col] = _numbers(raw)
+            flag((raw != "") & (data[col].isna() | (data[col] < 0)), col, raw, "not a non-negative number")
+    for col in spec["dates"]:
+        if col in data:
+            raw = data[col]
+            data[col] = _dates(raw, dayfirst)
+            flag((raw != "") & data[col].isna(), col, raw, "unrecognised date")
+    if "vintage_year" in data:
+        raw = data["vintage_year"]
+        data["vintage_year"] = _years(raw)
+        flag((raw != "") & data["vintage_year"].isna(), "vintage_year", raw, "no year found")
+
+    ref = data["source_ref"] if "source_ref" in data else pd.Series("", index=data.index)
+    if "serial_range" in data:
+        ref = ref.where(ref != "", data["serial_range"])
+    data["source_ref"] = ref
+    flag(ref == "", "source_ref", ref, "no natural key (id or serial range)")
+
+    errors = pd.concat(problems, ignore_index=True) if problems else pd.DataFrame(columns=ERROR_COLUMNS)
+    valid = data[~data["row"].isin(errors["row"])].drop(columns=["row", "project"], errors="ignore")
+    return valid, errors
+
+
+# ------------------------------------------------------------
+# Upsert
+# ------------------------------------------------------------
+def _stored_columns(target: str, mapping: Dict[str, str]) -> List[str]:
+    cols = [c for c in TARGETS[target]["aliases"] if c in mapping or c in TARGETS[target]["required"]]
+    cols = [c for c in cols if c not in ("project", "source_ref") and c not in _NOT_STORED.get(target, ())]
+    return ["project_id", "source_ref", *cols]
+
+
+def upsert_sql(target: str, columns: List[str]) -> str:
+    """INSERT … ON CONFLICT(project_id, source_ref) DO UPDATE, skipping rows whose values are unchanged.
+
+    Only columns present in the file are written, so a re-import never blanks other columns.
+    """
+    id_col = TARGETS[target]["id_column"]
+    values = [c for c in columns if c not in ("project_id", "source_ref")]
+    changed = " OR ".join(f"{target}.{c} IS NOT excluded.{c}" for c in values) or "0"
+    return f"""
+        INSERT INTO {target} ({id_col}, {", ".join(columns)}, created_at, updated_at)
+        VALUES ({", ".join(["?"] * (len(columns) + 3))})
+        ON CONFLICT(project_id, source_ref) WHERE source_ref IS NOT NULL DO UPDATE SET
+            {", ".join(f"{c} = excluded.{c}" for c in values)}, updated_at = excluded.updated_at
+        WHERE {changed}
+    """
+
+
+def _existing_keys(target: str, keys: List[Tuple[str, str]]) -> int:
+    """How many (project_id, source_ref) pairs already exist (one query per chunk)."""
+    if not keys:
+        return 0
+    return int(
+        get_reader().execute(
+            f"""
+            SELECT COUNT(*) FROM json_each(?) j
+            JOIN {target} t ON t.project_id = json_extract(j.value, '$[0]') AND t.source_ref = json_extract(j.value, '$[1]')
+            """,
+            (json.dumps(keys),),
+        ).fetchone()[0]
+    )
+
+
+def _sql_columns(valid: pd.DataFrame, columns: List[str]) -> List[List[Any]]:
+    """Column-wise Python lists for executemany (NaN / NA -> None, NumPy scalars -> Python)."""
+    out = []
+    for col in columns:
+        s = valid[col]
+        out.append(s.astype(object).where(s.notna(), None).tolist())
+    return out
+
+
+def ingest_file(
+    fileobj: BinaryIO,
+    file_name: str,
+    target: str,
+    *,
+    actor: str,
+    default_project_id: Optional[str] = None,
+    dayfirst: bool = DAYFIRST_DEFAULT,
+    chunk_rows: int = CHUNK_ROWS,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Stream `fileobj` into credits or sales. Returns counts plus a capped sample of row errors.
+
+    Later duplicates of a key inside the same chunk win. `progress` is called after every chunk.
+    """
+    ingest_id = str(uuid.uuid4())
+    projects = _project_map()
+    summary: Dict[str, Any] = {
+        "ingest_id": ingest_id, "target": target, "rows": 0,
+        "inserted": 0, "updated": 0, "unchanged": 0, "rejected": 0, "chunks": 0,
+    }
+    error_samples: List[pd.DataFrame] = []
+    n_error_rows = 0
+    mapping: Dict[str, str] = {}
+    sql, columns = "", []
+    first_row = 2  # file row numbers (header is row 1)
+
+    for chunk in iter_chunks(fileobj, file_name, chunk_rows):
+        if not mapping:
+            mapping = map_columns(list(chunk.columns), target)
+            summary["mapping"] = dict(mapping)
+            columns = _stored_columns(target, mapping)
+            sql = upsert_sql(target, columns)
+
+        valid, errors = _prepare(chunk, target, mapping, projects, default_project_id, first_row, dayfirst)
+        first_row += len(chunk)
+        valid = valid.drop_duplicates(["project_id", "source_ref"], keep="last")
+
+        ts = now_iso()
+        ids = [str(uuid.uuid4()) for _ in range(len(valid))]
+        params = [(i, *rec, ts, ts) for i, *rec in zip(ids, *_sql_columns(valid, columns))]
+        existing = _existing_keys(target, valid[["project_id", "source_ref"]].values.tolist())
+        with unit_of_work(actor=actor) as uow:
+            written = uow.executemany(sql, params) if params else 0
+            inserted = len(params) - existing
+            counts = {"inserted": inserted, "updated": max(written - inserted, 0)}
+            counts["unchanged"] = existing - counts["updated"]
+            uow.audit(
+                action="IMPORT",
+                entity_type=target,
+                entity_id=ingest_id,
+                meta={"source": file_name, "chunk": summary["chunks"], "rows": len(chunk), "rejected": int(errors["row"].nunique()), **counts},
+            )
+
+        summary["rows"] += len(chunk)
+        summary["chunks"] += 1
+        summary["rejected"] += int(errors["row"].nunique())
+        for k, v in counts.items():
+            summary[k] += v
+        if not errors.empty and n_error_rows < MAX_REPORTED_ERRORS:
+            error_samples.append(errors.head(MAX_REPORTED_ERRORS - n_error_rows))
+            n_error_rows += len(error_samples[-1])
+        if progress:
+            progress(summary)
+
+    summary["errors"] = pd.concat(error_samples, ignore_index=True) if error_samples else pd.DataFrame(columns=ERROR_COLUMNS)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from utils.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Stream an issuance / retirement export into credits or sales.")
+    parser.add_argument("target", choices=list(TARGETS))
+    parser.add_argument("path")
+    parser.add_argument("--actor", default="ingest-cli")
+    parser.add_argument("--project-id", default=None, help="project for rows without a project column")
+    parser.add_argument("--dayfirst", action="store_true", default=DAYFIRST_DEFAULT, help="read ambiguous dates as DD/MM/YYYY")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    ensure_schema()
+    with open(args.path, "rb") as fh:
+        result = ingest_file(
+            fh, args.path, args.target,
+            actor=args.actor, default_project_id=args.project_id, dayfirst=args.dayfirst, chunk_rows=args.chunk_rows,
+            progress=lambda s: print(f"chunk {s['chunks']}: {s['rows']} rows", flush=True),
+        )
+    errors = result.pop("errors")
+    print(json.dumps(result, indent=2))
+    if not errors.empty:
+        print(errors.to_string(index=False))
@@ -0,0 +1,196 @@
+"""
+utils/line_items.py
+
+Vectorized line-item engine for the Scope Calculator (no Streamlit here).
+
+Key guarantees:
+- Every line keeps its own quantity, unit, EF and uncertainty; nothing is collapsed to a single
+  blended EF first. Blank EF / uncertainty cells fall back to the calculator-level defaults.
+- Mixed units are converted to the calculator unit through utils.units (a per-line EF stays per
+  the line's own unit); a line whose unit cannot be converted raises UnitError.
+- Baseline / project emissions per line, per group and in total come from one NumPy pass
+  (np.bincount over factorized keys), so a 100k-line ledger costs milliseconds.
+- Uncertainty (screening-level, 1σ as % of value):
+  * activity uncertainty is independent per line (quadrature over lines);
+  * EF uncertainty is fully correlated among lines that share the same EF (linear within a
+    factor, quadrature across distinct factors).
+- Lines may be pre-aggregated (utils.line_stream): optional `quantity_sq` (Σ quantity²) and
+  `n_lines` columns keep the activity quadrature and line counts exact.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.units import UnitError, conversion_factors
+
+
+SIDES = ("baseline", "project")
+
+LINE_COLUMNS = ["side", "group", "quantity", "unit", "ef_kg_per_unit", "factor_id", "activity_u_pct", "ef_u_pct"]
+
+# Per-line sanity bounds on the EF (kgCO2e per unit); outside these a line is flagged, not rejected.
+EF_SUSPECT_HIGH = 1e4
+EF_SUSPECT_LOW = 1e-6
+
+
+def _numeric(values: Any) -> np.ndarray:
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def lines_from_table(
+    df: Optional[pd.DataFrame],
+    quantity_col: str,
+    *,
+    side: str,
+    group_col: Optional[str] = None,
+    unit: str = "",
+    ef_col: str = "ef_kg_per_unit",
+) -> pd.DataFrame:
+    """Editor/upload table -> canonical line items (rows without a numeric quantity are dropped)."""
+    if df is None or df.empty or quantity_col not in df.columns:
+        return pd.DataFrame(columns=LINE_COLUMNS)
+    quantity = _numeric(df[quantity_col].to_numpy())
+    keep = ~np.isnan(quantity)
+    n = int(keep.sum())
+
+    def optional(col: Optional[str]) -> np.ndarray:
+        return _numeric(df[col].to_numpy())[keep] if col and col in df.columns else np.full(n, np.nan)
+
+    group = df[group_col].astype(str).str.strip().to_numpy()[keep] if group_col and group_col in df.columns else np.full(n, "", dtype=object)
+    units = df["unit"].astype(str).str.strip().to_numpy()[keep] if "unit" in df.columns else np.full(n, unit, dtype=object)
+    factor_ids = df["factor_id"].fillna("").astype(str).str.strip().to_numpy()[keep] if "factor_id" in df.columns else np.full(n, "", dtype=object)
+    return pd.DataFrame(
+        {
+            "side": side,
+            "group": group,
+            "quantity": quantity[keep],
+            "unit": units,
+            "ef_kg_per_unit": optional(ef_col),
+            "factor_id": factor_ids,
+            "activity_u_pct": optional("activity_u_pct"),
+            "ef_u_pct": optional("ef_u_pct"),
+        },
+        columns=LINE_COLUMNS,
+    )
+
+
+def stack_lines(*frames: pd.DataFrame) -> pd.DataFrame:
+    frames = [f for f in frames if f is not None and not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=LINE_COLUMNS)
+
+
+def _sum_by(codes: np.ndarray, weights: np.ndarray, n: int) -> np.ndarray:
+    return np.bincount(codes, weights=weights, minlength=n) if len(codes) else np.zeros(n)
+
+
+def _group_codes(*keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dense group code per row for the composite key, plus one representative row per group."""
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for key in keys:
+        codes, uniques = pd.factorize(key)
+        combined = combined * (len(uniques) + 1) + codes
+    _, first, codes = np.unique(combined, return_index=True, return_inverse=True)
+    return codes.astype(np.intp), first
+
+
+def compute_line_items(
+    lines: pd.DataFrame,
+    *,
+    default_ef: float,
+    default_activity_u_pct: float = 0.0,
+    default_ef_u_pct: float = 0.0,
+    unit: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Per-line, per-group and total emissions for baseline and project lines.
+
+    `default_ef` is per `unit`; when `unit` is given, line quantities are converted to it first.
+    Returns {"lines": DataFrame, "groups": DataFrame, "totals": dict}; totals are in tCO2e and
+    carry the same keys as compute_baseline_project_reduction() plus uncertainty and counts.
+    """
+    quantity = lines["quantity"].to_numpy(dtype=np.float64)
+    quantity_sq = quantity**2
+    if "quantity_sq" in lines.columns:
+        quantity_sq = np.where(lines["quantity_sq"].isna(), quantity_sq, lines["quantity_sq"].to_numpy(dtype=np.float64))
+    n_raw = lines["n_lines"].fillna(1).to_numpy(dtype=np.float64) if "n_lines" in lines.columns else np.ones(len(lines))
+    ef_given = lines["ef_kg_per_unit"].to_numpy(dtype=np.float64)
+    if unit is not None and len(lines):
+        factor, bad = conversion_factors(lines["unit"].to_numpy(), unit)
+        if bad:
+            raise UnitError(f"Cannot convert {', '.join(repr(b) for b in sorted(set(bad)))} to {unit!r}")
+        quantity = quantity * factor
+        quantity_sq = quantity_sq * factor**2
+        ef_given = ef_given / factor  # kg per line unit -> kg per calculator unit
+    ef = np.where(np.isnan(ef_given), float(default_ef), ef_given)
+    act_rel = np.nan_to_num(lines["activity_u_pct"].to_numpy(dtype=np.float64), nan=default_activity_u_pct) / 100.0
+    ef_rel = np.nan_to_num(lines["ef_u_pct"].to_numpy(dtype=np.float64), nan=default_ef_u_pct) / 100.0
+    side = (lines["side"].to_numpy() == "project").astype(np.intp)  # 0 = baseline, 1 = project
+
+    kg = quantity * ef
+    act_u_kg = np.sqrt(quantity_sq) * np.abs(ef) * act_rel  # = |kg| × rel for single lines
+
+    # Totals per side.
+    kg_side = _sum_by(side, kg, 2)
+    act_var_side = _sum_by(side, act_u_kg**2, 2)
+    # EF uncertainty: linear within (side, EF, EF-uncertainty) clusters, quadrature across them.
+    cluster, first = _group_codes(side, ef, ef_rel)
+    cluster_kg = _sum_by(cluster, kg, len(first))
+    ef_var_side = _sum_by(side[first], (np.abs(cluster_kg) * ef_rel[first]) ** 2, 2)
+    u_side_kg = np.sqrt(act_var_side + ef_var_side)
+
+    # Groups (side, group label).
+    group = lines["group"].to_numpy()
+    gcodes, gfirst = _group_codes(side, group)
+    n_groups = len(gfirst)
+    groups = pd.DataFrame(
+        {
+            "side": np.asarray(SIDES, dtype=object)[side[gfirst]],
+            "group": group[gfirst],
+            "n_lines": _sum_by(gcodes, n_raw, n_groups).astype(np.int64),
+            "quantity": _sum_by(gcodes, quantity, n_groups),
+            "emissions_tco2e": _sum_by(gcodes, kg, n_groups) / 1000.0,
+            "activity_u_tco2e": np.sqrt(_sum_by(gcodes, act_u_kg**2, n_groups)) / 1000.0,
+        }
+    ).sort_values(["side", "emissions_tco2e"], ascending=[True, False], ignore_index=True)
+
+    flags = np.full(len(lines), "", dtype=object)
+    flags[np.isnan(ef_given)] = "default EF"
+    flags[(ef > EF_SUSPECT_HIGH) | ((ef > 0) & (ef < EF_SUSPECT_LOW))] = "check EF units"
+    flags[ef <= 0] = "EF missing"
+    out_lines = lines.assign(
+        quantity_converted=quantity,
+        ef_used=ef,
+        emissions_tco2e=kg / 1000.0,
+        activity_u_tco2e=act_u_kg / 1000.0,
+        flag=flags,
+    )
+
+    baseline_kg, project_kg = float(kg_side[0]), float(kg_side[1])
+    reduction_kg = baseline_kg - project_kg
+    totals = {
+        "baseline_tco2e": baseline_kg / 1000.0,
+        "project_tco2e": project_kg / 1000.0,
+        "reduction_tco2e": reduction_kg / 1000.0,
+        "reduction_pct": (reduction_kg / baseline_kg * 100.0) if baseline_kg > 0 else None,
+        "baseline_u_tco2e": float(u_side_kg[0]) / 1000.0,
+        "project_u_tco2e": float(u_side_kg[1]) / 1000.0,
+        "baseline_activity_u_tco2e": float(np.sqrt(act_var_side[0])) / 1000.0,
+        "project_activity_u_tco2e": float(np.sqrt(act_var_side[1])) / 1000.0,
+        "baseline_ef_u_tco2e": float(np.sqrt(ef_var_side[0])) / 1000.0,
+        "project_ef_u_tco2e": float(np.sqrt(ef_var_side[1])) / 1000.0,
+        "n_lines": int(n_raw.sum()),
+        "n_default_ef": int(n_raw[np.isnan(ef_given)].sum()),
+        "n_flagged": int((flags == "check EF units").sum() + (flags == "EF missing").sum()),
+    }
+    return {"lines": out_lines, "groups": groups, "totals": totals}
+
+
+def summarize_groups(groups: pd.DataFrame) -> List[Dict[str, Any]]:
+    """JSON-friendly group table for calc_runs.inputs_json / outputs_json."""
+    return [
+        {k: (v.item() if hasattr(v, "item") else v) for k, v in rec.items()}
+        for rec in groups.to_dict("records")
+    ]
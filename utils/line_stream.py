@@ -0,0 +1,213 @@
+"""
+utils/line_stream.py
+
+Streaming aggregation of large activity files (fuel-card extracts, meter exports) into line items
+for the Scope Calculator (no Streamlit here).
+
+Key guarantees:
+- Files are read in chunks through utils.ingest.iter_chunks (CSV, gzip'd CSV, Parquet); memory is
+  one chunk plus the running aggregate, a capped row sample and a capped error sample.
+- Valid rows are collapsed per (group, unit, EF, factor_id, uncertainty) key into aggregated
+  lines carrying quantity, quantity_sq (Σ quantity²) and n_lines, so compute_line_items() gives
+  the same totals and uncertainty as it would over the raw rows.
+- Distinct group labels are capped; rows of further groups are pooled under OTHER_GROUP.
+- The aggregate itself is capped at MAX_LINES lines: once full, rows that would open a new
+  (group, unit, EF, factor_id, uncertainty) line are rejected and reported (pooling them would
+  change the totals), so memory stays flat however many rows or distinct per-row values the file has.
+- Every rejected row is counted; the first MAX_REPORTED_ERRORS problems are reported by file row.
+"""
+
+from __future__ import annotations
+
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.db import CHUNK_ROWS
+from utils.importers import ERROR_COLUMNS, normalise_header
+from utils.ingest import MAX_REPORTED_ERRORS, iter_chunks
+from utils.line_items import LINE_COLUMNS
+from utils.units import conversion_table
+
+
+SAMPLE_ROWS = 200
+MAX_GROUPS = 5_000
+MAX_LINES = 20_000
+OTHER_GROUP = "(other groups)"
+
+AGG_KEY = ["side", "group", "unit", "ef_kg_per_unit", "factor_id", "activity_u_pct", "ef_u_pct"]
+LINE_KEY = AGG_KEY[1:]  # one side per call
+AGG_COLUMNS = [*LINE_COLUMNS, "quantity_sq", "n_lines"]
+
+# line column -> accepted (normalised) headers after the calculator's own column name
+ALIASES: Dict[str, List[str]] = {
+    "quantity": ["quantity", "qty", "amount", "volume", "consumption", "value"],
+    "group": ["group", "category", "supplier", "site", "vehicle", "meter"],
+    "unit": ["unit", "units", "uom"],
+    "ef_kg_per_unit": ["ef_kg_per_unit", "ef", "emission_factor"],
+    "factor_id": ["factor_id"],
+    "activity_u_pct": ["activity_u_pct"],
+    "ef_u_pct": ["ef_u_pct"],
+}
+
+
+def map_columns(headers: List[str], quantity_col: str, group_col: Optional[str]) -> Dict[str, str]:
+    """line column -> file header (the calculator's column names win over the generic aliases)."""
+    normalised = {normalise_header(h): h for h in headers}
+    preferred = {"quantity": quantity_col, "group": group_col}
+    mapping: Dict[str, str] = {}
+    for col, aliases in ALIASES.items():
+        own = [normalise_header(preferred[col])] if preferred.get(col) else []
+        for alias in [*own, *aliases]:
+            if alias in normalised and normalised[alias] not in mapping.values():
+                mapping[col] = normalised[alias]
+                break
+    return mapping
+
+
+def _numbers(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values.str.replace(r"[,\s]", "", regex=True).where(values != ""), errors="coerce")
+
+
+def _empty_aggregate() -> pd.DataFrame:
+    return pd.DataFrame(columns=AGG_COLUMNS)
+
+
+def _line_keys(df: pd.DataFrame) -> pd.MultiIndex:
+    # Blank EF / uncertainty (NaN) -> -1: accepted values are non-negative and lookups need no NaN.
+    return pd.MultiIndex.from_frame(df[LINE_KEY].fillna(-1.0))
+
+
+def _collapse(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.groupby(AGG_KEY, dropna=False, sort=False).agg(
+        quantity=("quantity", "sum"), quantity_sq=("quantity_sq", "sum"), n_lines=("n_lines", "sum")
+    )
+    return out.reset_index()[AGG_COLUMNS]
+
+
+def aggregate_file(
+    fileobj: BinaryIO,
+    file_name: str,
+    *,
+    side: str,
+    quantity_col: str,
+    group_col: Optional[str] = None,
+    unit: str = "",
+    known_factor_ids: Optional[pd.Index] = None,
+    chunk_rows: int = CHUNK_ROWS,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Stream one side's activity file into aggregated line items.
+
+    Returns {"lines", "sample", "errors", "rows", "accepted", "rejected", "chunks", "mapping",
+    "groups_pooled", "lines_capped"}. Rows are rejected for a blank / non-numeric / negative
+    quantity, a unit that does not convert to `unit`, a bad EF or uncertainty, a factor_id not in
+    `known_factor_ids` (when given), or a new line once MAX_LINES lines exist.
+    """
+    summary: Dict[str, Any] = {
+        "rows": 0, "accepted": 0, "rejected": 0, "chunks": 0, "groups_pooled": 0, "lines_capped": 0,
+    }
+    agg = _empty_aggregate()
+    groups: set = set()
+    samples: List[pd.DataFrame] = []
+    n_sample = 0
+    error_samples: List[pd.DataFrame] = []
+    n_error_rows = 0
+    unit_ok: Dict[str, bool] = {}
+    mapping: Dict[str, str] = {}
+    first_row = 2  # file row numbers (header is row 1)
+
+    for chunk in iter_chunks(fileobj, file_name, chunk_rows):
+        if not mapping:
+            mapping = map_columns(list(chunk.columns), quantity_col, group_col)
+            summary["mapping"] = dict(mapping)
+            if "quantity" not in mapping:
+                raise ValueError(f"No quantity column found (expected {quantity_col!r} or one of {', '.join(ALIASES['quantity'])}).")
+
+        data = pd.DataFrame({col: chunk[header].astype(str).str.strip() for col, header in mapping.items()})
+        data.insert(0, "row", range(first_row, first_row + len(chunk)))
+        first_row += len(chunk)
+        problems: List[pd.DataFrame] = []
+
+        def flag(mask: pd.Series, column: str, raw: pd.Series, error: str) -> None:
+            if mask.any():
+                problems.append(pd.DataFrame({"row": data.loc[mask, "row"], "column": column, "value": raw[mask], "error": error}))
+
+        raw = data["quantity"]
+        data["quantity"] = _numbers(raw)
+        flag(data["quantity"].isna() | (data["quantity"] < 0), "quantity", raw, "not a non-negative number")
+        for col in ("ef_kg_per_unit", "activity_u_pct", "ef_u_pct"):
+            if col in data:
+                raw = data[col]
+                data[col] = _numbers(raw)
+                flag((raw != "") & (data[col].isna() | (data[col] < 0)), col, raw, "not a non-negative number")
+            else:
+                data[col] = np.nan
+        data["unit"] = data["unit"] if "unit" in data else ""
+        if unit:
+            for u in data["unit"].unique():
+                if u not in unit_ok:
+                    unit_ok[u] = bool(np.isfinite(conversion_table([u], unit)[0][0]))
+            flag(~data["unit"].map(unit_ok), "unit", data["unit"], f"cannot convert to {unit}")
+        data["factor_id"] = data["factor_id"] if "factor_id" in data else ""
+        if known_factor_ids is not None:
+            flag((data["factor_id"] != "") & ~data["factor_id"].isin(known_factor_ids), "factor_id", data["factor_id"], "unknown factor_id")
+        data["group"] = data["group"] if "group" in data else ""
+
+        errors = pd.concat(problems, ignore_index=True) if problems else pd.DataFrame(columns=ERROR_COLUMNS)
+        bad_rows = errors["row"].unique()
+        valid = data[~data["row"].isin(bad_rows)]
+
+        # Cap distinct group labels: unseen labels beyond MAX_GROUPS are pooled.
+        labels = valid["group"].unique()
+        new = [g for g in labels if g not in groups]
+        room = max(MAX_GROUPS - len(groups), 0)
+        groups.update(new[:room])
+        if len(new) > room:
+            pooled = valid["group"].isin(set(new[room:]))
+            summary["groups_pooled"] += int(pooled.sum())
+            valid = valid.assign(group=valid["group"].where(~pooled, OTHER_GROUP))
+
+        # Cap distinct lines: keys first seen once the aggregate is full are rejected, not pooled.
+        if not valid.empty:
+            keys = _line_keys(valid)
+            fresh = keys.unique()
+            if not agg.empty:
+                fresh = fresh[~fresh.isin(_line_keys(agg))]
+            room = max(MAX_LINES - len(agg), 0)
+            if len(fresh) > room:
+                over = keys.isin(fresh[room:])
+                lost = valid[over]
+                errors = pd.concat(
+                    [errors, pd.DataFrame({
+                        "row": lost["row"], "column": "ef_kg_per_unit", "value": lost["ef_kg_per_unit"].astype(str),
+                        "error": f"more than {MAX_LINES:,} distinct group / unit / EF / factor / uncertainty lines",
+                    })],
+                    ignore_index=True,
+                )
+                bad_rows = errors["row"].unique()
+                summary["lines_capped"] += len(lost)
+                valid = valid[~over]
+
+        if n_sample < SAMPLE_ROWS and not valid.empty:
+            samples.append(valid.head(SAMPLE_ROWS - n_sample).drop(columns=["row"]))
+            n_sample += len(samples[-1])
+        part = valid.assign(side=side, quantity_sq=valid["quantity"] ** 2, n_lines=1)
+        if not part.empty:
+            agg = _collapse(part[AGG_COLUMNS] if agg.empty else pd.concat([agg, part[AGG_COLUMNS]], ignore_index=True))
+
+        summary["rows"] += len(chunk)
+        summary["chunks"] += 1
+        summary["accepted"] += len(valid)
+        summary["rejected"] += len(bad_rows)
+        if not errors.empty and n_error_rows < MAX_REPORTED_ERRORS:
+            error_samples.append(errors.sort_values("row", kind="stable").head(MAX_REPORTED_ERRORS - n_error_rows))
+            n_error_rows += len(error_samples[-1])
+        if progress:
+            progress(summary)
+
+    summary["lines"] = agg.astype({"quantity": float, "quantity_sq": float, "n_lines": int})
+    summary["sample"] = pd.concat(samples, ignore_index=True) if samples else pd.DataFrame(columns=LINE_COLUMNS)
+    summary["errors"] = pd.concat(error_samples, ignore_index=True) if error_samples else pd.DataFrame(columns=ERROR_COLUMNS)
+    return summary
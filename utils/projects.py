@@ -0,0 +1,83 @@
+"""
+utils/projects.py
+
+Project lookups for pickers (no Streamlit here; pages/ui add caching).
+
+Key guarantees:
+- project_labels() builds the id -> "code — name" map in one query, so widget
+  format_funcs are dict lookups instead of DataFrame scans per option.
+- search_projects() is a server-side prefix search on code or name, served by the
+  NOCASE indexes from migration 5 (index range seeks, never a full scan).
+- One definition of the project scopes used across pages ("all", "active", "open").
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+from utils.db import get_reader
+
+
+# scope -> WHERE clause on projects
+SCOPES: Dict[str, str] = {
+    "all": "",
+    "active": "status = 'Active'",
+    "open": "COALESCE(status, 'Active') != 'Archived'",
+}
+
+
+def _where(scope: str, *extra: str) -> str:
+    clauses = [c for c in (SCOPES[scope], *extra) if c]
+    return (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+def _label(project_id: str, code: Optional[str], name: Optional[str]) -> str:
+    if not (code or name):
+        return project_id
+    return f"{code or ''} — {name or ''}"
+
+
+def project_labels(scope: str = "all") -> Dict[str, str]:
+    """project_id -> label for every project in scope, most recently updated first."""
+    rows = get_reader().execute(
+        f"SELECT project_id, project_code, project_name FROM projects{_where(scope)} ORDER BY updated_at DESC"
+    ).fetchall()
+    return {pid: _label(pid, code, name) for pid, code, name in rows}
+
+
+def project_label(project_id: str) -> Optional[str]:
+    row = get_reader().execute(
+        "SELECT project_id, project_code, project_name FROM projects WHERE project_id = ?", (project_id,)
+    ).fetchone()
+    return _label(*row) if row else None
+
+
+def count_projects(scope: str = "all") -> int:
+    return int(get_reader().execute(f"SELECT COUNT(*) FROM projects{_where(scope)}").fetchone()[0])
+
+
+def _like_prefix(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def search_projects(prefix: str, scope: str = "all", *, limit: int = 50) -> Dict[str, str]:
+    """project_id -> label for projects whose code or name starts with `prefix` (case-insensitive).
+
+    An empty prefix returns the most recently updated projects.
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        query = f"SELECT project_id, project_code, project_name FROM projects{_where(scope)} ORDER BY updated_at DESC LIMIT ?"
+        params: tuple = (int(limit),)
+    else:
+        # LIKE is case-insensitive for ASCII, which lets SQLite turn it into a range seek on the NOCASE indexes.
+        match = "(project_code LIKE ? ESCAPE '\\' OR project_name LIKE ? ESCAPE '\\')"
+        query = (
+            f"SELECT project_id, project_code, project_name FROM projects{_where(scope, match)} "
+            "ORDER BY project_code COLLATE NOCASE, project_name COLLATE NOCASE LIMIT ?"
+        )
+        like = _like_prefix(prefix)
+        params = (like, like, int(limit))
+    rows = get_reader().execute(query, params).fetchall()
+    return {pid: _label(pid, code, name) for pid, code, name in rows}
@@ -0,0 +1,542 @@
+"""
+utils/recompute.py
+
+Recompute saved calculations (calc_runs, emissions) after a factor revision (no Streamlit here).
+
+Key guarantees:
+- Runs are selected in SQL (factor id in inputs_json, methodology / scope label, date range,
+  project) and streamed in chunks; the run tables are never loaded whole.
+- Each run is rebuilt from its own inputs_json: Scope Calculator runs through the line-item engine,
+  Methodologies ledger entries through methodologies.<NAME>.compute() (one vectorized call per
+  chunk). Evaluation fans out over a process pool; workers never touch the database.
+- A revision maps old factor_id -> new factor_id. Scope runs take the new factor's value per their
+  own unit (page EF and any line carrying the old id). Methodology inputs derived from a factor
+  move by the change in its value, so entries that stored tailpipe + WTT as one number stay exact.
+  `overrides` set engine fields directly (e.g. a revised grid_ef typed on the page).
+- Changed runs get a calc_revisions row (numbered per run, previous outputs kept) and the run row
+  is updated, in batched units of work with one RECOMPUTE audit entry per batch. Stored Monte
+  Carlo / sweep / uncertainty summaries are not re-simulated, so revised outputs drop them.
+- Runs the revision does not touch are counted, not reported; the diff report lists changed,
+  unchanged and failed runs.
+
+    python -m utils.recompute --factor OLD_ID=NEW_ID --since 2024-01-01 --workers 8 --report diff.csv
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import methodologies
+from methodologies.base import numeric_fields
+from utils import factors
+from utils.audit import now_iso
+from utils.db import CHUNK_ROWS, db_query, db_query_iter
+from utils.line_items import compute_line_items, summarize_groups
+from utils.units import UnitError, conversion_factor
+from utils.uow import unit_of_work
+
+
+SOURCES = ("calc_runs", "emissions")
+TASK_ROWS = 250  # runs per worker task
+WRITE_ROWS = 2_000  # changed runs per write transaction
+TOLERANCE = 1e-9  # tCO2e; smaller moves count as unchanged
+STALE_OUTPUTS = ("monte_carlo", "scenario_sweep", "uncertainty_results")
+REPORT_COLUMNS = [
+    "source_table", "source_id", "project_id", "label", "record_date",
+    "old_value", "new_value", "delta", "delta_pct", "status", "detail",
+]
+
+# source -> (SELECT, date expression, label column); old_value is the headline figure.
+_SELECT: Dict[str, Tuple[str, str, str]] = {
+    "calc_runs": (
+        """
+        SELECT calc_id AS source_id, project_id, scope_label AS label, {date} AS record_date,
+               reduction_tco2e AS old_value, inputs_json, outputs_json
+        FROM calc_runs WHERE calc_type = 'scope'
+        """,
+        "COALESCE(period_start, substr(created_at, 1, 10))",
+        "scope_label",
+    ),
+    "emissions": (
+        """
+        SELECT emission_id AS source_id, project_id, methodology AS label, {date} AS record_date,
+               quantity_tco2e AS old_value, inputs_json, outputs_json
+        FROM emissions WHERE 1 = 1
+        """,
+        "COALESCE(record_date, substr(created_at, 1, 10))",
+        "methodology",
+    ),
+}
+
+UPDATE_SQL = {
+    "calc_runs": """
+        UPDATE calc_runs SET baseline_tco2e = ?, project_tco2e = ?, reduction_tco2e = ?,
+            inputs_json = ?, outputs_json = ?, factor_source = COALESCE(?, factor_source)
+        WHERE calc_id = ?
+    """,
+    "emissions": "UPDATE emissions SET quantity_tco2e = ?, inputs_json = ?, outputs_json = ? WHERE emission_id = ?",
+}
+
+REVISION_INSERT_SQL = """
+    INSERT INTO calc_revisions (
+        revision_id, job_id, source_table, source_id, project_id, revision_no, reason,
+        old_value, new_value, changes_json, previous_outputs_json, inputs_json, outputs_json, actor, created_at
+    ) VALUES (
+        ?, ?, ?, ?, ?,
+        COALESCE((SELECT MAX(revision_no) FROM calc_revisions WHERE source_table = ? AND source_id = ?), 0) + 1,
+        ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
+
+# ------------------------------------------------------------
+# Selection
+# ------------------------------------------------------------
+def select_sql(
+    source: str,
+    *,
+    factor_ids: Sequence[str] = (),
+    labels: Sequence[str] = (),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    project_id: Optional[str] = None,
+) -> Tuple[str, Tuple]:
+    """SELECT for the candidate runs of one source (dates are ISO, both ends inclusive).
+
+    The factor filter is a prefilter on inputs_json; ledger entries saved before the page recorded
+    factor ids ("engine") are always candidates and are matched on their fuel type instead.
+    """
+    sql, date_expr, label_col = _SELECT[source]
+    sql = sql.format(date=date_expr)
+    params: List[Any] = []
+    if factor_ids:
+        clauses = ["instr(inputs_json, ?) > 0"] * len(factor_ids)
+        if source == "emissions":
+            clauses.append("instr(inputs_json, '\"engine\"') = 0")
+        sql += f" AND ({' OR '.join(clauses)})"
+        params += list(factor_ids)
+    if labels:
+        sql += f" AND {label_col} IN ({', '.join('?' * len(labels))})"
+        params += list(labels)
+    if since:
+        sql += f" AND {date_expr} >= ?"
+        params.append(since)
+    if until:
+        sql += f" AND {date_expr} <= ?"
+        params.append(until)
+    if project_id:
+        sql += " AND project_id = ?"
+        params.append(project_id)
+    return sql, tuple(params)
+
+
+def resolve_revisions(factor_map: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """old factor_id -> what workers need about its replacement (resolved once, in the parent).
+
+    Raises KeyError for unknown ids and UnitError when the two factors do not measure the same
+    thing (numerator or activity dimension).
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    for old_id, new_id in factor_map.items():
+        old, new = factors.get_factor(old_id), factors.get_factor(new_id)
+        missing = [fid for fid, rec in ((old_id, old), (new_id, new)) if rec is None]
+        if missing:
+            raise KeyError(f"Unknown factor_id(s): {', '.join(missing)}")
+        if old["factor_unit"] != new["factor_unit"]:
+            raise UnitError(f"Factor {new_id} is in {new['factor_unit']}, {old_id} in {old['factor_unit']}.")
+        per_old_unit = factors.value_per(new, old["unit"])  # raises UnitError across dimensions
+        out[old_id] = {
+            "factor_id": new_id,
+            "value": float(new["factor_value"]),
+            "unit": new["unit"],
+            "delta": per_old_unit - float(old["factor_value"]),
+            "reference": factors.factor_reference(new),
+        }
+    return out
+
+
+# ------------------------------------------------------------
+# Evaluation (runs in worker processes)
+# ------------------------------------------------------------
+_LINE_NUMERIC = ("quantity", "ef_kg_per_unit", "activity_u_pct", "ef_u_pct", "quantity_sq", "n_lines")
+
+
+def _scope_run(inputs: Dict[str, Any], outputs: Dict[str, Any], revisions: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """One Scope Calculator run; None when the revision does not touch it."""
+    unit = inputs.get("unit") or ""
+    ef = float(inputs.get("ef_kgco2e_per_unit") or 0.0)
+    meta = dict(inputs.get("ef_metadata") or {})
+    changes: Dict[str, Any] = {}
+    factor_source = None
+    rev = revisions.get(meta.get("factor_id") or "")
+    if rev:
+        new_ef = rev["value"] * conversion_factor(unit, rev["unit"])
+        changes["ef_kgco2e_per_unit"] = [ef, new_ef]
+        ef = new_ef
+        meta.update(factor_id=rev["factor_id"], factor_reference=rev["reference"])
+        factor_source = rev["reference"]
+
+    saved_lines = inputs.get("line_items")
+    if saved_lines is None and inputs.get("line_groups"):
+        if rev:
+            raise ValueError("line items were not saved with this run (large ledger); re-run it from the source file")
+        return None
+    lines = None
+    if saved_lines:
+        lines = pd.DataFrame(saved_lines)
+        for col in _LINE_NUMERIC:
+            if col in lines.columns:
+                lines[col] = pd.to_numeric(lines[col], errors="coerce")
+        ids = lines["factor_id"].fillna("").astype(str) if "factor_id" in lines.columns else pd.Series("", index=lines.index)
+        hit = ids.isin(list(revisions))
+        if hit.any():
+            line_units = lines.loc[hit, "unit"].fillna("").astype(str).replace("", unit)
+            new = [(revisions[fid]["factor_id"], revisions[fid]["value"] * conversion_factor(u, revisions[fid]["unit"]))
+                   for fid, u in zip(ids[hit], line_units)]
+            lines.loc[hit, "factor_id"] = [fid for fid, _v in new]
+            lines.loc[hit, "ef_kg_per_unit"] = [v for _fid, v in new]
+            changes["line_items"] = [int(hit.sum()), sorted(set(ids[hit]))]
+    if not changes:
+        return None
+
+    if lines is None:
+        baseline_kg = float(inputs.get("baseline_activity") or 0.0) * ef
+        project_kg = float(inputs.get("project_activity") or 0.0) * ef
+        res = {
+            "baseline_tco2e": baseline_kg / 1000.0,
+            "project_tco2e": project_kg / 1000.0,
+            "reduction_tco2e": (baseline_kg - project_kg) / 1000.0,
+            "reduction_pct": (baseline_kg - project_kg) / baseline_kg * 100.0 if baseline_kg > 0 else None,
+        }
+        extra: Dict[str, Any] = {}
+    else:
+        u_meta = inputs.get("uncertainty") or {}
+        activity_u_default = lines["side"].map({
+            "baseline": u_meta.get("baseline_activity_u_pct", 0.0),
+            "project": u_meta.get("project_activity_u_pct", 0.0),
+        })
+        result = compute_line_items(
+            lines.assign(activity_u_pct=lines["activity_u_pct"].fillna(activity_u_default)),
+            default_ef=ef,
+            default_ef_u_pct=u_meta.get("ef_u_pct", 0.0),
+            unit=unit,
+        )
+        totals = result["totals"]
+        res = {k: totals[k] for k in ("baseline_tco2e", "project_tco2e", "reduction_tco2e", "reduction_pct")}
+        groups = summarize_groups(result["groups"])
+        inputs = {**inputs, "line_items": lines.astype(object).where(lines.notna(), None).to_dict("records"), "line_groups": groups}
+        extra = {"line_item_totals": totals, "line_groups": groups}
+
+    new_outputs = {k: v for k, v in outputs.items() if k not in STALE_OUTPUTS}
+    new_outputs.update(res, **extra)
+    return {
+        "new_value": res["reduction_tco2e"],
+        "baseline_tco2e": res["baseline_tco2e"],
+        "project_tco2e": res["project_tco2e"],
+        "inputs": {**inputs, "ef_kgco2e_per_unit": ef, "ef_metadata": meta},
+        "outputs": new_outputs,
+        "changes": changes,
+        "factor_source": factor_source,
+    }
+
+
+def _engine_factors(methodology: str, saved: Dict[str, Any]) -> Dict[str, str]:
+    """factor_id -> engine field for one ledger entry."""
+    if "engine" in saved:
+        return dict(saved.get("engine_factors") or {})
+    # Entries saved before the engine record: VM0038 demo fuels folded tailpipe (+ WTT) into ef_tail.
+    fuel, dataset = saved.get("fuel_type"), saved.get("factor_dataset")
+    if methodology != "VM0038" or not fuel or not dataset:
+        return {}
+    out = {factors.demo_factor_id(fuel, "tank-to-wheel"): "ef_tail"}
+    if saved.get("include_wtt"):
+        out[factors.demo_factor_id(fuel, "well-to-tank")] = "ef_tail"
+    return out
+
+
+def _methodology_runs(
+    methodology: str, rows: List[Dict[str, Any]], revisions: Dict[str, Dict[str, Any]], overrides: Dict[str, float]
+) -> Dict[str, Dict[str, Any]]:
+    """Ledger entries of one methodology: revise inputs per entry, then one compute() for all."""
+    module = methodologies.get(methodology)
+    out: Dict[str, Dict[str, Any]] = {}
+    revised: List[Tuple[Dict[str, Any], Dict[str, Any], Any, Dict[str, str], Dict[str, Any]]] = []
+    for row in rows:
+        try:
+            saved = json.loads(row["inputs_json"] or "{}")
+            record = module.from_saved(saved)
+            links = _engine_factors(methodology, saved)
+            values = dataclasses.asdict(record)
+            changes: Dict[str, Any] = {}
+            for fid, name in links.items():
+                if fid in revisions:
+                    before = changes.get(name, [values[name]])[0]
+                    values[name] = float(values[name]) + revisions[fid]["delta"]
+                    changes[name] = [before, values[name]]
+            for name, value in overrides.items():
+                if name in values and float(values[name]) != float(value):
+                    changes[name] = [changes.get(name, [values[name]])[0], float(value)]
+                    values[name] = value
+            if not changes:
+                continue
+            record = dataclasses.replace(record, **{k: type(getattr(record, k))(values[k]) for k in changes})
+            links = {revisions[fid]["factor_id"] if fid in revisions else fid: name for fid, name in links.items()}
+            revised.append((row, saved, record, links, changes))
+        except (KeyError, TypeError, ValueError, json.JSONDecodeError) as e:
+            out[row["source_id"]] = {"error": f"{type(e).__name__}: {e}"}
+    if not revised:
+        return out
+
+    arrays = {name: np.array([float(getattr(r[2], name)) for r in revised]) for name in numeric_fields(module.Inputs)}
+    try:
+        results = module.compute(arrays)
+        saved_outputs = module.saved_outputs(arrays, results)
+    except ValueError as e:
+        for row, *_rest in revised:
+            out[row["source_id"]] = {"error": f"ValueError: {e}"}
+        return out
+    er = np.broadcast_to(results["er_tco2e"], (len(revised),))
+    for i, ((row, saved, record, links, changes), new) in enumerate(zip(revised, saved_outputs)):
+        outputs = {k: v for k, v in json.loads(row["outputs_json"] or "{}").items() if k not in STALE_OUTPUTS}
+        outputs.update(new)
+        inputs = {**saved, "engine": dataclasses.asdict(record)}
+        if links:
+            inputs["engine_factors"] = links
+        out[row["source_id"]] = {"new_value": float(er[i]), "inputs": inputs, "outputs": outputs, "changes": changes}
+    return out
+
+
+def _evaluate_chunk(task: Tuple[str, List[Dict[str, Any]], Dict[str, Dict[str, Any]], Dict[str, float]]) -> List[Dict[str, Any]]:
+    """(source, rows, revisions, overrides) -> one result per row (module-level so it pickles)."""
+    source, rows, revisions, overrides = task
+    results: Dict[str, Dict[str, Any]] = {}
+    if source == "calc_runs":
+        for row in rows:
+            try:
+                r = _scope_run(json.loads(row["inputs_json"] or "{}"), json.loads(row["outputs_json"] or "{}"), revisions)
+            except (KeyError, TypeError, ValueError, UnitError, json.JSONDecodeError) as e:
+                r = {"error": f"{type(e).__name__}: {e}"}
+            if r is not None:
+                results[row["source_id"]] = r
+    else:
+        by_label: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_label.setdefault(row["label"] or "", []).append(row)
+        for label, group in by_label.items():
+            if label not in methodologies.METHODOLOGIES:
+                continue  # entries from elsewhere (e.g. imports) carry no recomputable inputs
+            results.update(_methodology_runs(label, group, revisions, overrides))
+    return [{**row, **results[row["source_id"]]} for row in rows if row["source_id"] in results]
+
+
+def _run_tasks(tasks: Iterator[Tuple], workers: int) -> Iterator[List[Dict[str, Any]]]:
+    """Results in task order; at most 2 × workers tasks in flight, so memory stays bounded."""
+    if workers <= 1:
+        for task in tasks:
+            yield _evaluate_chunk(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for task in tasks:
+            pending.append(pool.submit(_evaluate_chunk, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ------------------------------------------------------------
+# Job
+# ------------------------------------------------------------
+def _detail(changes: Dict[str, Any]) -> str:
+    parts = []
+    for name, change in changes.items():
+        if name == "line_items":
+            parts.append(f"{change[0]:,} line(s) re-factored")
+        else:
+            parts.append(f"{name} {change[0]:.6g} → {change[1]:.6g}")
+    return "; ".join(parts)
+
+
+def _write(job_id: str, source: str, rows: List[Dict[str, Any]], reason: str, actor: str, meta: Dict[str, Any]) -> None:
+    """One batch of changed runs: run updates + revision rows + one audit entry, one transaction."""
+    ts = now_iso()
+    revisions, updates = [], []
+    for r in rows:
+        inputs_json = json.dumps(r["inputs"], ensure_ascii=False)
+        outputs_json = json.dumps(r["outputs"], ensure_ascii=False)
+        revisions.append((
+            str(uuid.uuid4()), job_id, source, r["source_id"], r["project_id"], source, r["source_id"], reason,
+            r["old_value"], r["new_value"], json.dumps(r["changes"], ensure_ascii=False), r["outputs_json"],
+            inputs_json, outputs_json, actor, ts,
+        ))
+        if source == "calc_runs":
+            updates.append((r["baseline_tco2e"], r["project_tco2e"], r["new_value"], inputs_json, outputs_json, r["factor_source"], r["source_id"]))
+        else:
+            updates.append((r["new_value"], inputs_json, outputs_json, r["source_id"]))
+    with unit_of_work(actor=actor) as uow:
+        uow.executemany(REVISION_INSERT_SQL, revisions)
+        uow.executemany(UPDATE_SQL[source], updates)
+        uow.audit(
+            action="RECOMPUTE",
+            entity_type="calc_revision",
+            entity_id=job_id,
+            meta={**meta, "source_table": source, "runs": len(rows), "reason": reason},
+        )
+
+
+def recompute(
+    *,
+    factor_map: Optional[Dict[str, str]] = None,
+    overrides: Optional[Dict[str, float]] = None,
+    sources: Sequence[str] = SOURCES,
+    labels: Sequence[str] = (),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    project_id: Optional[str] = None,
+    reason: str = "",
+    actor: str = "recompute",
+    workers: Optional[int] = None,
+    dry_run: bool = False,
+    chunk_rows: int = CHUNK_ROWS,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Recompute every selected run under a factor revision and / or engine field overrides.
+
+    `labels` filter calc_runs on scope_label and emissions on methodology. Returns counts, the
+    job_id and `report` (DataFrame, REPORT_COLUMNS). With dry_run nothing is written.
+    """
+    factor_map, overrides = dict(factor_map or {}), dict(overrides or {})
+    if not factor_map and not overrides:
+        raise ValueError("Nothing to revise: give a factor revision and/or field overrides.")
+    unknown = set(sources) - set(SOURCES)
+    if unknown:
+        raise ValueError(f"Unknown source(s): {', '.join(sorted(unknown))}")
+    revisions = resolve_revisions(factor_map)
+    workers = max(1, workers if workers is not None else (os.cpu_count() or 1))
+    job_id = str(uuid.uuid4())
+    meta = {"factor_map": factor_map, "overrides": overrides}
+    stats = {"job_id": job_id, "selected": 0, "changed": 0, "unchanged": 0, "errors": 0, "written": 0}
+    report: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+
+    for source in sources:
+        if source == "calc_runs" and not factor_map:
+            continue  # overrides only apply to methodology engine fields
+        # Overrides can touch any ledger entry, so the factor prefilter only narrows a pure revision.
+        prefilter = source == "calc_runs" or not overrides
+        sql, params = select_sql(
+            source, factor_ids=list(factor_map) if prefilter else (), labels=labels,
+            since=since, until=until, project_id=project_id,
+        )
+
+        def tasks() -> Iterator[Tuple]:
+            for chunk in db_query_iter(sql, params, chunk_rows=chunk_rows):
+                stats["selected"] += len(chunk)
+                records = chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+                for i in range(0, len(records), TASK_ROWS):
+                    yield source, records[i:i + TASK_ROWS], revisions, overrides
+
+        batch: List[Dict[str, Any]] = []
+        for results in _run_tasks(tasks(), workers):
+            for r in results:
+                old = r["old_value"]
+                if "error" in r:
+                    status, new, detail = "error", None, r["error"]
+                else:
+                    new, detail = r["new_value"], _detail(r["changes"])
+                    moved = old is None or abs(new - old) > TOLERANCE
+                    status = "changed" if moved else "unchanged"
+                    if moved:
+                        batch.append(r)
+                stats["errors" if status == "error" else status] += 1
+                delta = new - old if new is not None and old is not None else None
+                report.append({
+                    "source_table": source, "source_id": r["source_id"], "project_id": r["project_id"],
+                    "label": r["label"], "record_date": r["record_date"], "old_value": old, "new_value": new,
+                    "delta": delta, "delta_pct": delta / old * 100.0 if delta is not None and old else None,
+                    "status": status, "detail": detail,
+                })
+            if len(batch) >= WRITE_ROWS:
+                if not dry_run:
+                    _write(job_id, source, batch, reason, actor, meta)
+                    stats["written"] += len(batch)
+                batch = []
+            if progress:
+                progress(dict(stats))
+        if batch and not dry_run:
+            _write(job_id, source, batch, reason, actor, meta)
+            stats["written"] += len(batch)
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["report"] = pd.DataFrame(report, columns=REPORT_COLUMNS)
+    return stats
+
+
+def revisions_for(source_table: str, source_id: str) -> pd.DataFrame:
+    """Revision history of one run, newest first."""
+    return db_query(
+        "SELECT * FROM calc_revisions WHERE source_table = ? AND source_id = ? ORDER BY revision_no DESC",
+        (source_table, source_id),
+        table="calc_revisions",
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from utils.schema import ensure_schema
+
+    def pair(text: str) -> Tuple[str, str]:
+        key, sep, value = text.partition("=")
+        if not sep or not key or not value:
+            raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {text!r}")
+        return key.strip(), value.strip()
+
+    parser = argparse.ArgumentParser(description="Recompute saved calc runs / ledger entries after a factor revision.")
+    parser.add_argument("--factor", type=pair, action="append", default=[], metavar="OLD_ID=NEW_ID")
+    parser.add_argument("--set", type=pair, action="append", default=[], metavar="FIELD=VALUE",
+                        help="engine field override for methodology entries, e.g. grid_ef=0.35")
+    parser.add_argument("--source", choices=SOURCES, action="append", default=None)
+    parser.add_argument("--label", action="append", default=[], help="methodology (emissions) or scope label (calc_runs)")
+    parser.add_argument("--since", default=None)
+    parser.add_argument("--until", default=None)
+    parser.add_argument("--project-id", default=None)
+    parser.add_argument("--reason", default="")
+    parser.add_argument("--actor", default="recompute-cli")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--report", default=None, help="diff report CSV")
+    args = parser.parse_args()
+
+    ensure_schema()
+    result = recompute(
+        factor_map=dict(args.factor),
+        overrides={k: float(v) for k, v in args.set},
+        sources=args.source or SOURCES,
+        labels=args.label,
+        since=args.since,
+        until=args.until,
+        project_id=args.project_id,
+        reason=args.reason,
+        actor=args.actor,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        progress=lambda s: print(f"{s['selected']:,} selected · {s['changed']:,} changed · {s['errors']:,} errors", flush=True),
+    )
+    report = result.pop("report")
+    print(json.dumps(result, indent=2))
+    if args.report:
+        report.to_csv(args.report, index=False)
+    elif not report.empty:
+        print(report.to_string(index=False, max_rows=50))
@@ -0,0 +1,139 @@
+"""
+utils/rollups.py
+
+Credit / sales rollups for the Credits & Sales summary.
+
+Key guarantees:
+- credit_rollups (project_id, vintage_year, currency) and credit_rollup_totals (project_id)
+  are maintained by triggers on credits and sales (installed by migration 6 in utils/schema.py),
+  inside the writing transaction.
+- Summary metrics are single-row primary-key lookups, independent of transaction count.
+- rebuild / verify recompute everything from the base tables, for repairs:
+      python -m utils.rollups verify
+      python -m utils.rollups rebuild
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from utils.db import db_query, get_reader
+
+
+SUMS = ("credits_issued", "credits_sold", "revenue", "n_issuances", "n_sales")
+
+# Verify tolerance: incremental REAL sums drift by rounding, not by whole credits.
+TOLERANCE = 1e-6
+
+
+# ------------------------------------------------------------
+# Rebuild / verify
+# ------------------------------------------------------------
+_EXPECTED_SQL = """
+    SELECT project_id, vintage_year, currency,
+           SUM(credits_issued) AS credits_issued, SUM(credits_sold) AS credits_sold, SUM(revenue) AS revenue,
+           SUM(n_issuances) AS n_issuances, SUM(n_sales) AS n_sales
+    FROM (
+        SELECT project_id, COALESCE(vintage_year, 0) AS vintage_year, '' AS currency,
+               COALESCE(credits_issued, 0) AS credits_issued, 0 AS credits_sold, 0 AS revenue,
+               1 AS n_issuances, 0 AS n_sales
+        FROM credits
+        UNION ALL
+        SELECT s.project_id, COALESCE(c.vintage_year, 0), COALESCE(s.currency, ''),
+               0, COALESCE(s.credits_sold, 0), COALESCE(s.credits_sold, 0) * COALESCE(s.price_per_credit, 0),
+               0, 1
+        FROM sales s LEFT JOIN credits c ON c.credit_id = s.credit_id
+    )
+    GROUP BY project_id, vintage_year, currency
+"""
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Recompute both rollup tables from credits/sales (run inside a writer transaction)."""
+    conn.execute("DELETE FROM credit_rollups;")
+    conn.execute("DELETE FROM credit_rollup_totals;")
+    conn.execute(f"INSERT INTO credit_rollups (project_id, vintage_year, currency, {', '.join(SUMS)}) {_EXPECTED_SQL};")
+    conn.execute(
+        f"""
+        INSERT INTO credit_rollup_totals (project_id, {", ".join(SUMS)})
+        SELECT project_id, {", ".join(f"SUM({c})" for c in SUMS)} FROM credit_rollups GROUP BY project_id;
+        """
+    )
+
+
+def _diff_sql(expected: str, stored: str, keys: List[str]) -> str:
+    on = ", ".join(keys)
+    diffs = " OR ".join(f"ABS(COALESCE(e.{c}, 0) - COALESCE(r.{c}, 0)) > {TOLERANCE}" for c in SUMS)
+    return f"""
+        SELECT {", ".join(f"k.{c}" for c in keys)},
+               {", ".join(f"e.{c} AS expected_{c}, r.{c} AS stored_{c}" for c in SUMS)}
+        FROM (SELECT {on} FROM ({expected}) UNION SELECT {on} FROM {stored}) k
+        LEFT JOIN ({expected}) e USING ({on})
+        LEFT JOIN {stored} r USING ({on})
+        WHERE e.project_id IS NULL OR r.project_id IS NULL OR {diffs}
+    """
+
+
+def verify_rollups() -> pd.DataFrame:
+    """Rollup rows that differ from a fresh recomputation (empty frame = consistent).
+
+    Project totals are reported with vintage_year / currency left empty.
+    """
+    totals = f"SELECT project_id, {', '.join(f'SUM({c}) AS {c}' for c in SUMS)} FROM ({_EXPECTED_SQL}) GROUP BY project_id"
+    keyed = db_query(_diff_sql(_EXPECTED_SQL, "credit_rollups", ["project_id", "vintage_year", "currency"]))
+    total = db_query(_diff_sql(totals, "credit_rollup_totals", ["project_id"]))
+    return pd.concat([keyed, total], ignore_index=True) if not total.empty else keyed
+
+
+# ------------------------------------------------------------
+# Reads
+# ------------------------------------------------------------
+def project_totals(project_id: str) -> Dict[str, Any]:
+    """Issued / sold / revenue / remaining for one project (one primary-key lookup)."""
+    row = get_reader().execute(
+        f"SELECT {', '.join(SUMS)} FROM credit_rollup_totals WHERE project_id = ?", (project_id,)
+    ).fetchone()
+    totals = dict(zip(SUMS, row)) if row else dict.fromkeys(SUMS, 0)
+    totals["remaining"] = totals["credits_issued"] - totals["credits_sold"]
+    return totals
+
+
+def project_rollups(project_id: str) -> pd.DataFrame:
+    """Per (vintage_year, currency) breakdown for one project; vintage 0 = sales not linked to an issuance."""
+    return db_query(
+        """
+        SELECT vintage_year, currency, credits_issued, credits_sold, revenue,
+               n_issuances, n_sales
+        FROM credit_rollups WHERE project_id = ?
+        ORDER BY vintage_year DESC, currency
+        """,
+        (project_id,),
+        table="credit_rollups",
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from utils.db import writer
+    from utils.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild the credit/sales rollup tables.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args()
+
+    ensure_schema()
+    if args.command == "rebuild":
+        with writer() as conn:
+            rebuild_rollups(conn)
+    bad = verify_rollups()
+    if bad.empty:
+        print("credit rollups consistent.")
+    else:
+        print(bad.to_string(index=False))
+        print(f"{len(bad)} rollup key(s) out of sync — run `python -m utils.rollups rebuild`.")
+        sys.exit(1)
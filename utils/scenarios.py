@@ -0,0 +1,171 @@
+"""
+utils/scenarios.py
+
+Vectorized parameter sweeps and one-at-a-time sensitivity for the methodology models (no
+Streamlit here).
+
+Key guarantees:
+- A sweep is a full-factorial grid over a few inputs (each an evenly spaced range); every other
+  input stays at its base value. The grid is evaluated with the same registered NumPy models as
+  the Monte Carlo (utils.uncertainty), in blocks of BLOCK_ROWS points, so 10^6 combinations cost
+  one pass of array arithmetic and bounded memory instead of 10^6 widget reruns.
+- Results are memoised per canonical request in utils.calc_cache (memory tier only: grids can be
+  large), so Streamlit reruns and other sessions asking for the same sweep do not re-evaluate.
+- tornado() swings each input across its range with the others at base; surface() slices two
+  axes out of a sweep with the remaining axes at the grid point nearest the base.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils import calc_cache
+from utils.uncertainty import get_model
+
+
+MAX_POINTS = 2_000_000
+BLOCK_ROWS = 1 << 16
+MAX_STEPS = 1_000
+
+Range = Tuple[float, float, int]  # (low, high, steps)
+
+
+def _canonical(model: str, base: Dict[str, float], ranges: Dict[str, Range]) -> str:
+    return json.dumps(
+        {
+            "model": model,
+            "base": {k: float(v) for k, v in base.items()},
+            "ranges": {k: [float(lo), float(hi), int(n)] for k, (lo, hi, n) in ranges.items()},
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+
+def _axes(ranges: Dict[str, Range]) -> Dict[str, np.ndarray]:
+    axes = {}
+    for name, (lo, hi, steps) in ranges.items():
+        if not 1 <= int(steps) <= MAX_STEPS:
+            raise ValueError(f"{name}: steps must be between 1 and {MAX_STEPS}")
+        axes[name] = np.linspace(float(lo), float(hi), int(steps)) if int(steps) > 1 else np.array([float(lo)])
+    return axes
+
+
+def _evaluate(model: str, base: Dict[str, float], columns: Dict[str, np.ndarray], n: int) -> Dict[str, np.ndarray]:
+    """Run `model` on n points: swept inputs from `columns`, the rest broadcast from `base`."""
+    inputs = {k: np.full(n, float(v)) for k, v in base.items()}
+    inputs.update(columns)
+    return {k: np.broadcast_to(np.asarray(v, dtype=np.float64), (n,)) for k, v in get_model(model)(inputs).items()}
+
+
+def _sweep(key: str) -> Dict[str, Any]:
+    req = json.loads(key)
+    axes = _axes({k: tuple(v) for k, v in req["ranges"].items()})
+    names = list(axes)
+    shape = tuple(len(axes[k]) for k in names)
+    total = int(np.prod(shape)) if shape else 1
+    if total > MAX_POINTS:
+        raise ValueError(f"Grid has {total:,} points; the limit is {MAX_POINTS:,}.")
+
+    t0 = time.perf_counter()
+    outputs: Dict[str, np.ndarray] = {}
+    for start in range(0, total, BLOCK_ROWS):
+        flat = np.arange(start, min(start + BLOCK_ROWS, total))
+        idx = np.unravel_index(flat, shape) if shape else ()
+        block = _evaluate(req["model"], req["base"], {k: axes[k][i] for k, i in zip(names, idx)}, len(flat))
+        for k, v in block.items():
+            if k not in outputs:
+                outputs[k] = np.empty(total)
+            outputs[k][start:start + len(flat)] = v
+    for v in outputs.values():
+        v.flags.writeable = False
+    return {
+        "model": req["model"],
+        "axes": axes,
+        "shape": shape,
+        "points": total,
+        "seconds": time.perf_counter() - t0,
+        "outputs": {k: v.reshape(shape) for k, v in outputs.items()},
+    }
+
+
+def sweep(model: str, base: Dict[str, float], ranges: Dict[str, Range]) -> Dict[str, Any]:
+    """Evaluate `model` over the full grid of `ranges` (name -> (low, high, steps)).
+
+    Returns {"axes": {name: values}, "shape", "points", "seconds", "outputs": {name: ndarray of
+    `shape`}}; axes are in name order and output arrays are read-only (shared with the cache).
+    """
+    unknown = [k for k in ranges if k not in base]
+    if unknown:
+        raise ValueError(f"Swept input(s) without a base value: {', '.join(unknown)}")
+    key = _canonical(model, base, ranges)
+    return calc_cache.get_or_compute("scenarios.sweep", key, lambda: _sweep(key), disk=False, shared=True)
+
+
+def grid_summary(result: Dict[str, Any], output: str) -> Dict[str, float]:
+    y = result["outputs"][output].ravel()
+    p5, p50, p95 = np.percentile(y, [5.0, 50.0, 95.0])
+    return {
+        "points": int(result["points"]),
+        "min": float(y.min()),
+        "p5": float(p5),
+        "p50": float(p50),
+        "p95": float(p95),
+        "max": float(y.max()),
+        "share_zero": float(np.mean(y == 0.0)),
+    }
+
+
+def tornado(model: str, base: Dict[str, float], ranges: Dict[str, Range], output: str) -> pd.DataFrame:
+    """One-at-a-time swings of `output`: each input at its low and high end, the others at base."""
+    names = list(ranges)
+    n = 2 * len(names) + 1
+    columns = {k: np.full(n, float(base[k])) for k in names}
+    for i, k in enumerate(names):
+        columns[k][2 * i] = float(ranges[k][0])
+        columns[k][2 * i + 1] = float(ranges[k][1])
+    y = _evaluate(model, base, columns, n)[output]
+    rows = [
+        {
+            "input": k,
+            "low_value": float(ranges[k][0]),
+            "high_value": float(ranges[k][1]),
+            "output_at_low": float(y[2 * i]),
+            "output_at_high": float(y[2 * i + 1]),
+            "base_output": float(y[-1]),
+        }
+        for i, k in enumerate(names)
+    ]
+    df = pd.DataFrame(rows, columns=["input", "low_value", "high_value", "output_at_low", "output_at_high", "base_output"])
+    df["swing"] = (df["output_at_high"] - df["output_at_low"]).abs()
+    return df.sort_values("swing", ascending=False, ignore_index=True)
+
+
+def surface(result: Dict[str, Any], x: str, y: str, output: str, base: Dict[str, float],
+            max_side: Optional[int] = None) -> pd.DataFrame:
+    """Long-form (x, y, output) slice of a sweep; other axes are held at the point nearest base.
+
+    `max_side` thins each of the two axes to at most that many points (for charting).
+    """
+    if x == y:
+        raise ValueError("Pick two different axes.")
+    axes = result["axes"]
+    names = list(axes)
+    index: List[Any] = []
+    for k in names:
+        if k in (x, y):
+            step = max(1, -(-len(axes[k]) // max_side)) if max_side else 1
+            index.append(slice(None, None, step))
+        else:
+            index.append(int(np.abs(axes[k] - float(base[k])).argmin()))
+    z = result["outputs"][output][tuple(index)]
+    if names.index(x) > names.index(y):
+        z = z.T
+    xs, ys = axes[x][index[names.index(x)]], axes[y][index[names.index(y)]]
+    xx, yy = np.meshgrid(xs, ys, indexing="ij")
+    return pd.DataFrame({x: xx.ravel(), y: yy.ravel(), output: np.asarray(z).ravel()})
@@ -0,0 +1,722 @@
+"""
+utils/schema.py
+
+Versioned schema migrations for the registry database.
+
+Key guarantees:
+- The schema version lives in PRAGMA user_version; each migration runs exactly once per DB.
+- ensure_schema() is cheap to call from every page: it touches the DB once per process.
+- One definition per table (pages used to declare `projects` / `audit_logs` differently).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from utils.audit import INSERT_SQL as AUDIT_INSERT_SQL, make_row, now_iso
+from utils.db import get_reader, writer
+from utils.tables import TABLES
+
+
+def _columns(name: str, only: Optional[Sequence[str]] = None) -> List[Tuple[str, str]]:
+    columns = TABLES[name][0]
+    return columns if only is None else [(col, decl) for col, decl in columns if col in only]
+
+
+def _create_table_sql(name: str, only: Optional[Sequence[str]] = None) -> str:
+    body = [f"{col} {decl}" for col, decl in _columns(name, only)] + TABLES[name][1]
+    return f"CREATE TABLE IF NOT EXISTS {name} (\n    " + ",\n    ".join(body) + "\n);"
+
+
+def _alter_decl(decl: str) -> str:
+    # ALTER TABLE ADD COLUMN cannot add PRIMARY KEY / UNIQUE, nor NOT NULL without a default.
+    for token in ("PRIMARY KEY", "UNIQUE", "NOT NULL"):
+        decl = decl.replace(token, "")
+    return " ".join(decl.split())
+
+
+def _reconcile_columns(conn: sqlite3.Connection, name: str, only: Optional[Sequence[str]] = None) -> None:
+    """Add any canonical column (of `only`, when given) that an older definition left out."""
+    existing = {r[1] for r in conn.execute(f"PRAGMA table_info({name});").fetchall()}
+    for col, decl in _columns(name, only):
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {name} ADD COLUMN {col} {_alter_decl(decl)};")
+
+
+# ------------------------------------------------------------
+# Migrations
+# ------------------------------------------------------------
+# Frozen: the tables and columns migration 1 creates. Later tables / columns belong to their own
+# migrations, so version 1 means the same schema on every DB however TABLES grows.
+BASELINE_TABLES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("projects", (
+        "project_id", "project_code", "project_name", "owner_org", "country", "region", "sector",
+        "methodology", "standard", "baseline_year", "start_date", "end_date", "status", "description",
+        "created_at", "updated_at",
+    )),
+    ("project_foundations", (
+        "project_id", "boundary_summary", "baseline_summary", "intervention_summary", "key_assumptions",
+        "data_sources", "uncertainty_notes", "evidence_checklist", "updated_at",
+    )),
+    ("credits", (
+        "credit_id", "project_id", "vintage_year", "credits_issued", "issuance_date", "registry_program",
+        "serial_range", "notes", "created_at", "updated_at",
+    )),
+    ("sales", (
+        "sale_id", "project_id", "credit_id", "sale_date", "buyer", "credits_sold", "price_per_credit",
+        "currency", "contract_ref", "notes", "created_at", "updated_at",
+    )),
+    ("audit_logs", (
+        "audit_id", "timestamp", "actor", "action", "entity_type", "entity_id", "project_id",
+        "before_json", "after_json", "meta_json",
+    )),
+    ("calc_runs", (
+        "calc_id", "project_id", "calc_type", "calc_name", "scope_label", "period_start", "period_end",
+        "baseline_tco2e", "project_tco2e", "reduction_tco2e", "inputs_json", "outputs_json",
+        "factor_source", "status", "actor", "created_at",
+    )),
+    ("emissions", (
+        "emission_id", "project_id", "methodology", "record_date", "quantity_tco2e", "notes",
+        "inputs_json", "outputs_json", "created_at",
+    )),
+)
+
+
+def _m001_baseline(conn: sqlite3.Connection) -> None:
+    for name, columns in BASELINE_TABLES:
+        conn.execute(_create_table_sql(name, columns))
+        _reconcile_columns(conn, name, columns)
+
+    # Methodologies used to create projects with status 'active'; Registry uses 'Active'/'Archived'.
+    conn.execute("UPDATE projects SET status = 'Active' WHERE status IS NULL OR status = 'active';")
+    conn.execute("UPDATE projects SET status = 'Archived' WHERE status = 'archived';")
+
+
+def _m002_hot_path_indexes(conn: sqlite3.Connection) -> None:
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_projects_updated ON projects(updated_at);",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_timestamp ON audit_logs(timestamp);",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_project_ts ON audit_logs(project_id, timestamp);",
+        "CREATE INDEX IF NOT EXISTS ix_credits_project_vintage ON credits(project_id, vintage_year);",
+        "CREATE INDEX IF NOT EXISTS ix_sales_project_date ON sales(project_id, sale_date);",
+        "CREATE INDEX IF NOT EXISTS ix_calc_runs_project_created ON calc_runs(project_id, created_at);",
+        "CREATE INDEX IF NOT EXISTS ix_emissions_project_date ON emissions(project_id, record_date);",
+    ):
+        conn.execute(ddl)
+
+
+def _m003_audit_keyset_indexes(conn: sqlite3.Connection) -> None:
+    # Audit Trail pages on (timestamp, audit_id); every filter gets an index ending in that key,
+    # so page N is an index range seek, same cost as page 1.
+    for ddl in (
+        "DROP INDEX IF EXISTS ix_audit_logs_timestamp;",
+        "DROP INDEX IF EXISTS ix_audit_logs_project_ts;",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_ts_id ON audit_logs(timestamp, audit_id);",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_project_ts_id ON audit_logs(project_id, timestamp, audit_id);",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_actor_ts_id ON audit_logs(actor, timestamp, audit_id);",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_action_ts_id ON audit_logs(action, timestamp, audit_id);",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_entity_ts_id ON audit_logs(entity_type, entity_id, timestamp, audit_id);",
+    ):
+        conn.execute(ddl)
+
+
+def _m004_audit_fts(conn: sqlite3.Connection) -> None:
+    # External-content FTS5 index over the JSON payloads, kept in sync by triggers.
+    # '-' and '_' are token characters so serial numbers (e.g. VCS-1234-0001) stay one token.
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS audit_fts USING fts5(
+                before_json, after_json, meta_json,
+                content='audit_logs', content_rowid='rowid',
+                tokenize="unicode61 tokenchars '-_'"
+            );
+            """
+        )
+    except sqlite3.OperationalError:
+        return  # SQLite built without FTS5: search falls back to LIKE (see utils/audit.py)
+
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS audit_logs_fts_ai AFTER INSERT ON audit_logs BEGIN
+            INSERT INTO audit_fts(rowid, before_json, after_json, meta_json)
+            VALUES (new.rowid, new.before_json, new.after_json, new.meta_json);
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS audit_logs_fts_ad AFTER DELETE ON audit_logs BEGIN
+            INSERT INTO audit_fts(audit_fts, rowid, before_json, after_json, meta_json)
+            VALUES ('delete', old.rowid, old.before_json, old.after_json, old.meta_json);
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS audit_logs_fts_au AFTER UPDATE ON audit_logs BEGIN
+            INSERT INTO audit_fts(audit_fts, rowid, before_json, after_json, meta_json)
+            VALUES ('delete', old.rowid, old.before_json, old.after_json, old.meta_json);
+            INSERT INTO audit_fts(rowid, before_json, after_json, meta_json)
+            VALUES (new.rowid, new.before_json, new.after_json, new.meta_json);
+        END;
+        """
+    )
+    conn.execute("INSERT INTO audit_fts(audit_fts) VALUES ('rebuild');")  # backfill existing rows
+
+
+def _m005_project_search_indexes(conn: sqlite3.Connection) -> None:
+    # Case-insensitive prefix search on code / name (utils/projects.py): LIKE 'abc%' becomes a range seek.
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_projects_code_nocase ON projects(project_code COLLATE NOCASE);",
+        "CREATE INDEX IF NOT EXISTS ix_projects_name_nocase ON projects(project_name COLLATE NOCASE);",
+    ):
+        conn.execute(ddl)
+
+
+# Trigger DDL and backfill SQL are frozen per migration, as installed: changing a trigger is a new
+# migration (DROP TRIGGER + CREATE). utils/rollups.py keeps the matching rebuild / verify SQL.
+_M006_SUMS = ("credits_issued", "credits_sold", "revenue", "n_issuances", "n_sales")
+# Each sum resets to exactly 0 when its row count does, so REAL rounding never leaves dust behind.
+_M006_COUNTER = {"credits_issued": "n_issuances", "credits_sold": "n_sales", "revenue": "n_sales"}
+
+
+def _m006_accumulate() -> str:
+    sets = []
+    for c in _M006_SUMS:
+        n = _M006_COUNTER.get(c)
+        if n:
+            sets.append(f"{c} = CASE WHEN {n} + excluded.{n} = 0 THEN 0 ELSE {c} + excluded.{c} END")
+        else:
+            sets.append(f"{c} = {c} + excluded.{c}")
+    return ", ".join(sets)
+
+
+def _m006_upsert(source: str) -> str:
+    """Add delta row(s) (VALUES or SELECT) onto credit_rollups."""
+    return f"""
+        INSERT INTO credit_rollups (project_id, vintage_year, currency, {", ".join(_M006_SUMS)})
+        {source}
+        ON CONFLICT(project_id, vintage_year, currency) DO UPDATE SET {_m006_accumulate()};
+    """
+
+
+def _m006_upsert_total(source: str) -> str:
+    return f"""
+        INSERT INTO credit_rollup_totals (project_id, {", ".join(_M006_SUMS)})
+        {source}
+        ON CONFLICT(project_id) DO UPDATE SET {_m006_accumulate()};
+    """
+
+
+def _m006_prune(ref: str) -> str:
+    # Drop keys that no longer have any rows behind them (PK-prefix seek on the project).
+    return f"""
+        DELETE FROM credit_rollups WHERE project_id = {ref}.project_id AND n_issuances = 0 AND n_sales = 0;
+        DELETE FROM credit_rollup_totals WHERE project_id = {ref}.project_id AND n_issuances = 0 AND n_sales = 0;
+    """
+
+
+def _m006_credit_delta(ref: str, sign: int) -> str:
+    issued = f"{sign} * COALESCE({ref}.credits_issued, 0)"
+    return (
+        _m006_upsert(f"VALUES ({ref}.project_id, COALESCE({ref}.vintage_year, 0), '', {issued}, 0, 0, {sign}, 0)")
+        + _m006_upsert_total(f"VALUES ({ref}.project_id, {issued}, 0, 0, {sign}, 0)")
+    )
+
+
+def _m006_sale_delta(ref: str, sign: int) -> str:
+    vintage = f"COALESCE((SELECT vintage_year FROM credits WHERE credit_id = {ref}.credit_id), 0)"
+    sold = f"{sign} * COALESCE({ref}.credits_sold, 0)"
+    revenue = f"{sign} * COALESCE({ref}.credits_sold, 0) * COALESCE({ref}.price_per_credit, 0)"
+    return (
+        _m006_upsert(f"VALUES ({ref}.project_id, {vintage}, COALESCE({ref}.currency, ''), 0, {sold}, {revenue}, 0, {sign})")
+        + _m006_upsert_total(f"VALUES ({ref}.project_id, 0, {sold}, {revenue}, 0, {sign})")
+    )
+
+
+def _m006_linked_sales_delta(credit: str, vintage: str, sign: int) -> str:
+    # Sales linked to an issuance are bucketed under its vintage; move them when it changes.
+    return _m006_upsert(
+        f"""
+        SELECT project_id, {vintage}, COALESCE(currency, ''), 0,
+               {sign} * SUM(COALESCE(credits_sold, 0)),
+               {sign} * SUM(COALESCE(credits_sold, 0) * COALESCE(price_per_credit, 0)),
+               0, {sign} * COUNT(*)
+        FROM sales WHERE credit_id = {credit}.credit_id
+        GROUP BY project_id, COALESCE(currency, '')
+        """
+    )
+
+
+_M006_TRIGGERS: List[str] = [
+    f"CREATE TRIGGER IF NOT EXISTS credits_rollup_ai AFTER INSERT ON credits BEGIN {_m006_credit_delta('new', 1)} END;",
+    f"CREATE TRIGGER IF NOT EXISTS credits_rollup_ad AFTER DELETE ON credits BEGIN {_m006_credit_delta('old', -1)}{_m006_prune('old')} END;",
+    f"""CREATE TRIGGER IF NOT EXISTS credits_rollup_au AFTER UPDATE OF project_id, vintage_year, credits_issued ON credits
+        BEGIN {_m006_credit_delta('old', -1)}{_m006_credit_delta('new', 1)}{_m006_prune('old')} END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS credits_rollup_au_vintage AFTER UPDATE OF vintage_year ON credits
+        WHEN old.vintage_year IS NOT new.vintage_year
+        BEGIN {_m006_linked_sales_delta('old', 'COALESCE(old.vintage_year, 0)', -1)}{_m006_linked_sales_delta('new', 'COALESCE(new.vintage_year, 0)', 1)}{_m006_prune('old')} END;""",
+    f"CREATE TRIGGER IF NOT EXISTS sales_rollup_ai AFTER INSERT ON sales BEGIN {_m006_sale_delta('new', 1)} END;",
+    f"CREATE TRIGGER IF NOT EXISTS sales_rollup_ad AFTER DELETE ON sales BEGIN {_m006_sale_delta('old', -1)}{_m006_prune('old')} END;",
+    f"""CREATE TRIGGER IF NOT EXISTS sales_rollup_au
+        AFTER UPDATE OF project_id, credit_id, credits_sold, price_per_credit, currency ON sales
+        BEGIN {_m006_sale_delta('old', -1)}{_m006_sale_delta('new', 1)}{_m006_prune('old')} END;""",
+]
+
+_M006_BACKFILL = f"""
+    INSERT INTO credit_rollups (project_id, vintage_year, currency, {", ".join(_M006_SUMS)})
+    SELECT project_id, vintage_year, currency, {", ".join(f"SUM({c})" for c in _M006_SUMS)}
+    FROM (
+        SELECT project_id, COALESCE(vintage_year, 0) AS vintage_year, '' AS currency,
+               COALESCE(credits_issued, 0) AS credits_issued, 0 AS credits_sold, 0 AS revenue,
+               1 AS n_issuances, 0 AS n_sales
+        FROM credits
+        UNION ALL
+        SELECT s.project_id, COALESCE(c.vintage_year, 0), COALESCE(s.currency, ''),
+               0, COALESCE(s.credits_sold, 0), COALESCE(s.credits_sold, 0) * COALESCE(s.price_per_credit, 0),
+               0, 1
+        FROM sales s LEFT JOIN credits c ON c.credit_id = s.credit_id
+    )
+    GROUP BY project_id, vintage_year, currency;
+"""
+
+
+def _m006_credit_rollups(conn: sqlite3.Connection) -> None:
+    # Trigger-maintained issued / sold / revenue rollups for the Credits & Sales summary.
+    for ddl in (
+        """
+        CREATE TABLE IF NOT EXISTS credit_rollups (
+            project_id TEXT NOT NULL,
+            vintage_year INTEGER NOT NULL,
+            currency TEXT NOT NULL,
+            credits_issued REAL NOT NULL DEFAULT 0,
+            credits_sold REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            n_issuances INTEGER NOT NULL DEFAULT 0,
+            n_sales INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(project_id, vintage_year, currency)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS credit_rollup_totals (
+            project_id TEXT PRIMARY KEY,
+            credits_issued REAL NOT NULL DEFAULT 0,
+            credits_sold REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            n_issuances INTEGER NOT NULL DEFAULT 0,
+            n_sales INTEGER NOT NULL DEFAULT 0
+        );
+        """,
+        *_M006_TRIGGERS,
+        # Backfill from existing credits / sales.
+        "DELETE FROM credit_rollups;",
+        "DELETE FROM credit_rollup_totals;",
+        _M006_BACKFILL,
+        f"""
+        INSERT INTO credit_rollup_totals (project_id, {", ".join(_M006_SUMS)})
+        SELECT project_id, {", ".join(f"SUM({c})" for c in _M006_SUMS)} FROM credit_rollups GROUP BY project_id;
+        """,
+    ):
+        conn.execute(ddl)
+
+
+def _m007_ingest_natural_keys(conn: sqlite3.Connection) -> None:
+    # Bulk-ingested issuances / retirements upsert on (project_id, source_ref); rows entered
+    # through the forms have no source_ref and are not constrained.
+    for name in ("credits", "sales"):
+        if "source_ref" not in {r[1] for r in conn.execute(f"PRAGMA table_info({name});").fetchall()}:
+            conn.execute(f"ALTER TABLE {name} ADD COLUMN source_ref TEXT;")
+    for ddl in (
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_credits_source_ref ON credits(project_id, source_ref) WHERE source_ref IS NOT NULL;",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_sales_source_ref ON sales(project_id, source_ref) WHERE source_ref IS NOT NULL;",
+    ):
+        conn.execute(ddl)
+
+
+# The Methodologies page defaults as shipped by migration 8. Ids are the uuid5 keys
+# utils/factors.factor_id() gives dataset "demo-defaults" 2024.1, written out so the seed never drifts.
+_M008_DEMO_DATASET_ID = "eca24cc7-8bc3-574c-bdaa-45580081b6bf"
+_M008_DEMO_FACTORS: Tuple[Tuple[str, str, str, float, str], ...] = (
+    ("7cde5ea7-45cd-5ddd-83b9-4f15cc6397ff", "Petrol", "tank-to-wheel", 2.31, "kgCO2e"),
+    ("a615240b-dc2c-58a5-828d-eb74f5f6253d", "Diesel", "tank-to-wheel", 2.68, "kgCO2e"),
+    ("6339ccd8-12f0-5a98-9cfa-b737bfcbf057", "LPG", "tank-to-wheel", 1.51, "kgCO2e"),
+    ("831bbf0e-6ba2-5522-806e-4180f9fdf8b4", "Petrol", "well-to-tank", 0.52, "kgCO2e"),
+    ("fbd2111d-be3b-5cfa-8a28-d0a4532d24a7", "Diesel", "well-to-tank", 0.58, "kgCO2e"),
+    ("468b47b9-334b-5190-97f7-dbe043a0af8f", "LPG", "well-to-tank", 0.21, "kgCO2e"),
+    ("a35b3c35-578a-519c-8355-bc58c46e5ae4", "Petrol", "net calorific value", 34.2, "MJ"),
+    ("bf5e7fc6-e8dc-51a2-9647-6a1538ece97e", "Diesel", "net calorific value", 38.6, "MJ"),
+    ("056500ee-6f82-547f-aa6b-af43b709c493", "LPG", "net calorific value", 26.8, "MJ"),
+)
+
+
+def _m008_emission_factor_library(conn: sqlite3.Connection) -> None:
+    # Versioned EF library; lookups filter on the composite key, datasets load/replace in bulk.
+    for ddl in (
+        """
+        CREATE TABLE IF NOT EXISTS ef_datasets (
+            dataset_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            version TEXT NOT NULL,
+            source TEXT,
+            n_factors INTEGER NOT NULL DEFAULT 0,
+            loaded_by TEXT,
+            loaded_at TEXT NOT NULL,
+            UNIQUE(name, version)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS emission_factors (
+            factor_id TEXT PRIMARY KEY,
+            dataset_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            geography TEXT NOT NULL DEFAULT '',
+            year INTEGER NOT NULL DEFAULT 0,
+            version TEXT NOT NULL,
+            basis TEXT NOT NULL DEFAULT '',
+            factor_value REAL NOT NULL,
+            factor_unit TEXT NOT NULL DEFAULT 'kgCO2e',
+            source TEXT,
+            notes TEXT,
+            FOREIGN KEY(dataset_id) REFERENCES ef_datasets(dataset_id) ON DELETE CASCADE
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_emission_factors_key ON emission_factors(category, unit, geography, year, version, basis);",
+        "CREATE INDEX IF NOT EXISTS ix_emission_factors_dataset ON emission_factors(dataset_id);",
+    ):
+        conn.execute(ddl)
+
+    # Seed the demo dataset (no-op if a later load already created it).
+    if conn.execute("SELECT 1 FROM ef_datasets WHERE dataset_id = ?", (_M008_DEMO_DATASET_ID,)).fetchone():
+        return
+    conn.execute(
+        """
+        INSERT INTO ef_datasets (dataset_id, name, version, source, n_factors, loaded_by, loaded_at)
+        VALUES (?, 'demo-defaults', '2024.1', 'Methodology Tools demo placeholders (not for crediting)', ?, 'migration', ?)
+        """,
+        (_M008_DEMO_DATASET_ID, len(_M008_DEMO_FACTORS), now_iso()),
+    )
+    conn.executemany(
+        """
+        INSERT INTO emission_factors (
+            factor_id, dataset_id, category, unit, geography, year, version, basis,
+            factor_value, factor_unit, source, notes
+        ) VALUES (?, ?, ?, 'L', '', 0, '2024.1', ?, ?, ?, NULL, NULL)
+        """,
+        [(fid, _M008_DEMO_DATASET_ID, category, basis, value, unit) for fid, category, basis, value, unit in _M008_DEMO_FACTORS],
+    )
+
+
+def _m009_calc_revisions(conn: sqlite3.Connection) -> None:
+    # Revision history for factor-driven recomputes; the UNIQUE key serves per-run lookups.
+    for ddl in (
+        """
+        CREATE TABLE IF NOT EXISTS calc_revisions (
+            revision_id TEXT PRIMARY KEY,
+            job_id TEXT NOT NULL,
+            source_table TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            project_id TEXT,
+            revision_no INTEGER NOT NULL,
+            reason TEXT,
+            old_value REAL,
+            new_value REAL,
+            changes_json TEXT,
+            previous_outputs_json TEXT,
+            inputs_json TEXT,
+            outputs_json TEXT,
+            actor TEXT,
+            created_at TEXT NOT NULL,
+            UNIQUE(source_table, source_id, revision_no)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_calc_revisions_job ON calc_revisions(job_id);",
+    ):
+        conn.execute(ddl)
+
+
+def _m010_calc_cache(conn: sqlite3.Connection) -> None:
+    # Disk tier of the calculation cache; trimmed oldest-first, cleared per namespace.
+    for ddl in (
+        """
+        CREATE TABLE IF NOT EXISTS calc_cache (
+            cache_key TEXT PRIMARY KEY,
+            namespace TEXT NOT NULL,
+            value BLOB NOT NULL,
+            n_bytes INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_calc_cache_created ON calc_cache(created_at);",
+        "CREATE INDEX IF NOT EXISTS ix_calc_cache_namespace ON calc_cache(namespace);",
+    ):
+        conn.execute(ddl)
+
+
+# Bucketing triggers + backfill, frozen as for migration 6; utils/timeseries.py keeps the
+# matching rebuild / verify SQL.
+_M011_SUMS = ("baseline_tco2e", "project_tco2e", "tco2e")
+_M011_KEYS = ("project_id", "month", "source_table", "scope_label", "methodology")
+_M011_TOTAL_KEYS = _M011_KEYS[1:]
+
+
+def _m011_month_id(jd: str) -> str:
+    return f"(CAST(strftime('%Y', {jd}) AS INTEGER) * 12 + CAST(strftime('%m', {jd}) AS INTEGER) - 1)"
+
+
+def _m011_calc_rows(ref: Optional[str] = None) -> str:
+    p = f"{ref}." if ref else ""
+    return f"""
+        SELECT COALESCE({p}project_id, '') AS project_id, 'calc_runs' AS source_table,
+               COALESCE({p}scope_label, '') AS scope_label, '' AS methodology,
+               {p}period_start AS period_start, {p}period_end AS period_end, {p}created_at AS created_at,
+               COALESCE({p}baseline_tco2e, 0) AS baseline_tco2e, COALESCE({p}project_tco2e, 0) AS project_tco2e,
+               COALESCE({p}reduction_tco2e, 0) AS tco2e
+        {"" if ref else "FROM calc_runs"} WHERE COALESCE({p}status, '') != 'draft'
+    """
+
+
+def _m011_emission_rows(ref: Optional[str] = None) -> str:
+    p = f"{ref}." if ref else ""
+    return f"""
+        SELECT COALESCE({p}project_id, '') AS project_id, 'emissions' AS source_table,
+               '' AS scope_label, COALESCE({p}methodology, '') AS methodology,
+               {p}record_date AS period_start, NULL AS period_end, {p}created_at AS created_at,
+               0 AS baseline_tco2e, 0 AS project_tco2e, COALESCE({p}quantity_tco2e, 0) AS tco2e
+        {"" if ref else "FROM emissions"}
+    """
+
+
+def _m011_buckets(rows: str, sign: int = 1) -> str:
+    """Source rows -> (keys, sums, n_records) per overlapped month; shares are days in month / days in period."""
+    share = "(MIN(r.e, c.end_jd) - MAX(r.s, c.start_jd) + 1.0) / (r.e - r.s + 1.0)"
+    return f"""
+        SELECT r.project_id, c.month, r.source_table, r.scope_label, r.methodology,
+               {", ".join(f"{sign} * r.{c} * {share} AS {c}" for c in _M011_SUMS)}, {sign} AS n_records
+        FROM (
+            SELECT x.*, MAX(COALESCE(julianday(date(x.period_end)), x.s), x.s) AS e
+            FROM (
+                SELECT b.*, COALESCE(julianday(date(b.period_start)), julianday(date(b.created_at))) AS s
+                FROM ({rows}) b
+            ) x
+            LIMIT -1  -- keeps r materialised: flattening would re-parse the dates per use
+        ) r
+        JOIN calendar_months c ON c.month_id BETWEEN {_m011_month_id("r.s")} AND {_m011_month_id("r.e")}
+        WHERE r.s IS NOT NULL
+    """
+
+
+def _m011_accumulate() -> str:
+    # Sums reset to exactly 0 with the record count, so REAL rounding never leaves dust behind.
+    sets = [f"{c} = CASE WHEN n_records + excluded.n_records = 0 THEN 0 ELSE {c} + excluded.{c} END" for c in _M011_SUMS]
+    return ", ".join(sets + ["n_records = n_records + excluded.n_records"])
+
+
+def _m011_delta(rows: str, sign: int) -> str:
+    buckets = _m011_buckets(rows, sign)
+    return f"""
+        INSERT INTO emission_monthly ({", ".join(_M011_KEYS)}, {", ".join(_M011_SUMS)}, n_records)
+        {buckets}
+        ON CONFLICT({", ".join(_M011_KEYS)}) DO UPDATE SET {_m011_accumulate()};
+        INSERT INTO emission_monthly_totals ({", ".join(_M011_TOTAL_KEYS)}, {", ".join(_M011_SUMS)}, n_records)
+        SELECT {", ".join(_M011_TOTAL_KEYS)}, {", ".join(_M011_SUMS)}, n_records FROM ({buckets}) WHERE 1
+        ON CONFLICT({", ".join(_M011_TOTAL_KEYS)}) DO UPDATE SET {_m011_accumulate()};
+    """
+
+
+def _m011_prune(rows: str) -> str:
+    # Drop keys with no runs left behind them: a PK-prefix seek on the project, and only the
+    # months the old row touched in the portfolio table.
+    return f"""
+        DELETE FROM emission_monthly
+        WHERE project_id = (SELECT project_id FROM ({rows})) AND n_records = 0;
+        DELETE FROM emission_monthly_totals
+        WHERE month IN (SELECT month FROM ({_m011_buckets(rows)})) AND n_records = 0;
+    """
+
+
+def _m011_triggers(table: str, rows, columns: Sequence[str]) -> List[str]:
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_series_ai AFTER INSERT ON {table} BEGIN {_m011_delta(rows('new'), 1)} END;",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_series_ad AFTER DELETE ON {table}
+            BEGIN {_m011_delta(rows('old'), -1)}{_m011_prune(rows('old'))} END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_series_au AFTER UPDATE OF {", ".join(columns)} ON {table}
+            BEGIN {_m011_delta(rows('old'), -1)}{_m011_delta(rows('new'), 1)}{_m011_prune(rows('old'))} END;""",
+    ]
+
+
+_M011_TRIGGERS: List[str] = _m011_triggers(
+    "calc_runs",
+    _m011_calc_rows,
+    ("project_id", "scope_label", "period_start", "period_end", "baseline_tco2e", "project_tco2e",
+     "reduction_tco2e", "status", "created_at"),
+) + _m011_triggers("emissions", _m011_emission_rows, ("project_id", "methodology", "record_date", "quantity_tco2e", "created_at"))
+
+
+def _m011_emission_time_series(conn: sqlite3.Connection) -> None:
+    # Trigger-maintained monthly buckets for calc_runs / emissions, per project and portfolio-wide.
+    for ddl in (
+        """
+        CREATE TABLE IF NOT EXISTS calendar_months (
+            month_id INTEGER PRIMARY KEY,
+            month TEXT NOT NULL UNIQUE,
+            start_jd REAL NOT NULL,
+            end_jd REAL NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS emission_monthly (
+            project_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            source_table TEXT NOT NULL,
+            scope_label TEXT NOT NULL DEFAULT '',
+            methodology TEXT NOT NULL DEFAULT '',
+            baseline_tco2e REAL NOT NULL DEFAULT 0,
+            project_tco2e REAL NOT NULL DEFAULT 0,
+            tco2e REAL NOT NULL DEFAULT 0,
+            n_records INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(project_id, month, source_table, scope_label, methodology)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS emission_monthly_totals (
+            month TEXT NOT NULL,
+            source_table TEXT NOT NULL,
+            scope_label TEXT NOT NULL DEFAULT '',
+            methodology TEXT NOT NULL DEFAULT '',
+            baseline_tco2e REAL NOT NULL DEFAULT 0,
+            project_tco2e REAL NOT NULL DEFAULT 0,
+            tco2e REAL NOT NULL DEFAULT 0,
+            n_records INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(month, source_table, scope_label, methodology)
+        );
+        """,
+        # Calendar 1900-01 .. 2199-12, month_id = year * 12 + month - 1.
+        """
+        WITH RECURSIVE ids(month_id) AS (
+            SELECT 1900 * 12 UNION ALL SELECT month_id + 1 FROM ids WHERE month_id < 2199 * 12 + 11
+        ), m(month_id, month) AS (
+            SELECT month_id, printf('%04d-%02d', month_id / 12, month_id % 12 + 1) FROM ids
+        )
+        INSERT OR IGNORE INTO calendar_months (month_id, month, start_jd, end_jd)
+        SELECT month_id, month, julianday(month || '-01'), julianday(month || '-01', '+1 month', '-1 day') FROM m;
+        """,
+        *_M011_TRIGGERS,
+        # Backfill from existing runs / ledger entries.
+        "DELETE FROM emission_monthly;",
+        "DELETE FROM emission_monthly_totals;",
+        f"""
+        INSERT INTO emission_monthly ({", ".join(_M011_KEYS)}, {", ".join(_M011_SUMS)}, n_records)
+        SELECT {", ".join(_M011_KEYS)}, {", ".join(f"SUM({c})" for c in _M011_SUMS)}, SUM(n_records)
+        FROM ({_m011_buckets(_m011_calc_rows())} UNION ALL {_m011_buckets(_m011_emission_rows())})
+        GROUP BY {", ".join(_M011_KEYS)};
+        """,
+        f"""
+        INSERT INTO emission_monthly_totals ({", ".join(_M011_TOTAL_KEYS)}, {", ".join(_M011_SUMS)}, n_records)
+        SELECT {", ".join(_M011_TOTAL_KEYS)}, {", ".join(f"SUM({c})" for c in _M011_SUMS)}, SUM(n_records)
+        FROM emission_monthly GROUP BY {", ".join(_M011_TOTAL_KEYS)};
+        """,
+    ):
+        conn.execute(ddl)
+
+
+def _m012_audit_entity_id_index(conn: sqlite3.Connection) -> None:
+    # The Audit Trail lets Entity ID be filtered without Entity type; the (entity_type, …) index
+    # from migration 3 cannot seek on entity_id alone.
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_audit_logs_entity_id_ts_id ON audit_logs(entity_id, timestamp, audit_id);")
+
+
+
+def _m013_foreign_key_orphans(conn: sqlite3.Connection) -> None:
+    # utils/db.py enforces foreign keys; the old per-page connections never did, so a DB can hold
+    # rows whose parent is gone, and any write re-checking them would now fail. Missing projects
+    # come back as archived placeholders (rows keep their project), sales lose a missing issuance
+    # link, factors of a missing dataset go (as its ON DELETE CASCADE would have done).
+    now = now_iso()
+    columns = {}
+    for table, rowid, parent, fkid in conn.execute("PRAGMA foreign_key_check;").fetchall():
+        if table not in columns:
+            columns[table] = {r[0]: r[3] for r in conn.execute(f"PRAGMA foreign_key_list({table});").fetchall()}
+        column = columns[table][fkid]
+        if parent == "projects":
+            (project_id,) = conn.execute(f"SELECT {column} FROM {table} WHERE rowid = ?;", (rowid,)).fetchone()
+            placeholder = {
+                "project_id": project_id,
+                "project_name": f"Missing project {project_id}",
+                "status": "Archived",
+                "description": f"Recreated by schema migration 13: {table} rows referenced this project.",
+            }
+            if conn.execute(
+                """
+                INSERT OR IGNORE INTO projects (project_id, project_name, status, description, created_at, updated_at)
+                VALUES (:project_id, :project_name, :status, :description, :now, :now);
+                """,
+                {**placeholder, "now": now},
+            ).rowcount:
+                conn.execute(
+                    AUDIT_INSERT_SQL,
+                    make_row("CREATE", "project", project_id, project_id, after=placeholder,
+                             meta={"source": "migration 13 (foreign-key repair)"}, actor="migration"),
+                )
+        elif parent == "ef_datasets":
+            conn.execute(f"DELETE FROM {table} WHERE rowid = ?;", (rowid,))
+        else:
+            conn.execute(f"UPDATE {table} SET {column} = NULL WHERE rowid = ?;", (rowid,))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "baseline tables (reconciled across pages)", _m001_baseline),
+    (2, "hot-path indexes", _m002_hot_path_indexes),
+    (3, "audit keyset-pagination indexes", _m003_audit_keyset_indexes),
+    (4, "audit payload full-text index (FTS5)", _m004_audit_fts),
+    (5, "project prefix-search indexes", _m005_project_search_indexes),
+    (6, "credit/sales rollup tables + triggers", _m006_credit_rollups),
+    (7, "bulk-ingest natural keys on credits/sales", _m007_ingest_natural_keys),
+    (8, "emission-factor library", _m008_emission_factor_library),
+    (9, "calc revision history", _m009_calc_revisions),
+    (10, "calculation cache (disk tier)", _m010_calc_cache),
+    (11, "monthly emissions time series + triggers", _m011_emission_time_series),
+    (12, "audit entity-id keyset index", _m012_audit_entity_id_index),
+    (13, "repair foreign-key orphans", _m013_foreign_key_orphans),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_lock = threading.Lock()
+_done = False
+
+
+def schema_version() -> int:
+    return int(get_reader().execute("PRAGMA user_version;").fetchone()[0])
+
+
+def migrate() -> int:
+    """Apply every pending migration (each in its own transaction). Returns the final version."""
+    current = schema_version()
+    for version, _label, step in MIGRATIONS:
+        if version <= current:
+            continue
+        # user_version is bumped inside the same transaction, so a failed step leaves it untouched.
+        with writer() as conn:
+            # Re-check under the write lock: another process may have migrated meanwhile.
+            if int(conn.execute("PRAGMA user_version;").fetchone()[0]) < version:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)};")
+        current = version
+    with writer() as conn:
+        conn.execute("PRAGMA optimize;")
+    return current
+
+
+def ensure_schema() -> None:
+    """Run migrations once per process; later calls are a no-op."""
+    global _done
+    if _done:
+        return
+    with _lock:
+        if not _done:
+            migrate()
+            _done = True
@@ -0,0 +1,296 @@
+"""
+utils/tables.py
+
+Canonical column definitions for every registry table (no DB access here).
+
+Used by:
+- utils/schema.py to create/reconcile tables in migrations.
+- utils/db.py to materialise query results with explicit per-column dtypes.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+# ------------------------------------------------------------
+# Canonical table definitions: (columns, table constraints)
+# ------------------------------------------------------------
+TABLES: Dict[str, Tuple[List[Tuple[str, str]], List[str]]] = {
+    "projects": (
+        [
+            ("project_id", "TEXT PRIMARY KEY"),
+            ("project_code", "TEXT UNIQUE"),
+            ("project_name", "TEXT NOT NULL"),
+            ("owner_org", "TEXT"),
+            ("country", "TEXT"),
+            ("region", "TEXT"),
+            ("sector", "TEXT"),
+            ("methodology", "TEXT"),
+            ("standard", "TEXT"),
+            ("baseline_year", "INTEGER"),
+            ("start_date", "TEXT"),
+            ("end_date", "TEXT"),
+            ("status", "TEXT DEFAULT 'Active'"),
+            ("description", "TEXT"),
+            ("created_at", "TEXT NOT NULL"),
+            ("updated_at", "TEXT NOT NULL"),
+        ],
+        [],
+    ),
+    "project_foundations": (
+        [
+            ("project_id", "TEXT PRIMARY KEY"),
+            ("boundary_summary", "TEXT"),
+            ("baseline_summary", "TEXT"),
+            ("intervention_summary", "TEXT"),
+            ("key_assumptions", "TEXT"),
+            ("data_sources", "TEXT"),
+            ("uncertainty_notes", "TEXT"),
+            ("evidence_checklist", "TEXT"),
+            ("updated_at", "TEXT NOT NULL"),
+        ],
+        ["FOREIGN KEY(project_id) REFERENCES projects(project_id)"],
+    ),
+    "credits": (
+        [
+            ("credit_id", "TEXT PRIMARY KEY"),
+            ("project_id", "TEXT NOT NULL"),
+            ("vintage_year", "INTEGER NOT NULL"),
+            ("credits_issued", "REAL DEFAULT 0"),
+            ("issuance_date", "TEXT"),
+            ("registry_program", "TEXT"),
+            ("serial_range", "TEXT"),
+            ("notes", "TEXT"),
+            ("source_ref", "TEXT"),  # natural key from bulk ingest (utils/ingest.py)
+            ("created_at", "TEXT NOT NULL"),
+            ("updated_at", "TEXT NOT NULL"),
+        ],
+        ["FOREIGN KEY(project_id) REFERENCES projects(project_id)"],
+    ),
+    "sales": (
+        [
+            ("sale_id", "TEXT PRIMARY KEY"),
+            ("project_id", "TEXT NOT NULL"),
+            ("credit_id", "TEXT"),
+            ("sale_date", "TEXT NOT NULL"),
+            ("buyer", "TEXT"),
+            ("credits_sold", "REAL NOT NULL"),
+            ("price_per_credit", "REAL"),
+            ("currency", "TEXT DEFAULT 'USD'"),
+            ("contract_ref", "TEXT"),
+            ("notes", "TEXT"),
+            ("source_ref", "TEXT"),  # natural key from bulk ingest (utils/ingest.py)
+            ("created_at", "TEXT NOT NULL"),
+            ("updated_at", "TEXT NOT NULL"),
+        ],
+        [
+            "FOREIGN KEY(project_id) REFERENCES projects(project_id)",
+            "FOREIGN KEY(credit_id) REFERENCES credits(credit_id)",
+        ],
+    ),
+    "audit_logs": (
+        [
+            ("audit_id", "TEXT PRIMARY KEY"),
+            ("timestamp", "TEXT NOT NULL"),
+            ("actor", "TEXT"),
+            ("action", "TEXT NOT NULL"),
+            ("entity_type", "TEXT NOT NULL"),
+            ("entity_id", "TEXT"),
+            ("project_id", "TEXT"),
+            ("before_json", "TEXT"),
+            ("after_json", "TEXT"),
+            ("meta_json", "TEXT"),
+        ],
+        [],
+    ),
+    "calc_runs": (
+        [
+            ("calc_id", "TEXT PRIMARY KEY"),
+            ("project_id", "TEXT"),
+            ("calc_type", "TEXT NOT NULL"),  # 'scope' | 'methodology'
+            ("calc_name", "TEXT NOT NULL"),
+            ("scope_label", "TEXT"),  # 'Scope 1'/'Scope 2'/'Scope 3'
+            ("period_start", "TEXT"),
+            ("period_end", "TEXT"),
+            ("baseline_tco2e", "REAL"),
+            ("project_tco2e", "REAL"),
+            ("reduction_tco2e", "REAL"),
+            ("inputs_json", "TEXT"),
+            ("outputs_json", "TEXT"),
+            ("factor_source", "TEXT"),  # required when saving
+            ("status", "TEXT DEFAULT 'final'"),
+            ("actor", "TEXT"),
+            ("created_at", "TEXT NOT NULL"),
+        ],
+        [],
+    ),
+    "emissions": (
+        [
+            ("emission_id", "TEXT PRIMARY KEY"),
+            ("project_id", "TEXT"),
+            ("methodology", "TEXT"),
+            ("record_date", "TEXT"),
+            ("quantity_tco2e", "REAL"),
+            ("notes", "TEXT"),
+            ("inputs_json", "TEXT"),
+            ("outputs_json", "TEXT"),
+            ("created_at", "TEXT"),
+        ],
+        ["FOREIGN KEY(project_id) REFERENCES projects(project_id) ON DELETE SET NULL"],
+    ),
+    # Recompute history (migration 9, utils/recompute.py): one row per changed run per job,
+    # numbered per run; the run row itself carries the latest values.
+    "calc_revisions": (
+        [
+            ("revision_id", "TEXT PRIMARY KEY"),
+            ("job_id", "TEXT NOT NULL"),
+            ("source_table", "TEXT NOT NULL"),  # 'calc_runs' | 'emissions'
+            ("source_id", "TEXT NOT NULL"),
+            ("project_id", "TEXT"),
+            ("revision_no", "INTEGER NOT NULL"),
+            ("reason", "TEXT"),
+            ("old_value", "REAL"),  # reduction_tco2e (calc_runs) / quantity_tco2e (emissions)
+            ("new_value", "REAL"),
+            ("changes_json", "TEXT"),  # {input: [old, new]}
+            ("previous_outputs_json", "TEXT"),
+            ("inputs_json", "TEXT"),
+            ("outputs_json", "TEXT"),
+            ("actor", "TEXT"),
+            ("created_at", "TEXT NOT NULL"),
+        ],
+        ["UNIQUE(source_table, source_id, revision_no)"],
+    ),
+    # On-disk tier of the calculation cache (migration 10, utils/calc_cache.py); safe to empty.
+    "calc_cache": (
+        [
+            ("cache_key", "TEXT PRIMARY KEY"),  # SHA-256 of the canonical input record
+            ("namespace", "TEXT NOT NULL"),
+            ("value", "BLOB NOT NULL"),  # pickled result
+            ("n_bytes", "INTEGER NOT NULL"),
+            ("created_at", "TEXT NOT NULL"),
+        ],
+        [],
+    ),
+    # Derived: maintained by triggers on credits/sales (migration 6, utils/rollups.py).
+    # Issuances carry no currency (currency ''); sales not linked to an issuance have vintage_year 0.
+    "credit_rollups": (
+        [
+            ("project_id", "TEXT NOT NULL"),
+            ("vintage_year", "INTEGER NOT NULL"),
+            ("currency", "TEXT NOT NULL"),
+            ("credits_issued", "REAL NOT NULL DEFAULT 0"),
+            ("credits_sold", "REAL NOT NULL DEFAULT 0"),
+            ("revenue", "REAL NOT NULL DEFAULT 0"),
+            ("n_issuances", "INTEGER NOT NULL DEFAULT 0"),
+            ("n_sales", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+        ["PRIMARY KEY(project_id, vintage_year, currency)"],
+    ),
+    "credit_rollup_totals": (
+        [
+            ("project_id", "TEXT PRIMARY KEY"),
+            ("credits_issued", "REAL NOT NULL DEFAULT 0"),
+            ("credits_sold", "REAL NOT NULL DEFAULT 0"),
+            ("revenue", "REAL NOT NULL DEFAULT 0"),
+            ("n_issuances", "INTEGER NOT NULL DEFAULT 0"),
+            ("n_sales", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+        [],
+    ),
+    # Derived: maintained by triggers on calc_runs/emissions (migration 11, utils/timeseries.py).
+    # Each run is pro-rated by day over its period; source_table is 'calc_runs' | 'emissions'.
+    "emission_monthly": (
+        [
+            ("project_id", "TEXT NOT NULL"),  # '' for runs without a project
+            ("month", "TEXT NOT NULL"),  # YYYY-MM
+            ("source_table", "TEXT NOT NULL"),
+            ("scope_label", "TEXT NOT NULL DEFAULT ''"),
+            ("methodology", "TEXT NOT NULL DEFAULT ''"),
+            ("baseline_tco2e", "REAL NOT NULL DEFAULT 0"),
+            ("project_tco2e", "REAL NOT NULL DEFAULT 0"),
+            ("tco2e", "REAL NOT NULL DEFAULT 0"),  # reduction_tco2e (calc_runs) / quantity_tco2e (emissions)
+            ("n_records", "INTEGER NOT NULL DEFAULT 0"),  # runs overlapping the month
+        ],
+        ["PRIMARY KEY(project_id, month, source_table, scope_label, methodology)"],
+    ),
+    "emission_monthly_totals": (
+        [
+            ("month", "TEXT NOT NULL"),
+            ("source_table", "TEXT NOT NULL"),
+            ("scope_label", "TEXT NOT NULL DEFAULT ''"),
+            ("methodology", "TEXT NOT NULL DEFAULT ''"),
+            ("baseline_tco2e", "REAL NOT NULL DEFAULT 0"),
+            ("project_tco2e", "REAL NOT NULL DEFAULT 0"),
+            ("tco2e", "REAL NOT NULL DEFAULT 0"),
+            ("n_records", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+        ["PRIMARY KEY(month, source_table, scope_label, methodology)"],
+    ),
+    "calendar_months": (
+        [
+            ("month_id", "INTEGER PRIMARY KEY"),  # year * 12 + month - 1
+            ("month", "TEXT NOT NULL UNIQUE"),
+            ("start_jd", "REAL NOT NULL"),  # julianday of the first / last day
+            ("end_jd", "REAL NOT NULL"),
+        ],
+        [],
+    ),
+    # Emission-factor library (migration 8, utils/factors.py). factor_id is derived from the
+    # dataset and key, so reloading a dataset version keeps the ids calculations refer to.
+    "ef_datasets": (
+        [
+            ("dataset_id", "TEXT PRIMARY KEY"),
+            ("name", "TEXT NOT NULL"),
+            ("version", "TEXT NOT NULL"),
+            ("source", "TEXT"),
+            ("n_factors", "INTEGER NOT NULL DEFAULT 0"),
+            ("loaded_by", "TEXT"),
+            ("loaded_at", "TEXT NOT NULL"),
+        ],
+        ["UNIQUE(name, version)"],
+    ),
+    "emission_factors": (
+        [
+            ("factor_id", "TEXT PRIMARY KEY"),
+            ("dataset_id", "TEXT NOT NULL"),
+            ("category", "TEXT NOT NULL"),
+            ("unit", "TEXT NOT NULL"),  # activity unit (denominator)
+            ("geography", "TEXT NOT NULL DEFAULT ''"),
+            ("year", "INTEGER NOT NULL DEFAULT 0"),  # 0 = undated
+            ("version", "TEXT NOT NULL"),
+            ("basis", "TEXT NOT NULL DEFAULT ''"),  # e.g. location / market, tank-to-wheel / well-to-tank
+            ("factor_value", "REAL NOT NULL"),
+            ("factor_unit", "TEXT NOT NULL DEFAULT 'kgCO2e'"),  # numerator: kgCO2e, or e.g. MJ for energy content
+            ("source", "TEXT"),
+            ("notes", "TEXT"),
+        ],
+        ["FOREIGN KEY(dataset_id) REFERENCES ef_datasets(dataset_id) ON DELETE CASCADE"],
+    ),
+}
+
+
+# ------------------------------------------------------------
+# Result dtypes (declared affinity -> NumPy dtype)
+# ------------------------------------------------------------
+def _affinity(decl: str) -> str:
+    return decl.split()[0].upper()
+
+
+# INTEGER columns are materialised as int64, or float64 (NaN) when the chunk holds NULLs —
+# the same thing pandas would infer, without the inference pass.
+AFFINITY_DTYPES: Dict[str, object] = {"INTEGER": np.int64, "REAL": np.float64, "TEXT": object, "BLOB": object}
+
+TABLE_DTYPES: Dict[str, Dict[str, object]] = {
+    name: {col: AFFINITY_DTYPES[_affinity(decl)] for col, decl in columns}
+    for name, (columns, _constraints) in TABLES.items()
+}
+
+# Column names are consistent across tables, so one merged map covers joins and ad-hoc SELECTs.
+COLUMN_DTYPES: Dict[str, object] = {col: dt for dtypes in TABLE_DTYPES.values() for col, dt in dtypes.items()}
+
+
+def table_dtypes(name: str) -> Dict[str, object]:
+    return TABLE_DTYPES[name]
@@ -0,0 +1,245 @@
+"""
+utils/timeseries.py
+
+Calendar-bucketed emissions time series: every saved run, pro-rated by day over its period
+into monthly buckets per (project, month, source, scope, methodology).
+
+Key guarantees:
+- emission_monthly is maintained by triggers on calc_runs and emissions (migration 11 in
+  utils/schema.py), inside the writing transaction (pages, recompute jobs, FK SET NULL on
+  project delete), like utils/rollups.py.
+- Periods are inclusive day ranges: calc_runs use period_start..period_end, emissions their
+  record_date (one day). Dates are read with SQLite date(); missing or unreadable starts fall
+  back to created_at, missing or unreadable (or earlier) ends to the start. Draft runs are left out.
+- calc_runs bucket reduction_tco2e as tco2e (plus baseline / project); emissions bucket
+  quantity_tco2e — the same headline figures recompute revisions track.
+- Monthly / annual reads are index range scans over the buckets, never a parse of the base tables.
+- rebuild / verify recompute everything from the base tables, for repairs:
+      python -m utils.timeseries verify
+      python -m utils.timeseries rebuild
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from utils.db import db_query
+
+
+SUMS = ("baseline_tco2e", "project_tco2e", "tco2e")
+KEYS = ("project_id", "month", "source_table", "scope_label", "methodology")
+TOTAL_KEYS = KEYS[1:]
+GROUPS = ("source_table", "scope_label", "methodology")
+
+TOLERANCE = 1e-6
+
+
+# ------------------------------------------------------------
+# Calendar (month_id = year * 12 + month - 1, so a period is a rowid range). calendar_months
+# spans 1900-01..2199-12; periods outside it are not bucketed (verify reports them).
+# ------------------------------------------------------------
+def _month_id(jd: str) -> str:
+    return f"(CAST(strftime('%Y', {jd}) AS INTEGER) * 12 + CAST(strftime('%m', {jd}) AS INTEGER) - 1)"
+
+
+# ------------------------------------------------------------
+# Bucketing SQL (rebuild / verify; the triggers from migration 11 bucket the same way)
+# ------------------------------------------------------------
+def _calc_rows(ref: Optional[str] = None) -> str:
+    """calc_runs as bucket sources: one row for a trigger reference (new/old), else the whole table."""
+    p = f"{ref}." if ref else ""
+    return f"""
+        SELECT COALESCE({p}project_id, '') AS project_id, 'calc_runs' AS source_table,
+               COALESCE({p}scope_label, '') AS scope_label, '' AS methodology,
+               {p}period_start AS period_start, {p}period_end AS period_end, {p}created_at AS created_at,
+               COALESCE({p}baseline_tco2e, 0) AS baseline_tco2e, COALESCE({p}project_tco2e, 0) AS project_tco2e,
+               COALESCE({p}reduction_tco2e, 0) AS tco2e
+        {"" if ref else "FROM calc_runs"} WHERE COALESCE({p}status, '') != 'draft'
+    """
+
+
+def _emission_rows(ref: Optional[str] = None) -> str:
+    p = f"{ref}." if ref else ""
+    return f"""
+        SELECT COALESCE({p}project_id, '') AS project_id, 'emissions' AS source_table,
+               '' AS scope_label, COALESCE({p}methodology, '') AS methodology,
+               {p}record_date AS period_start, NULL AS period_end, {p}created_at AS created_at,
+               0 AS baseline_tco2e, 0 AS project_tco2e, COALESCE({p}quantity_tco2e, 0) AS tco2e
+        {"" if ref else "FROM emissions"}
+    """
+
+
+def _buckets(rows: str, sign: int = 1) -> str:
+    """Source rows -> (KEYS, SUMS, n_records) per overlapped month; shares are days in month / days in period."""
+    share = "(MIN(r.e, c.end_jd) - MAX(r.s, c.start_jd) + 1.0) / (r.e - r.s + 1.0)"
+    return f"""
+        SELECT r.project_id, c.month, r.source_table, r.scope_label, r.methodology,
+               {", ".join(f"{sign} * r.{c} * {share} AS {c}" for c in SUMS)}, {sign} AS n_records
+        FROM (
+            SELECT x.*, MAX(COALESCE(julianday(date(x.period_end)), x.s), x.s) AS e
+            FROM (
+                SELECT b.*, COALESCE(julianday(date(b.period_start)), julianday(date(b.created_at))) AS s
+                FROM ({rows}) b
+            ) x
+            LIMIT -1  -- keeps r materialised: flattening would re-parse the dates per use
+        ) r
+        JOIN calendar_months c ON c.month_id BETWEEN {_month_id("r.s")} AND {_month_id("r.e")}
+        WHERE r.s IS NOT NULL
+    """
+
+
+# ------------------------------------------------------------
+# Rebuild / verify
+# ------------------------------------------------------------
+_EXPECTED_SQL = f"""
+    SELECT {", ".join(KEYS)}, {", ".join(f"SUM({c}) AS {c}" for c in SUMS)}, SUM(n_records) AS n_records
+    FROM ({_buckets(_calc_rows())} UNION ALL {_buckets(_emission_rows())})
+    GROUP BY {", ".join(KEYS)}
+"""
+
+
+def _totals_sql(source: str) -> str:
+    return f"""
+        SELECT {", ".join(TOTAL_KEYS)}, {", ".join(f"SUM({c}) AS {c}" for c in SUMS)}, SUM(n_records) AS n_records
+        FROM {source} GROUP BY {", ".join(TOTAL_KEYS)}
+    """
+
+
+def rebuild_series(conn: sqlite3.Connection) -> None:
+    """Recompute both bucket tables from calc_runs / emissions (run inside a writer transaction)."""
+    conn.execute("DELETE FROM emission_monthly;")
+    conn.execute("DELETE FROM emission_monthly_totals;")
+    conn.execute(f"INSERT INTO emission_monthly ({', '.join(KEYS)}, {', '.join(SUMS)}, n_records) {_EXPECTED_SQL};")
+    conn.execute(
+        f"INSERT INTO emission_monthly_totals ({', '.join(TOTAL_KEYS)}, {', '.join(SUMS)}, n_records) "
+        f"{_totals_sql('emission_monthly')};"
+    )
+
+
+def _diff_sql(expected: str, stored: str, keys: Sequence[str]) -> str:
+    on = ", ".join(keys)
+    diffs = " OR ".join(
+        [f"ABS(COALESCE(e.{c}, 0) - COALESCE(r.{c}, 0)) > {TOLERANCE}" for c in SUMS]
+        + ["COALESCE(e.n_records, 0) != COALESCE(r.n_records, 0)"]
+    )
+    return f"""
+        SELECT {", ".join(f"k.{c}" for c in keys)},
+               {", ".join(f"e.{c} AS expected_{c}, r.{c} AS stored_{c}" for c in SUMS + ("n_records",))}
+        FROM (SELECT {on} FROM ({expected}) UNION SELECT {on} FROM {stored}) k
+        LEFT JOIN ({expected}) e USING ({on})
+        LEFT JOIN {stored} r USING ({on})
+        WHERE e.month IS NULL OR r.month IS NULL OR {diffs}
+    """
+
+
+def verify_series() -> pd.DataFrame:
+    """Buckets that differ from a fresh recomputation (empty frame = consistent).
+
+    Portfolio totals are reported with project_id left empty.
+    """
+    keyed = db_query(_diff_sql(_EXPECTED_SQL, "emission_monthly", KEYS))
+    total = db_query(_diff_sql(_totals_sql(f"({_EXPECTED_SQL})"), "emission_monthly_totals", TOTAL_KEYS))
+    return pd.concat([keyed, total], ignore_index=True) if not total.empty else keyed
+
+
+# ------------------------------------------------------------
+# Reads
+# ------------------------------------------------------------
+def _period_where(start: Optional[str], end: Optional[str], alias: str = "m") -> Tuple[List[str], List[str]]:
+    where, params = [], []
+    if start:
+        where.append(f"{alias}.month >= ?")
+        params.append(str(start)[:7])
+    if end:
+        where.append(f"{alias}.month <= ?")
+        params.append(str(end)[:7])
+    return where, params
+
+
+def _by(by: Sequence[str]) -> List[str]:
+    unknown = [g for g in by if g not in GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown grouping {unknown} (expected any of {', '.join(GROUPS)})")
+    return list(by)
+
+
+def monthly(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    *,
+    project_ids: Optional[Sequence[str]] = None,
+    by: Sequence[str] = (),
+) -> pd.DataFrame:
+    """tCO₂e per month (YYYY-MM, inclusive bounds; dates are truncated), optionally per `by` groups.
+
+    Without `project_ids` this reads the portfolio table (one row per month and group); with
+    them, the per-project buckets for just those projects.
+    """
+    groups = _by(by)
+    where, params = _period_where(start, end)
+    table = "emission_monthly_totals"
+    if project_ids is not None:
+        table = "emission_monthly"
+        where.append(f"m.project_id IN ({', '.join('?' * len(project_ids))})" if project_ids else "0")
+        params.extend(project_ids)
+    cols = ", ".join(["m.month"] + [f"m.{g}" for g in groups])
+    return db_query(
+        f"""
+        SELECT {cols}, {", ".join(f"SUM(m.{c}) AS {c}" for c in SUMS)}, SUM(m.n_records) AS n_records
+        FROM {table} m
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY {cols}
+        ORDER BY {cols}
+        """,
+        tuple(params),
+    )
+
+
+def annual(start: Optional[str] = None, end: Optional[str] = None, **kwargs) -> pd.DataFrame:
+    """monthly() summed per calendar year (n_records counts each run once per month it spans)."""
+    df = monthly(start, end, **kwargs)
+    keys = ["year"] + [c for c in GROUPS if c in df.columns]
+    df.insert(0, "year", df.pop("month").str[:4].astype(int))
+    return df.groupby(keys, as_index=False, sort=True)[list(SUMS) + ["n_records"]].sum()
+
+
+def project_monthly(project_id: str, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+    """All buckets for one project (primary-key prefix scan)."""
+    where, params = _period_where(start, end)
+    return db_query(
+        f"""
+        SELECT {", ".join(f"m.{c}" for c in KEYS[1:])}, {", ".join(f"m.{c}" for c in SUMS)}, m.n_records
+        FROM emission_monthly m
+        WHERE {" AND ".join(["m.project_id = ?"] + where)}
+        ORDER BY m.month, m.source_table, m.scope_label, m.methodology
+        """,
+        (project_id, *params),
+        table="emission_monthly",
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from utils.db import writer
+    from utils.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild the monthly emissions time series.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args()
+
+    ensure_schema()
+    if args.command == "rebuild":
+        with writer() as conn:
+            rebuild_series(conn)
+    bad = verify_series()
+    if bad.empty:
+        print("emission time series consistent.")
+    else:
+        print(bad.to_string(index=False))
+        print(f"{len(bad)} bucket(s) out of sync — run `python -m utils.timeseries rebuild`.")
+        sys.exit(1)
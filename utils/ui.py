@@ -7,6 +7,8 @@ Design goals:
 - One consistent sidebar across all pages
 - Single shared CSS theme (assets/style.css)
 - Safe navigation via st.switch_page
+- One project picker for every page: cached id -> label index for small registries,
+  server-side typeahead once there are too many projects to render as options
 
 Important Streamlit rule:
 - st.set_page_config(...) must be the *first Streamlit call* in each page.
@@ -15,8 +17,12 @@ Important Streamlit rule:
 
 from __future__ import annotations
 
+from typing import Dict, Optional
+
 import streamlit as st
+from utils import calc_cache
 from utils.load_css import load_css
+from utils.projects import count_projects, project_label, project_labels, search_projects
 
 
 APP_TITLE = "Carbon Registry"
@@ -24,6 +30,10 @@ APP_ICON = "🌍"
 APP_VERSION = "v1.0 (foundation beta)"
 APP_TAGLINE = "Boundaries → Assumptions → Calculators → Evidence"
 
+# Above this many projects the picker switches from a plain selectbox to prefix typeahead.
+TYPEAHEAD_THRESHOLD = 200
+TYPEAHEAD_LIMIT = 50
+
 
 NAV_ITEMS = [
     {
@@ -47,6 +57,13 @@ NAV_ITEMS = [
         "page": "pages/3_Methodologies.py",
         "badge": "Beta",
     },
+    {
+        "label": "📈 Portfolio",
+        "desc": "Cross-project views: issued vs sold by vintage, revenue by buyer, emissions by methodology.",
+        "button": "Open Portfolio",
+        "page": "pages/4_Portfolio.py",
+        "badge": "Beta",
+    },
 ]
 
 
@@ -82,6 +99,17 @@ def render_sidebar(active_label: str | None = None) -> None:
             st.write("3) Run **calculator demos** with transparent factors.")
             st.write("4) Export notes/results for review.")
 
+        with st.expander("Calculation cache"):
+            cs = calc_cache.stats()
+            st.caption(
+                f"{cs['hits'] + cs['disk_hits']:,} hits · {cs['misses']:,} misses"
+                + (f" ({cs['hit_rate']:.0%} hit rate)" if cs["hit_rate"] is not None else "")
+                + f" · {cs['entries']:,} results, {cs['bytes'] / 1e6:,.1f} MB"
+                + (" · disk tier on" if cs["disk"] else "")
+            )
+            if st.button("Clear cache", key="di_cache_clear", use_container_width=True):
+                calc_cache.clear()
+
         with st.expander("Disclaimer"):
             st.write(
                 "Beta tool for learning/analysis — not audit-ready. "
@@ -119,3 +147,57 @@ def setup_page(
     st.set_page_config(page_title=page_title, page_icon=page_icon, layout=layout)
     load_css()
     render_sidebar(active_label=active_label)
+
+
+# ------------------------------------------------------------
+# Project picker
+# ------------------------------------------------------------
+@st.cache_data(ttl=10, show_spinner=False)
+def project_index(scope: str = "all") -> Dict[str, str]:
+    """Cached project_id -> label map (ordered: most recently updated first)."""
+    return project_labels(scope)
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def project_count(scope: str = "all") -> int:
+    return count_projects(scope)
+
+
+def clear_project_cache() -> None:
+    """Call after creating/updating projects so pickers see the change immediately."""
+    project_index.clear()
+    project_count.clear()
+
+
+def project_picker(
+    label: str,
+    *,
+    key: str,
+    scope: str = "all",
+    default_id: Optional[str] = None,
+) -> Optional[str]:
+    """Select a project; returns its project_id (None when there are no projects)."""
+    if project_count(scope) <= TYPEAHEAD_THRESHOLD:
+        index = project_index(scope)
+        if not index:
+            return None
+        options = list(index)
+        default_idx = options.index(default_id) if default_id in index else 0
+        return st.selectbox(label, options, index=default_idx, format_func=index.__getitem__, key=key)
+
+    prefix = st.text_input(
+        f"{label} — search",
+        key=f"{key}_q",
+        placeholder="Type the start of a project code or name",
+    )
+    hits = search_projects(prefix, scope, limit=TYPEAHEAD_LIMIT)
+    if default_id and default_id not in hits:
+        default_label = project_label(default_id)
+        if default_label is not None and not prefix.strip():
+            hits = {default_id: default_label, **hits}
+    if not hits:
+        st.caption("No matching projects.")
+        return None
+    options = list(hits)
+    default_idx = options.index(default_id) if default_id in hits else 0
+    return st.selectbox(label, options, index=default_idx, format_func=hits.__getitem__, key=key)
@@ -0,0 +1,230 @@
+"""
+utils/uncertainty.py
+
+Seeded, vectorized Monte Carlo uncertainty propagation (no Streamlit here).
+
+Key guarantees:
+- Inputs are described by small JSON-able specs: normal, lognormal, triangular, uniform, or
+  fixed. spec_from_band() turns the screening bands (value ± x% at 1σ) into any of them.
+- Correlations between inputs (e.g. baseline vs project EF) use a Gaussian copula: correlated
+  standard normals are drawn once and mapped through each marginal, so skewed marginals keep
+  their shape.
+- Models are plain NumPy functions over sample arrays, so nonlinear steps such as
+  max(baseline - project, 0) are propagated exactly instead of linearised.
+- Same model + specs + correlations + n + seed -> identical result; results are memoised per
+  spec in utils.calc_cache (shared by all sessions), so Streamlit reruns do not resample.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from utils import calc_cache
+
+
+DISTRIBUTIONS = ("normal", "lognormal", "triangular", "uniform")
+DEFAULT_SAMPLES = 100_000
+DEFAULT_SEED = 20240601
+PERCENTILES = (2.5, 5.0, 25.0, 50.0, 75.0, 95.0, 97.5)
+HIST_BINS = 40
+
+Spec = Dict[str, Any]
+Model = Callable[[Dict[str, np.ndarray]], Dict[str, np.ndarray]]
+
+_MODELS: Dict[str, Model] = {}
+
+
+def register_model(name: str) -> Callable[[Model], Model]:
+    """Decorator: make a vectorized model available to simulate() under `name`."""
+
+    def wrap(fn: Model) -> Model:
+        _MODELS[name] = fn
+        return fn
+
+    return wrap
+
+
+def get_model(name: str) -> Model:
+    if name not in _MODELS:
+        raise KeyError(f"Unknown uncertainty model: {name!r}")
+    return _MODELS[name]
+
+
+# ------------------------------------------------------------
+# Input specs
+# ------------------------------------------------------------
+def spec_from_band(value: float, rel_u_pct: float, dist: str = "normal") -> Spec:
+    """Central value ± rel_u_pct (1σ, % of value) -> a spec with that mean and standard deviation."""
+    value = float(value)
+    sd = abs(value) * float(rel_u_pct) / 100.0
+    if sd == 0.0:
+        return {"dist": "fixed", "value": value}
+    if dist == "normal":
+        return {"dist": "normal", "mean": value, "sd": sd, "min": 0.0}
+    if dist == "lognormal":
+        if value <= 0:
+            return {"dist": "fixed", "value": value}
+        return {"dist": "lognormal", "mean": value, "sd": sd}
+    if dist == "uniform":
+        half = np.sqrt(3.0) * sd
+        return {"dist": "uniform", "low": value - half, "high": value + half}
+    if dist == "triangular":
+        half = np.sqrt(6.0) * sd  # symmetric triangle with the same σ
+        return {"dist": "triangular", "low": value - half, "mode": value, "high": value + half}
+    raise ValueError(f"Unknown distribution: {dist!r} (expected one of {', '.join(DISTRIBUTIONS)})")
+
+
+def fixed(value: float) -> Spec:
+    return {"dist": "fixed", "value": float(value)}
+
+
+def _norm_cdf(z: np.ndarray) -> np.ndarray:
+    # Φ(z) via the Abramowitz & Stegun 7.1.26 erf approximation (|error| < 1.5e-7); avoids SciPy.
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+
+def _draw(spec: Spec, z: np.ndarray) -> np.ndarray:
+    """Map standard normals `z` through the marginal described by `spec`."""
+    kind = spec["dist"]
+    if kind == "fixed":
+        return np.full(z.shape, float(spec["value"]))
+    if kind == "normal":
+        x = float(spec["mean"]) + float(spec["sd"]) * z
+    elif kind == "lognormal":
+        mean, sd = float(spec["mean"]), float(spec["sd"])
+        sigma2 = np.log1p((sd / mean) ** 2)
+        x = np.exp(np.log(mean) - sigma2 / 2.0 + np.sqrt(sigma2) * z)
+    elif kind == "uniform":
+        low, high = float(spec["low"]), float(spec["high"])
+        x = low + (high - low) * _norm_cdf(z)
+    elif kind == "triangular":
+        low, mode, high = float(spec["low"]), float(spec["mode"]), float(spec["high"])
+        u = _norm_cdf(z)
+        span = high - low
+        c = (mode - low) / span if span > 0 else 0.5
+        x = np.where(
+            u < c,
+            low + np.sqrt(u * span * (mode - low)),
+            high - np.sqrt((1.0 - u) * span * (high - mode)),
+        )
+    else:
+        raise ValueError(f"Unknown distribution: {kind!r}")
+    if "min" in spec:
+        x = np.maximum(x, float(spec["min"]))
+    return x
+
+
+def _correlation_factor(names: Tuple[str, ...], correlations: Iterable[Tuple[str, str, float]]) -> np.ndarray:
+    """Square root of the correlation matrix (eigen-based, so ρ = ±1 is allowed)."""
+    index = {n: i for i, n in enumerate(names)}
+    r = np.eye(len(names))
+    for a, b, rho in correlations:
+        if a not in index or b not in index:
+            raise ValueError(f"Correlation refers to an unknown input: {a!r} / {b!r}")
+        if not -1.0 <= rho <= 1.0:
+            raise ValueError(f"Correlation {a!r}/{b!r} must be within [-1, 1]")
+        r[index[a], index[b]] = r[index[b], index[a]] = rho
+    w, v = np.linalg.eigh(r)
+    if w.min() < -1e-9:
+        raise ValueError("Correlations are inconsistent (matrix is not positive semi-definite).")
+    return v * np.sqrt(np.clip(w, 0.0, None))
+
+
+# ------------------------------------------------------------
+# Summaries
+# ------------------------------------------------------------
+def summarize(x: np.ndarray, *, level: float = 0.95) -> Dict[str, Any]:
+    tail = (1.0 - level) / 2.0 * 100.0
+    pct = np.percentile(x, [*PERCENTILES, tail, 100.0 - tail])
+    counts, edges = np.histogram(x, bins=HIST_BINS)
+    mean = float(x.mean())
+    sd = float(x.std(ddof=1)) if len(x) > 1 else 0.0
+    return {
+        "mean": mean,
+        "sd": sd,
+        "rel_sd": (sd / abs(mean)) if abs(mean) > 1e-12 else None,
+        "percentiles": {f"p{p:g}": float(v) for p, v in zip(PERCENTILES, pct)},
+        "ci_level": level,
+        "ci_low": float(pct[-2]),
+        "ci_high": float(pct[-1]),
+        "p_zero": float(np.mean(x == 0.0)),
+        "hist": {"counts": counts.tolist(), "edges": edges.tolist()},
+    }
+
+
+# ------------------------------------------------------------
+# Simulation
+# ------------------------------------------------------------
+def spec_hash(model: str, inputs: Dict[str, Spec], correlations: Iterable[Tuple[str, str, float]] = (),
+              *, n: int = DEFAULT_SAMPLES, seed: int = DEFAULT_SEED, level: float = 0.95) -> str:
+    return hashlib.sha256(_canonical(model, inputs, correlations, n, seed, level).encode("utf-8")).hexdigest()
+
+
+def _canonical(model: str, inputs: Dict[str, Spec], correlations: Iterable[Tuple[str, str, float]],
+               n: int, seed: int, level: float) -> str:
+    corr = sorted((min(a, b), max(a, b), float(rho)) for a, b, rho in correlations)
+    return json.dumps(
+        {"model": model, "inputs": inputs, "correlations": corr, "n": int(n), "seed": int(seed), "level": float(level)},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+
+CACHE_NAMESPACE = "uncertainty.simulate"
+
+
+def _simulate(key: str) -> Dict[str, Any]:
+    req = json.loads(key)
+    model = _MODELS[req["model"]]
+    names = tuple(sorted(req["inputs"]))
+    rng = np.random.default_rng(req["seed"])
+    z = _correlation_factor(names, req["correlations"]) @ rng.standard_normal((len(names), req["n"]))
+    samples = {name: _draw(req["inputs"][name], z[i]) for i, name in enumerate(names)}
+    outputs = model(samples)
+    return {
+        "model": req["model"],
+        "n": req["n"],
+        "seed": req["seed"],
+        "spec_hash": hashlib.sha256(key.encode("utf-8")).hexdigest(),
+        "outputs": {k: summarize(np.broadcast_to(v, (req["n"],)), level=req["level"]) for k, v in outputs.items()},
+    }
+
+
+def simulate(
+    model: str,
+    inputs: Dict[str, Spec],
+    correlations: Iterable[Tuple[str, str, float]] = (),
+    *,
+    n: int = DEFAULT_SAMPLES,
+    seed: Optional[int] = DEFAULT_SEED,
+    level: float = 0.95,
+) -> Dict[str, Any]:
+    """Run a registered model over `n` correlated draws of `inputs`; returns per-output summaries."""
+    get_model(model)
+    if n < 2:
+        raise ValueError("n must be at least 2")
+    key = _canonical(model, inputs, correlations, n, DEFAULT_SEED if seed is None else seed, level)
+    return calc_cache.get_or_compute(CACHE_NAMESPACE, key, lambda: _simulate(key))
+
+
+def clear_cache() -> None:
+    calc_cache.clear(CACHE_NAMESPACE)
+
+
+# ------------------------------------------------------------
+# Built-in models
+# ------------------------------------------------------------
+@register_model("baseline_project")
+def baseline_project_model(s: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Scope Calculator: emissions = nominal × activity factor × EF factor, per side."""
+    baseline = s["baseline_t"] * s["baseline_activity"] * s["baseline_ef"]
+    project = s["project_t"] * s["project_activity"] * s["project_ef"]
+    return {"baseline_tco2e": baseline, "project_tco2e": project, "reduction_tco2e": baseline - project}
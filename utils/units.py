@@ -0,0 +1,361 @@
+"""
+utils/units.py
+
+Unit registry with dimensional analysis (no Streamlit here).
+
+Key guarantees:
+- A unit is a dimension vector over base dimensions (mass, length, energy, time, count,
+  passenger, vehicle, currency:<CODE>) plus a scale to SI; each count noun is its own dimension.
+  Compound strings such as "t*km", "tonne-km", "kg/m³", "kWh/yr", "kg m-3" or "m3" are parsed;
+  exact symbols win over the case-insensitive alias table ("Mt" is megatonne, "ML" megalitre),
+  and case folding never turns a mega prefix into milli or back ("Ml" is refused).
+  python -m utils.units runs the pinned conversion checks (CHECKS / INCOMPATIBLE).
+- Conversion between units of different dimensions raises UnitError; it never guesses.
+  Currencies are separate dimensions (no FX).
+- convert_array() converts a whole column of mixed units with one factor lookup per *distinct*
+  unit and a single vectorized multiply; factors are cached.
+- Unknown free-text units (e.g. a Scope 3 "unit") are opaque: they only match themselves.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class UnitError(ValueError):
+    pass
+
+
+Dims = Tuple[Tuple[str, int], ...]
+
+
+class Unit(NamedTuple):
+    symbol: str
+    dims: Dims
+    scale: float  # multiply a value in this unit by `scale` to get SI / base units
+
+
+def _dims(**exps: int) -> Dims:
+    return tuple(sorted((k, v) for k, v in exps.items() if v))
+
+
+MASS = _dims(mass=1)
+LENGTH = _dims(length=1)
+VOLUME = _dims(length=3)
+ENERGY = _dims(energy=1)
+TIME = _dims(time=1)
+COUNT = _dims(count=1)
+# Each count noun is its own dimension: a passenger is not a vehicle, nor a generic unit.
+PASSENGER = _dims(passenger=1)
+VEHICLE = _dims(vehicle=1)
+
+# symbol -> (dims, scale to base)
+_BASE_UNITS: Dict[str, Tuple[Dims, float]] = {
+    # mass (kg)
+    "kg": (MASS, 1.0),
+    "g": (MASS, 1e-3),
+    "t": (MASS, 1e3),
+    "kt": (MASS, 1e6),
+    "Mt": (MASS, 1e9),
+    "lb": (MASS, 0.45359237),
+    "short_ton": (MASS, 907.18474),
+    "long_ton": (MASS, 1016.0469088),
+    # length (m)
+    "m": (LENGTH, 1.0),
+    "km": (LENGTH, 1e3),
+    "mi": (LENGTH, 1609.344),
+    "nmi": (LENGTH, 1852.0),
+    # volume (m³)
+    "L": (VOLUME, 1e-3),
+    "mL": (VOLUME, 1e-6),
+    "kL": (VOLUME, 1.0),
+    "ML": (VOLUME, 1e3),
+    "gal": (VOLUME, 3.785411784e-3),  # US gallon
+    "imp_gal": (VOLUME, 4.54609e-3),
+    "bbl": (VOLUME, 0.158987294928),
+    # energy (J)
+    "J": (ENERGY, 1.0),
+    "kJ": (ENERGY, 1e3),
+    "MJ": (ENERGY, 1e6),
+    "GJ": (ENERGY, 1e9),
+    "TJ": (ENERGY, 1e12),
+    "Wh": (ENERGY, 3.6e3),
+    "kWh": (ENERGY, 3.6e6),
+    "MWh": (ENERGY, 3.6e9),
+    "GWh": (ENERGY, 3.6e12),
+    "Btu": (ENERGY, 1055.05585262),
+    "MMBtu": (ENERGY, 1.05505585262e9),
+    "therm": (ENERGY, 1.05505585262e8),
+    # time (s)
+    "s": (TIME, 1.0),
+    "min": (TIME, 60.0),
+    "h": (TIME, 3600.0),
+    "day": (TIME, 86400.0),
+    "yr": (TIME, 365.0 * 86400.0),
+    # counts
+    "unit": (COUNT, 1.0),
+    "passenger": (PASSENGER, 1.0),
+    "vehicle": (VEHICLE, 1.0),
+}
+
+# Case-insensitive spellings -> registry expression.
+_ALIASES: Dict[str, str] = {
+    "kilogram": "kg", "kilograms": "kg", "kgs": "kg",
+    "gram": "g", "grams": "g",
+    "tonne": "t", "tonnes": "t", "ton": "t", "tons": "t", "metric_ton": "t",
+    "pound": "lb", "pounds": "lb", "lbs": "lb",
+    "metre": "m", "meter": "m", "metres": "m", "meters": "m",
+    "kilometre": "km", "kilometer": "km", "kilometres": "km", "kilometers": "km",
+    "mile": "mi", "miles": "mi",
+    "l": "L", "litre": "L", "liter": "L", "litres": "L", "liters": "L", "ltr": "L",
+    "ml": "mL", "millilitre": "mL", "milliliter": "mL",
+    "kl": "kL", "kilolitre": "kL", "kiloliter": "kL", "megalitre": "ML", "megaliter": "ML",
+    "gallon": "gal", "gallons": "gal", "us_gal": "gal",
+    "barrel": "bbl", "barrels": "bbl",
+    "kwh": "kWh", "mwh": "MWh", "gwh": "GWh", "wh": "Wh",
+    "mj": "MJ", "gj": "GJ", "tj": "TJ", "kj": "kJ",
+    "btu": "Btu", "mmbtu": "MMBtu", "therms": "therm",
+    "hour": "h", "hours": "h", "hr": "h", "hrs": "h",
+    "days": "day", "d": "day",
+    "year": "yr", "years": "yr", "y": "yr",
+    "units": "unit", "item": "unit", "items": "unit", "pcs": "unit", "pc": "unit", "each": "unit",
+    "passengers": "passenger", "pax": "passenger", "vehicles": "vehicle",
+    "tkm": "t*km", "tonne_km": "t*km", "ton_km": "t*km", "tonnekm": "t*km",
+    "pkm": "passenger*km", "passenger_km": "passenger*km",
+    "vkm": "vehicle*km", "vehicle_km": "vehicle*km",
+    "m3": "m^3", "m³": "m^3", "cubic_metre": "m^3", "cubic_meter": "m^3",
+}
+
+# Preferred display unit per dimension (used for sanity checks and canonicalisation).
+CANONICAL: Dict[Dims, str] = {
+    MASS: "kg",
+    LENGTH: "km",
+    VOLUME: "L",
+    ENERGY: "kWh",
+    TIME: "h",
+    COUNT: "unit",
+    PASSENGER: "passenger",
+    VEHICLE: "vehicle",
+    _dims(mass=1, length=1): "t*km",
+    _dims(passenger=1, length=1): "passenger*km",
+    _dims(vehicle=1, length=1): "vehicle*km",
+}
+
+_CURRENCY = re.compile(r"^[A-Z]{3}$")
+_FACTOR = re.compile(r"^(?P<name>[^\^\-]+?)(?:\^(?P<exp>-?\d+)|(?P<neg>-\d+)|(?P<tail>[23]))?$")
+# Separators between factors: whitespace, '*', '.', and '-' unless it signs an exponent ("m-3", "m^-3").
+_SEPARATOR = re.compile(r"[\s*.]+|-(?!\d)")
+
+
+def _prefix(symbol: str) -> str:
+    """SI prefix letter of a registered symbol ("M" for "MWh", "m" for "mL"), else ''."""
+    return symbol[0] if len(symbol) > 1 and symbol[0] in "kMGTm" and symbol[1:] in _BASE_UNITS else ""
+
+
+def _alias(name: str) -> Optional[str]:
+    """Alias target for `name`; a case-folded match may not swap mega for milli ("ML" is not "mL")."""
+    alias = _ALIASES.get(name.lower())
+    if alias is None or name == name.lower():
+        return alias
+    if {name[:1], _prefix(alias)} == {"M", "m"}:
+        return None
+    return alias
+
+
+def _lookup(name: str) -> Tuple[Dims, float]:
+    if name in _BASE_UNITS:
+        return _BASE_UNITS[name]
+    alias = _alias(name)
+    if alias is not None:
+        unit = parse_unit(alias)
+        return unit.dims, unit.scale
+    if _CURRENCY.match(name):
+        return _dims(**{f"currency:{name}": 1}), 1.0
+    raise UnitError(f"Unknown unit: {name!r}")
+
+
+def _combine(a: Dims, b: Dims, sign: int = 1) -> Dims:
+    exps: Dict[str, int] = dict(a)
+    for k, v in b:
+        exps[k] = exps.get(k, 0) + sign * v
+    return _dims(**exps)
+
+
+def _factor(token: str) -> Tuple[Dims, float]:
+    try:
+        return _lookup(token)  # whole-token aliases first ("m3", "tkm", "kWh")
+    except UnitError:
+        pass
+    m = _FACTOR.match(token)
+    if not m:
+        raise UnitError(f"Cannot parse unit: {token!r}")
+    exp = int(m.group("exp") or m.group("neg") or m.group("tail") or 1)
+    dims, scale = _lookup(m.group("name"))
+    return tuple((k, v * exp) for k, v in dims), scale**exp
+
+
+@lru_cache(maxsize=1024)
+def parse_unit(text: str) -> Unit:
+    """'t*km', 'kg/m³', 'tonne-km', 'kWh' … -> Unit (raises UnitError)."""
+    raw = str(text).strip()
+    if not raw:
+        raise UnitError("Empty unit")
+    expr = raw.replace("²", "^2").replace("³", "^3").replace("·", "*").replace("×", "*")
+    if expr in _BASE_UNITS:  # exact symbols first: "Mt" is megatonne, not a lowercased alias
+        dims, scale = _BASE_UNITS[expr]
+        return Unit(raw, dims, scale)
+    alias = _alias(re.sub(r"[\s\-]+", "_", expr))
+    if alias is not None and alias != expr:
+        return parse_unit(alias)._replace(symbol=raw)
+    dims: Dims = ()
+    scale = 1.0
+    for i, part in enumerate(expr.split("/")):
+        for token in filter(None, _SEPARATOR.split(part)):
+            d, s = _factor(token)
+            sign = 1 if i == 0 else -1
+            dims = _combine(dims, d, sign)
+            scale = scale * s if sign > 0 else scale / s
+    return Unit(raw, dims, scale)
+
+
+def is_known(text: str) -> bool:
+    try:
+        parse_unit(text)
+        return True
+    except UnitError:
+        return False
+
+
+def dimension_name(text: str) -> str:
+    dims = parse_unit(text).dims
+    return "·".join(k if v == 1 else f"{k}^{v}" for k, v in dims) or "dimensionless"
+
+
+@lru_cache(maxsize=4096)
+def conversion_factor(from_unit: str, to_unit: str) -> float:
+    """Multiply a quantity in `from_unit` by this to express it in `to_unit`."""
+    if str(from_unit).strip() == str(to_unit).strip():
+        return 1.0
+    src, dst = parse_unit(from_unit), parse_unit(to_unit)
+    if src.dims != dst.dims:
+        raise UnitError(f"Cannot convert {from_unit!r} ({dimension_name(from_unit)}) to {to_unit!r} ({dimension_name(to_unit)})")
+    return src.scale / dst.scale
+
+
+def convert(value: float, from_unit: str, to_unit: str) -> float:
+    return float(value) * conversion_factor(from_unit, to_unit)
+
+
+def conversion_table(units: Iterable[str], to_unit: str) -> Tuple[np.ndarray, List[str]]:
+    """Factor per unit in `units` (NaN where not convertible) and the list of offending units."""
+    factors: List[float] = []
+    bad: List[str] = []
+    for u in units:
+        u = "" if u is None else str(u).strip()
+        if u == "" or u == str(to_unit).strip():
+            factors.append(1.0)  # blank = the table's unit; opaque units only match themselves (exactly)
+            continue
+        try:
+            factors.append(conversion_factor(u, to_unit))
+        except UnitError:
+            factors.append(np.nan)
+            bad.append(u)
+    return np.asarray(factors, dtype=np.float64), bad
+
+
+def conversion_factors(units: Sequence[str], to_unit: str) -> Tuple[np.ndarray, List[str]]:
+    """Per-row factors for a column of (mixed) units: one lookup per distinct unit, then a gather."""
+    codes, uniques = pd.factorize(pd.Series(units, dtype=object).fillna(""))
+    table, bad = conversion_table(uniques, to_unit)
+    return table[codes] if len(codes) else np.zeros(0), bad
+
+
+def convert_array(values: Sequence[float], units: Sequence[str], to_unit: str) -> np.ndarray:
+    """Vectorized conversion of `values` (each in its own unit) to `to_unit`; raises on mismatches."""
+    factors, bad = conversion_factors(units, to_unit)
+    if bad:
+        raise UnitError(f"Cannot convert {', '.join(repr(b) for b in sorted(set(bad)))} to {to_unit!r}")
+    return np.asarray(values, dtype=np.float64) * factors
+
+
+def canonical_unit(text: str) -> str:
+    """Preferred unit for the dimension of `text` (the unit itself when none is defined)."""
+    try:
+        return CANONICAL.get(parse_unit(text).dims, text)
+    except UnitError:
+        return text
+
+
+def compatible_units(text: str) -> List[str]:
+    """Registry units with the same dimension as `text` (for pickers); `text` itself first."""
+    try:
+        dims = parse_unit(text).dims
+    except UnitError:
+        return [text]
+    same = [sym for sym, (d, _s) in _BASE_UNITS.items() if d == dims]
+    if dims == VOLUME:
+        same.append("m³")
+    canonical = CANONICAL.get(dims)
+    if canonical and canonical not in same:
+        same.append(canonical)
+    return [text] + [u for u in same if u != text]
+
+
+# ------------------------------------------------------------
+# Self-check (python -m utils.units): conversions that must never drift
+# ------------------------------------------------------------
+CHECKS: List[Tuple[str, str, float]] = [
+    ("Mt", "kg", 1e9),  # megatonne, never a lowercased "mt" alias
+    ("Mt", "t", 1e6),
+    ("tonne-km", "kg*km", 1e3),
+    ("kg/m^-3", "kg*m^3", 1.0),
+    ("kg*m^-3", "kg/m^3", 1.0),
+    ("kg m-3", "kg/m³", 1.0),
+    ("ML", "L", 1e6),  # megalitre, never the lowercased "ml" alias
+    ("kL", "L", 1e3),
+    ("ml", "L", 1e-3),
+    ("MWh", "kWh", 1e3),
+    ("mwh", "kWh", 1e3),
+]
+
+INCOMPATIBLE: List[Tuple[str, str]] = [
+    ("pkm", "vkm"),
+    ("passenger", "vehicle"),
+    ("passenger", "unit"),
+    ("Ml", "L"),  # neither megalitre nor millilitre: refused, not guessed
+]
+
+
+def self_check() -> List[str]:
+    """Failures among CHECKS / INCOMPATIBLE (empty list = all good)."""
+    failures = []
+    for src, dst, expected in CHECKS:
+        try:
+            got = conversion_factor(src, dst)
+        except UnitError as e:
+            failures.append(f"{src} -> {dst}: {e}")
+            continue
+        if not np.isclose(got, expected, rtol=1e-12):
+            failures.append(f"{src} -> {dst}: {got!r}, expected {expected!r}")
+    for src, dst in INCOMPATIBLE:
+        try:
+            got = conversion_factor(src, dst)
+            failures.append(f"{src} -> {dst}: converted ({got!r}), expected UnitError")
+        except UnitError:
+            pass
+    return failures
+
+
+if __name__ == "__main__":
+    import sys
+
+    problems = self_check()
+    for p in problems:
+        print(p)
+    print(f"{len(CHECKS) + len(INCOMPATIBLE) - len(problems)} / {len(CHECKS) + len(INCOMPATIBLE)} unit checks passed.")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,71 @@
+"""
+utils/uow.py
+
+Unit of work: one transaction for a business write *and* its audit rows.
+
+Key guarantees:
+- Data statements and audit rows commit together (one BEGIN IMMEDIATE … COMMIT, one fsync).
+- A crash or exception rolls back both, so no row ever exists without its audit entry.
+- fetch_one() works with `RETURNING *`, so "after" images never need a re-read.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.audit import INSERT_SQL as AUDIT_INSERT_SQL, AuditRow, make_row
+from utils.db import writer
+
+
+class UnitOfWork:
+    def __init__(self, conn: sqlite3.Connection, actor: str) -> None:
+        self.conn = conn
+        self.actor = actor
+        self._audit_rows: List[AuditRow] = []
+
+    def execute(self, query: str, params: Tuple = ()) -> int:
+        """Run one statement; returns the affected row count."""
+        return self.conn.execute(query, params).rowcount
+
+    def executemany(self, query: str, seq_of_params: Sequence[Tuple]) -> int:
+        return self.conn.executemany(query, seq_of_params).rowcount
+
+    def fetch_one(self, query: str, params: Tuple = ()) -> Optional[Dict[str, Any]]:
+        """First row as a dict (works for SELECT and for INSERT/UPDATE … RETURNING)."""
+        # fetchall(): a RETURNING statement must be stepped to completion before COMMIT.
+        rows = self.conn.execute(query, params).fetchall()
+        return dict(rows[0]) if rows else None
+
+    def fetch_all(self, query: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        return [dict(r) for r in self.conn.execute(query, params).fetchall()]
+
+    def audit(
+        self,
+        action: str,
+        entity_type: str,
+        entity_id: Optional[str] = None,
+        project_id: Optional[str] = None,
+        before: Optional[Dict[str, Any]] = None,
+        after: Optional[Dict[str, Any]] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Stage an audit row; it is written in the same transaction right before COMMIT."""
+        row = make_row(action, entity_type, entity_id, project_id, before, after, meta, actor=self.actor)
+        self._audit_rows.append(row)
+        return row[0]
+
+    def _flush_audit(self) -> None:
+        if self._audit_rows:
+            self.conn.executemany(AUDIT_INSERT_SQL, self._audit_rows)
+            self._audit_rows = []
+
+
+@contextmanager
+def unit_of_work(actor: str = "unknown") -> Iterator[UnitOfWork]:
+    """`with unit_of_work(actor) as uow:` — commit on success, roll back everything on error."""
+    with writer() as conn:
+        uow = UnitOfWork(conn, actor)
+        yield uow
+        uow._flush_audit()